@@ -4,7 +4,10 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from src.config import settings
 from src.db.database import init_db
+from src.ml.vector_store import vector_store
+from src.services.intent_feedback import feedback_trainer
 from src.api import documents, intents, query, integrations, analytics, health
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
@@ -16,6 +19,14 @@ async def lifespan(app: FastAPI):
     logger.info("Initializing database...")
     init_db()
 
+    # Load vector indexes in the background; /api/health reports 503 until done
+    if settings.vector_preload_on_startup:
+        vector_store.start_preload()
+
+    # Learn intents from logged queries and admin reclassifications
+    if settings.intent_knn_enabled:
+        feedback_trainer.start()
+
     # Start Telegram polling in a background thread
     from src.integrations.telegram_bot import run_polling
     tg_thread = threading.Thread(target=run_polling, daemon=True, name="telegram-polling")
@@ -6,7 +6,8 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from src.db.database import get_db
 from src.services.analytics_service import (
-    get_query_logs, get_kb_stats, export_csv, reclassify_query,
+    get_query_logs, get_kb_stats, export_csv, reclassify_query, get_vector_store_stats,
+    get_cache_stats, get_intent_routing_stats, get_llm_stats,
 )
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
@@ -69,6 +70,26 @@ def kb_usage(db: Session = Depends(get_db)) -> dict:
     return get_kb_stats(db)
 
 
+@router.get("/vector-store")
+def vector_store_stats() -> dict:
+    return get_vector_store_stats()
+
+
+@router.get("/caches")
+def cache_stats() -> dict:
+    return get_cache_stats()
+
+
+@router.get("/intent-routing")
+def intent_routing_stats() -> dict:
+    return get_intent_routing_stats()
+
+
+@router.get("/llm")
+def llm_stats() -> dict:
+    return get_llm_stats()
+
+
 class ReclassifyRequest(BaseModel):
     correct_intent: str
 
@@ -1,8 +1,14 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+from src.ml.vector_store import vector_store
 
 router = APIRouter(prefix="/health", tags=["health"])
 
 
 @router.get("")
-def health_check() -> dict:
+def health_check(response: Response) -> dict:
+    warmup = vector_store.warmup_status()
+    if not warmup["ready"]:
+        # Not ready to serve queries until vector indexes are loaded
+        response.status_code = 503
+        return {"status": "warming_up", "version": "1.0.0"}
     return {"status": "ok", "version": "1.0.0"}
@@ -5,14 +5,89 @@ class Settings(BaseSettings):
     openai_api_key: str = ""
     openai_chat_model: str = "gpt-3.5-turbo"
     openai_embedding_model: str = "text-embedding-3-small"
+    embedding_provider: str = "openai"  # "openai", "local_hashing" or "onnx"
+    embedding_dim: int = 1536  # vector size of openai_embedding_model
+    embedding_local_dim: int = 384  # local_hashing buckets
+    embedding_onnx_model_path: str = ""  # directory with model.onnx and tokenizer.json
+    # Per-space reduced (Matryoshka) dimension, e.g. {"3": 256}; unlisted spaces use full size.
+    # Existing spaces are converted with scripts/reproject_embeddings.py.
+    embedding_space_dims: dict[int, int] = {}
+    embedding_cache_enabled: bool = True  # reuse chunk embeddings from data/embedding_cache.db
+    # Embedding requests are packed up to these limits and sent concurrently
+    embedding_batch_max_texts: int = 2048
+    embedding_batch_max_tokens: int = 250_000  # API cap is 300k tokens per request
+    embedding_concurrency: int = 4
+    embedding_max_retries: int = 6  # per batch, on 429 / 5xx / timeout / connection errors
+    query_embedding_cache_size: int = 10_000  # in-process LRU of normalized queries; 0 disables
+    query_embedding_cache_persistent: bool = False  # also store query embeddings on disk
+    # Every OpenAI call goes through src/ml/llm_gateway.py: pooled clients, at most
+    # llm_max_concurrency requests in flight, jittered retries on 429/5xx/timeouts
+    llm_timeout_seconds: float = 30
+    llm_max_concurrency: int = 16
+    llm_max_retries: int = 3
+    llm_retry_base_seconds: float = 0.5
+    llm_retry_max_seconds: float = 20
     telegram_bot_token: str = ""
     teams_app_id: str = ""
     teams_app_password: str = ""
     intent_confidence_threshold: float = 0.7
+    intent_cache_size: int = 5_000  # cached LLM classifications; 0 disables
+    intent_cache_ttl_seconds: float = 3600
+    # Concurrent LLM classifications are sent together: a batch waits at most
+    # intent_batch_max_wait_ms for company; intent_batch_max_size=1 disables batching
+    intent_batch_max_size: int = 16
+    intent_batch_max_wait_ms: float = 10
+    intent_batch_concurrency: int = 4  # batched completions in flight at once
+    # "centroid": score the query embedding against per-space centroids and only ask
+    # the LLM when the top-2 margin is small; "llm": always ask the LLM
+    intent_router_mode: str = "centroid"
+    intent_keyword_routing: bool = True  # route queries naming one space's keywords directly
+    intent_centroid_margin: float = 0.05  # min cosine gap between the best two spaces
+    intent_centroid_min_similarity: float = 0.2
+    intent_centroid_profile_weight: float = 0.5  # profile embedding vs mean chunk vector
+    intent_centroid_temperature: float = 0.02  # softmax temperature for reported confidence
+    # kNN over past queries, labelled by confident classifications and admin reclassifications
+    intent_knn_enabled: bool = True
+    intent_knn_k: int = 7
+    intent_knn_min_similarity: float = 0.85  # cosine to the nearest labelled query
+    intent_knn_min_agreement: float = 0.8  # weighted share of neighbours voting for the winner
+    intent_knn_feedback_weight: float = 3.0  # vote weight of a reclassified query
+    intent_knn_max_examples: int = 5_000  # most recent labelled queries trained on
+    intent_knn_retrain_seconds: float = 300
+    query_pipeline_workers: int = 8  # threads overlapping embedding, classification and search
+    query_speculative_spaces: int = 2  # spaces pre-searched while the LLM classifies; 0 disables
     conversation_history_limit: int = 5  # number of recent Q&A pairs to include as context
     database_url: str = "sqlite:///./data/intelliknow.db"
     data_dir: str = "./data"
     max_file_size_bytes: int = 50 * 1024 * 1024
+    vector_storage_dtype: str = "float32"  # on-disk embedding matrix: "float32" or "float16"
+    # ANN index per intent space: "flat", "ivf_flat", "ivf_pq", "hnsw",
+    # or the compressed "sq8", "sq_fp16" and "pq".
+    # Segments stay flat until they reach vector_ann_min_chunks; compaction builds the ANN index.
+    vector_index_type: str = "flat"
+    vector_space_index_types: dict[int, str] = {}  # per-space override, e.g. {"3": "hnsw"}
+    vector_ann_min_chunks: int = 50_000
+    vector_ivf_nlist: int = 1024
+    vector_ivf_nprobe: int = 16
+    vector_pq_m: int = 64  # PQ sub-quantizers (rounded down to a divisor of the dimension)
+    vector_hnsw_m: int = 32
+    vector_hnsw_ef_construction: int = 200
+    vector_hnsw_ef_search: int = 64
+    vector_rescore_factor: int = 4  # sq8/pq/ivf_pq fetch k*factor candidates, re-ranked exactly
+    vector_recall_k: int = 10
+    vector_recall_sample_size: int = 200
+    vector_search_workers: int = 4  # threads for searching all spaces at once
+    # Startup warm-up: load every space on disk before reporting healthy
+    vector_preload_on_startup: bool = True
+    vector_preload_workers: int = 4
+    vector_index_mmap: bool = False  # map saved ANN indexes read-only instead of reading them
+    # Several uvicorn workers sharing data/faiss: mmap everything, file-lock writes,
+    # pick up other workers' commits from the manifest
+    vector_shared_mode: bool = False
+    vector_memory_budget_mb: float = 0  # unload least recently used spaces above this; 0 = no limit
+    # Background compaction of per-space segments
+    vector_compaction_max_segments: int = 8
+    vector_compaction_deleted_ratio: float = 0.2  # compact when this share of rows is deleted
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
@@ -36,6 +36,7 @@ def init_db() -> None:
     os.makedirs(os.path.join(settings.data_dir, "uploads"), exist_ok=True)
 
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
 
     db = SessionLocal()
     try:
@@ -46,6 +47,14 @@ def init_db() -> None:
         db.close()
 
 
+def _add_missing_columns() -> None:
+    """create_all skips existing tables, so add columns introduced since they were made."""
+    with engine.begin() as conn:
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(query_logs)"))}
+        if "routing_tier" not in columns:
+            conn.execute(text("ALTER TABLE query_logs ADD COLUMN routing_tier VARCHAR"))
+
+
 def _seed_intent_spaces(db: Session) -> None:
     defaults = [
         {
@@ -55,6 +55,7 @@ class QueryLog(Base):
     channel: Mapped[str] = mapped_column(String, nullable=False)
     user_id: Mapped[str | None] = mapped_column(String, nullable=True)
     response_time_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    routing_tier: Mapped[str | None] = mapped_column(String, nullable=True)  # intent_router.TIERS
 
 
 class Integration(Base):
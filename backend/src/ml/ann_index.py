@@ -0,0 +1,283 @@
+"""FAISS index construction for intent spaces.
+
+Every index built here is addressed by stable chunk ids (``add_with_ids``):
+IVF indexes carry ids natively, the others are wrapped in ``IndexIDMap2``.
+
+The quantized types (``sq8``, ``pq``, ``ivf_pq``) keep only compressed codes
+in RAM; their candidates are re-ranked against the exact vectors in the
+segment matrix on disk (see ``rescore``). ``sq_fp16`` halves memory with
+negligible loss and is not rescored.
+
+An index of ``None`` stands for a flat segment with no private copy of its
+vectors; it is searched by scanning the memory-mapped matrix (see ``scan``).
+"""
+
+import numpy as np
+import faiss
+from src.config import settings
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "sq_fp16", "pq")
+RESCORED_TYPES = ("ivf_pq", "sq8", "pq")
+
+_ADD_BLOCK_ROWS = 65_536  # rows copied out of the memmap per add/search call
+_TRAIN_POINTS_PER_CENTROID = 64
+_QUANTIZER_TRAIN_POINTS = 65_536  # sample for SQ ranges / PQ codebooks
+_RESCORE_BLOCK_QUERIES = 256  # bounds the gathered candidate tensor
+_ID_MAP_BYTES_PER_ROW = 40  # IndexIDMap2 id vector plus reverse hash map entry
+
+
+def index_type_of(index: faiss.Index | None) -> str:
+    """Return the ``INDEX_TYPES`` name of an index built by ``build_index``."""
+    if index is None:
+        return "flat"
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "sq8" if inner.sq.qtype == faiss.ScalarQuantizer.QT_8bit else "sq_fp16"
+    if isinstance(inner, faiss.IndexPQ):
+        return "pq"
+    return "flat"
+
+
+def supports_selector(index: faiss.Index | None) -> bool:
+    """Whether ``index`` can skip rejected ids during the search (IndexPQ cannot)."""
+    return index is not None and index_type_of(index) != "pq"
+
+
+def needs_rescore(index: faiss.Index) -> bool:
+    return index_type_of(index) in RESCORED_TYPES
+
+
+def memory_bytes(index: faiss.Index | None) -> int:
+    """Approximate resident size of an index built by ``build_index``."""
+    if index is None:
+        return 0
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        # Stored vectors plus the level-0 neighbour lists
+        per_row = faiss.downcast_index(inner.storage).code_size + inner.hnsw.nb_neighbors(0) * 4
+    else:
+        per_row = inner.code_size
+    size = per_row * index.ntotal
+    if isinstance(inner, faiss.IndexIVF):
+        size += 8 * index.ntotal + inner.nlist * inner.d * 4  # list ids + coarse centroids
+    if isinstance(index, faiss.IndexIDMap2):
+        size += _ID_MAP_BYTES_PER_ROW * index.ntotal
+    return size
+
+
+def _nlist(n: int) -> int:
+    # FAISS wants ~39+ training points per centroid
+    return max(1, min(settings.vector_ivf_nlist, n // 39))
+
+
+def _pq_m(dim: int) -> int:
+    """Largest number of PQ sub-quantizers <= vector_pq_m that divides ``dim``."""
+    m = min(settings.vector_pq_m, dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def new_index(index_type: str, dim: int, n: int) -> faiss.Index:
+    """Create an empty (untrained) index of ``index_type`` sized for ``n`` vectors."""
+    if index_type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, _nlist(n))
+    if index_type == "ivf_pq":
+        return faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, _nlist(n), _pq_m(dim), 8)
+    if index_type == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, settings.vector_hnsw_m)
+        hnsw.hnsw.efConstruction = settings.vector_hnsw_ef_construction
+        return faiss.IndexIDMap2(hnsw)
+    if index_type == "sq8":
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit))
+    if index_type == "sq_fp16":
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16))
+    if index_type == "pq":
+        return faiss.IndexIDMap2(faiss.IndexPQ(dim, _pq_m(dim), 8))
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+def build_index(
+    index_type: str,
+    dim: int,
+    vectors: np.ndarray,
+    rows: np.ndarray,
+    ids: np.ndarray,
+) -> faiss.Index:
+    """Build an index over ``vectors[rows]`` keyed by ``ids``.
+
+    ``vectors`` is typically the space's memmapped embedding matrix; rows are
+    copied out in blocks so building never needs the whole matrix in RAM.
+    """
+    index = new_index(index_type, dim, len(rows))
+    if not index.is_trained:
+        ivf = faiss.try_extract_index_ivf(index)
+        wanted = ivf.nlist * _TRAIN_POINTS_PER_CENTROID if ivf else _QUANTIZER_TRAIN_POINTS
+        n_train = min(len(rows), wanted)
+        sample = np.sort(np.random.default_rng(0).choice(rows, n_train, replace=False))
+        index.train(np.asarray(vectors[sample], dtype=np.float32))
+    for start in range(0, len(rows), _ADD_BLOCK_ROWS):
+        block = rows[start : start + _ADD_BLOCK_ROWS]
+        index.add_with_ids(
+            np.asarray(vectors[block], dtype=np.float32),
+            ids[start : start + _ADD_BLOCK_ROWS],
+        )
+    return index
+
+
+def exclude_selector(ids: np.ndarray) -> faiss.IDSelector | None:
+    """A selector rejecting ``ids``, used to hide deleted chunks inside a search."""
+    if not len(ids):
+        return None
+    batch = faiss.IDSelectorBatch(ids)
+    selector = faiss.IDSelectorNot(batch)
+    selector.referenced_objects = [batch]  # IDSelectorNot does not own its argument
+    return selector
+
+
+def search_params(
+    index: faiss.Index, selector: faiss.IDSelector | None = None
+) -> faiss.SearchParameters | None:
+    """Per-call ``nprobe`` / ``efSearch`` and id filter.
+
+    Passed with each search rather than set on the index, so concurrent
+    searches never write to a shared index.
+    """
+    index_type = index_type_of(index)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = settings.vector_ivf_nprobe
+    elif index_type == "hnsw":
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = settings.vector_hnsw_ef_search
+    elif selector is not None and supports_selector(index):
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def rescore(
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    queries: np.ndarray,
+    chunk_ids: np.ndarray,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Re-rank quantized candidates by exact L2 distance and keep the best ``k``.
+
+    ``vectors``/``ids`` are a segment's row-aligned matrix and ascending ids;
+    ``chunk_ids`` are the candidate ids (``-1`` for empty slots) per query.
+    """
+    valid = chunk_ids >= 0
+    rows = np.searchsorted(ids, np.where(valid, chunk_ids, ids[0]))
+    distances = np.empty(chunk_ids.shape, dtype=np.float32)
+    for start in range(0, len(queries), _RESCORE_BLOCK_QUERIES):
+        block = rows[start : start + _RESCORE_BLOCK_QUERIES]
+        candidates = np.asarray(vectors[block.ravel()], dtype=np.float32).reshape(
+            *block.shape, -1
+        )
+        diff = candidates - queries[start : start + _RESCORE_BLOCK_QUERIES, None, :]
+        distances[start : start + len(block)] = np.einsum("qcd,qcd->qc", diff, diff)
+    distances[~valid] = np.inf
+
+    order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return (
+        np.take_along_axis(distances, order, axis=1),
+        np.take_along_axis(chunk_ids, order, axis=1),
+    )
+
+
+def search(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    selector: faiss.IDSelector | None = None,
+    excluded: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Search ``index``, skipping the ids rejected by ``selector``.
+
+    Indexes that cannot filter while searching instead over-fetch by
+    ``excluded`` (the number of rejected ids they hold); the caller masks
+    those. Quantized indexes over-fetch and are rescored on ``vectors``.
+    """
+    if selector is not None and not supports_selector(index):
+        k += excluded
+        selector = None
+    if index is None:
+        return scan(vectors, ids, queries, min(k, len(ids)))
+    k = min(k, index.ntotal)
+    params = search_params(index, selector)
+    factor = settings.vector_rescore_factor
+    if factor <= 1 or not needs_rescore(index):
+        return index.search(queries, k, params=params)
+    _, candidates = index.search(queries, min(k * factor, index.ntotal), params=params)
+    return rescore(vectors, ids, queries, candidates, k)
+
+
+def scan(
+    vectors: np.ndarray, ids: np.ndarray, queries: np.ndarray, k: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Exact top-k (distances, ids) over a whole matrix, read in contiguous blocks.
+
+    Float32 blocks of a memmap are used in place, so nothing is copied into
+    private memory.
+    """
+    heap = faiss.ResultHeap(len(queries), k)
+    for start in range(0, len(ids), _ADD_BLOCK_ROWS):
+        block = np.asarray(vectors[start : start + _ADD_BLOCK_ROWS], dtype=np.float32)
+        distances, positions = faiss.knn(queries, block, min(k, len(block)))
+        heap.add_result(distances, np.where(positions >= 0, ids[start + positions], -1))
+    heap.finalize()
+    return heap.D, heap.I
+
+
+def exact_search(
+    vectors: np.ndarray, rows: np.ndarray, ids: np.ndarray, queries: np.ndarray, k: int
+) -> np.ndarray:
+    """Brute-force top-k ids over ``vectors[rows]``, scanning the matrix in blocks."""
+    heap = faiss.ResultHeap(len(queries), k)
+    for start in range(0, len(rows), _ADD_BLOCK_ROWS):
+        block = np.asarray(vectors[rows[start : start + _ADD_BLOCK_ROWS]], dtype=np.float32)
+        distances, positions = faiss.knn(queries, block, min(k, len(block)))
+        block_ids = np.where(positions >= 0, ids[start + positions], -1)
+        heap.add_result(distances, block_ids)
+    heap.finalize()
+    return heap.I
+
+
+def recall_at_k(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    k: int,
+    sample_size: int,
+) -> float:
+    """Recall@k of ``index`` against an exact flat search, using stored vectors as queries.
+
+    ``ids`` are row-aligned with ``vectors``. Quantized indexes are measured
+    with rescoring, as they are served.
+    """
+    rows = np.arange(len(ids))
+    if len(rows) == 0:
+        return 1.0
+    k = min(k, len(rows))
+    picked = np.random.default_rng(1).choice(len(rows), min(sample_size, len(rows)), replace=False)
+    queries = np.asarray(vectors[np.sort(picked)], dtype=np.float32)
+
+    expected = exact_search(vectors, rows, ids, queries, k)
+    _, found = search(index, vectors, ids, queries, k)
+    hits = sum(len(set(e) & set(f)) for e, f in zip(expected.tolist(), found.tolist()))
+    return hits / (len(queries) * k)
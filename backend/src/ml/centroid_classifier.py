@@ -0,0 +1,78 @@
+"""Local intent classification against per-space embedding centroids.
+
+Each intent space is represented by one unit vector that mixes the embedding
+of its profile (name, description and keywords, as shown to the LLM
+classifier) with the mean of its stored chunk vectors. Queries are scored by
+cosine similarity using the query embedding that retrieval computes anyway,
+so classifying costs a few dot products instead of a chat completion.
+"""
+
+import threading
+
+import numpy as np
+
+from src.config import settings
+from src.ml.embedder import embed_texts
+from src.ml.embedding_providers import space_dim, truncate_embeddings
+from src.ml.vector_store import vector_store
+
+
+def profile_text(space: dict) -> str:
+    return f"{space['name']}: {space['description']}. Keywords: {', '.join(space['keywords'])}"
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class CentroidClassifier:
+    def __init__(self):
+        # space id -> (profile text, chunk mean it was built from, centroid)
+        self._centroids: dict[int, tuple[str, np.ndarray | None, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def _centroid(self, space: dict) -> np.ndarray:
+        """The space's centroid, rebuilt when its profile or stored chunks change."""
+        text = profile_text(space)
+        chunks = vector_store.space_centroid(space["id"])
+        cached = self._centroids.get(space["id"])
+        # The chunk mean is cached on the store's snapshot, so identity means unchanged
+        if cached is not None and cached[0] == text and cached[1] is chunks:
+            return cached[2]
+
+        profile = np.asarray(embed_texts([text])[0], dtype=np.float32)
+        weight = settings.intent_centroid_profile_weight
+        if chunks is None:
+            centroid = _unit(profile)
+        elif len(chunks) == len(profile):
+            centroid = _unit(weight * _unit(profile) + (1 - weight) * _unit(chunks))
+        elif len(chunks) < len(profile) and space_dim(space["id"]) == len(chunks):
+            reduced = truncate_embeddings(profile[None, :], len(chunks))[0]
+            centroid = _unit(weight * reduced + (1 - weight) * _unit(chunks))
+        else:  # chunks from another embedding model; the profile alone is comparable
+            centroid = _unit(profile)
+        with self._lock:
+            self._centroids[space["id"]] = (text, chunks, centroid)
+        return centroid
+
+    def scores(
+        self, query_embedding: list[float], intent_spaces: list[dict]
+    ) -> list[tuple[str, float]]:
+        """(space name, cosine similarity) for every space, best first.
+
+        ``intent_spaces`` are dicts with keys: id, name, description, keywords.
+        """
+        query = _unit(np.asarray(query_embedding, dtype=np.float32))
+        scored = []
+        for space in intent_spaces:
+            centroid = self._centroid(space)
+            q = query if len(centroid) == len(query) else truncate_embeddings(
+                query[None, :], len(centroid)
+            )[0]
+            scored.append((space["name"], float(q @ centroid)))
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+
+
+# Module-level singleton
+centroid_classifier = CentroidClassifier()
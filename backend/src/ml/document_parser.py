@@ -47,8 +47,8 @@ def _extract_tables_from_pdf(file_path: str) -> dict[int, list[list[list[str]]]]
 
 def _structure_tables_with_ai(tables: list[list[list[str]]]) -> str:
     """Use OpenAI to convert raw tabular data into clean markdown tables."""
-    from openai import OpenAI
     from src.config import settings
+    from src.ml.llm_gateway import chat_completion
 
     if not tables:
         return ""
@@ -60,8 +60,7 @@ def _structure_tables_with_ai(tables: list[list[list[str]]]) -> str:
             raw_lines.append(" | ".join(row))
         raw_lines.append("")
 
-    client = OpenAI(api_key=settings.openai_api_key)
-    resp = client.chat.completions.create(
+    resp = chat_completion(
         model=settings.openai_chat_model,
         messages=[
             {
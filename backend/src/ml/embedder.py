@@ -1,33 +1,208 @@
-from openai import OpenAI
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from openai import RateLimitError
 
 from src.config import settings
+from src.ml.embedding_cache import embedding_cache, text_key
+from src.ml.embedding_providers import EmbeddingProvider, create_provider, truncate_embeddings
+from src.ml.llm_gateway import RETRYABLE, create_embeddings, retry_after
+from src.ml.lru_cache import LRUCache
+from src.ml.text_normalization import normalize_query
+
+_provider: tuple[tuple, EmbeddingProvider] | None = None
+_query_cache = LRUCache(settings.query_embedding_cache_size)
+
+_BACKOFF_BASE_SECONDS = 1.0
+_BACKOFF_MAX_SECONDS = 60.0
+
+
+def _request_embeddings(**kwargs):
+    # Retried by _embed_batch, which shares rate-limit backoff across batches
+    return create_embeddings(retries=0, **kwargs)
+
+
+def get_provider() -> EmbeddingProvider:
+    """The provider for the current settings, rebuilt when they change."""
+    global _provider
+    key = (
+        settings.embedding_provider,
+        settings.openai_embedding_model,
+        settings.embedding_dim,
+        settings.embedding_local_dim,
+        settings.embedding_onnx_model_path,
+    )
+    if _provider is None or _provider[0] != key:
+        _provider = (key, create_provider(lambda **kwargs: _request_embeddings(**kwargs)))
+    return _provider[1]
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    """Tokens in ``text`` for the embedding model; ~4 chars per token without tiktoken."""
+    encoding = _encoding(model or settings.openai_embedding_model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def token_batches(texts: list[str], max_texts: int, max_tokens: int) -> list[list[int]]:
+    """Split ``texts`` into runs of indices within the per-request limits.
 
-_client: OpenAI | None = None
+    A single text over ``max_tokens`` still gets a batch of its own; the API
+    then rejects it, as it would have before.
+    """
+    batches: list[list[int]] = []
+    current: list[int] = []
+    tokens = 0
+    for i, text in enumerate(texts):
+        n = count_tokens(text)
+        if current and (len(current) >= max_texts or tokens + n > max_tokens):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(i)
+        tokens += n
+    if current:
+        batches.append(current)
+    return batches
 
 
-def _get_client() -> OpenAI:
-    global _client
-    if _client is None:
-        _client = OpenAI(api_key=settings.openai_api_key)
-    return _client
+class _Backoff:
+    """Pause shared by concurrent requests after a rate-limit response.
 
+    Each 429 doubles the delay (or uses the server's ``retry-after``) and
+    holds back every batch, not just the one that was refused; successful
+    requests shrink the delay again.
+    """
 
-def embed_texts(texts: list[str], batch_size: int = 20) -> list[list[float]]:
-    """Embed a list of texts using OpenAI text-embedding-3-small."""
-    client = _get_client()
-    all_embeddings: list[list[float]] = []
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._delay = 0.0
+        self._until = 0.0
 
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
-        response = client.embeddings.create(
-            model=settings.openai_embedding_model,
-            input=batch,
+    def wait(self) -> None:
+        with self._lock:
+            pause = self._until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+    def rate_limited(self, retry_after: float | None) -> None:
+        with self._lock:
+            self._delay = min(_BACKOFF_MAX_SECONDS, max(_BACKOFF_BASE_SECONDS, self._delay * 2))
+            pause = retry_after if retry_after is not None else self._delay
+            pause *= random.uniform(1.0, 1.25)  # keep workers from retrying in lockstep
+            self._until = max(self._until, time.monotonic() + pause)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self._delay /= 2
+
+
+def _embed_batch(
+    provider: EmbeddingProvider, texts: list[str], backoff: _Backoff
+) -> list[list[float]]:
+    for attempt in range(settings.embedding_max_retries + 1):
+        backoff.wait()
+        try:
+            embeddings = provider.embed(texts)
+        except RETRYABLE as e:
+            if attempt == settings.embedding_max_retries:
+                raise
+            if isinstance(e, RateLimitError):
+                backoff.rate_limited(retry_after(e))
+            else:
+                # 5xx, timeout or connection error: only this batch waits
+                ceiling = min(_BACKOFF_MAX_SECONDS, _BACKOFF_BASE_SECONDS * 2**attempt)
+                time.sleep(random.uniform(0, ceiling))
+            continue
+        backoff.succeeded()
+        return embeddings
+
+
+def embed_texts(
+    texts: list[str],
+    batch_size: int | None = None,
+    use_cache: bool = True,
+    dim: int | None = None,
+) -> list[list[float]]:
+    """Embed a list of texts with the configured embedding provider.
+
+    Texts already in the persistent embedding cache, and repeats within the
+    call, are not sent to the API. The rest are packed into batches of up to
+    ``embedding_batch_max_tokens`` tokens (and ``batch_size`` texts) that are
+    sent ``embedding_concurrency`` at a time. Results keep the input order.
+    With ``dim`` they are truncated to that many components and renormalized;
+    the cache always holds full-size vectors.
+    """
+    provider = get_provider()
+    keys = [text_key(t) for t in texts]
+    use_cache = use_cache and provider.cacheable and settings.embedding_cache_enabled
+    vectors = embedding_cache.get_many(provider.name, provider.dim, keys) if use_cache else {}
+
+    pending = {key: text for key, text in zip(keys, texts) if key not in vectors}
+    if pending:
+        pending_keys = list(pending)
+        pending_texts = list(pending.values())
+        batches = token_batches(
+            pending_texts,
+            batch_size or settings.embedding_batch_max_texts,
+            settings.embedding_batch_max_tokens,
         )
-        all_embeddings.extend([item.embedding for item in response.data])
+        backoff = _Backoff()
+
+        def embed(batch: list[int]) -> list[list[float]]:
+            return _embed_batch(provider, [pending_texts[i] for i in batch], backoff)
+
+        if len(batches) == 1:
+            results = [embed(batches[0])]  # no worker thread on the query path
+        else:
+            workers = max(1, min(settings.embedding_concurrency, len(batches)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+                results = list(pool.map(embed, batches))
+        fetched = {
+            pending_keys[i]: vector
+            for batch, embeddings in zip(batches, results)
+            for i, vector in zip(batch, embeddings)
+        }
+        if use_cache:
+            embedding_cache.put_many(provider.name, fetched)
+        vectors.update(fetched)
 
-    return all_embeddings
+    if dim and dim < provider.dim:
+        return truncate_embeddings([vectors[key] for key in keys], dim).tolist()
+    return [vectors[key] for key in keys]
 
 
 def embed_query(query: str) -> list[float]:
-    """Embed a single query string."""
-    return embed_texts([query])[0]
+    """Embed a single query string.
+
+    The query is embedded as written, and kept in an in-process LRU keyed
+    by its normalized form so repeated questions skip the API. The
+    persistent chunk cache is only consulted when
+    ``query_embedding_cache_persistent`` is set.
+    """
+    provider = get_provider()
+    key = (provider.name, provider.dim, normalize_query(query) or query)
+    vector = _query_cache.get(key)
+    if vector is None:
+        vector = embed_texts([query], use_cache=settings.query_embedding_cache_persistent)[0]
+        _query_cache.put(key, vector)
+    return vector
+
+
+def query_cache_stats() -> dict:
+    return _query_cache.stats()
@@ -0,0 +1,88 @@
+"""Persistent cache of text embeddings keyed by (model, dimension, sha256(text)).
+
+Stored in SQLite at ``<data_dir>/embedding_cache.db``, so re-parsing a
+document or uploading boilerplate already seen elsewhere costs disk lookups
+instead of embedding API calls. Vectors are kept as raw float32 bytes.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+from src.config import settings
+
+_LOOKUP_BATCH = 500  # keys per SELECT, below SQLite's bound-parameter limit
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str | None = None):
+        self._path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            path = self._path or os.path.join(settings.data_dir, "embedding_cache.db")
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " text_sha256 BLOB NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, dim, text_sha256)"
+                ") WITHOUT ROWID"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, model: str, dim: int, keys: list[bytes]) -> dict[bytes, list[float]]:
+        """Cached vectors for the given text keys; missing keys are left out."""
+        found: dict[bytes, list[float]] = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start : start + _LOOKUP_BATCH]
+                rows = conn.execute(
+                    "SELECT text_sha256, vector FROM embeddings"
+                    " WHERE model = ? AND dim = ?"
+                    f" AND text_sha256 IN ({', '.join('?' * len(batch))})",
+                    (model, dim, *batch),
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model: str, items: dict[bytes, list[float]]) -> None:
+        """Store vectors under their text keys; the dimension is the vector length."""
+        rows = [
+            (model, len(vector), key, np.asarray(vector, dtype=np.float32).tobytes())
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Module-level singleton
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,165 @@
+"""Embedding backends selected by ``settings.embedding_provider``.
+
+- ``openai``: the OpenAI embeddings API (``openai_embedding_model``).
+- ``local_hashing``: signed feature hashing of words, word bigrams and
+  character trigrams into ``embedding_local_dim`` buckets. Deterministic,
+  CPU-only and needs no network or model files, so ingestion and retrieval
+  can be load-tested offline; retrieval quality is lexical, not semantic.
+- ``onnx``: a local sentence-embedding model exported to ONNX
+  (``embedding_onnx_model_path`` holding ``model.onnx`` and
+  ``tokenizer.json``), mean-pooled. Needs the optional ``onnxruntime`` and
+  ``tokenizers`` packages.
+
+A provider embeds one request-sized batch; batching, caching and retries
+live in ``embedder``.
+"""
+
+import hashlib
+import math
+import os
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from functools import lru_cache
+
+import numpy as np
+
+from src.config import settings
+
+PROVIDERS = ("openai", "local_hashing", "onnx")
+
+_WORD = re.compile(r"\w+")
+
+
+class EmbeddingProvider(ABC):
+    """Base class; ``name`` and ``dim`` identify the vectors it produces."""
+
+    name: str
+    dim: int
+    cacheable = True  # worth storing in the persistent embedding cache
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embed one request-sized batch."""
+
+
+class OpenAIProvider(EmbeddingProvider):
+    def __init__(self, model: str, dim: int, request: Callable):
+        self.name = model
+        self.dim = dim
+        self._request = request
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        response = self._request(model=self.name, input=texts)
+        return [item.embedding for item in response.data]
+
+
+@lru_cache(maxsize=65_536)
+def _bucket(feature: str, dim: int) -> tuple[int, float]:
+    h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % dim, 1.0 if (h >> 63) else -1.0
+
+
+class HashingProvider(EmbeddingProvider):
+    cacheable = False  # cheaper to recompute than to look up
+
+    def __init__(self, dim: int):
+        self.name = f"local-hashing-{dim}"
+        self.dim = dim
+
+    def _features(self, text: str) -> dict[str, float]:
+        words = _WORD.findall(unicodedata.normalize("NFKC", text).casefold())
+        counts: dict[str, float] = {}
+        for word in words:
+            counts[word] = counts.get(word, 0.0) + 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                gram = f"3:{padded[i : i + 3]}"
+                counts[gram] = counts.get(gram, 0.0) + 0.5
+        for first, second in zip(words, words[1:]):
+            bigram = f"2:{first} {second}"
+            counts[bigram] = counts.get(bigram, 0.0) + 1.0
+        return counts
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        rows, columns, values = [], [], []
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                column, sign = _bucket(feature, self.dim)
+                rows.append(row)
+                columns.append(column)
+                values.append(sign * math.sqrt(count))  # damp repeated terms
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (rows, columns), values)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return (matrix / np.where(norms > 0, norms, 1.0)).tolist()
+
+
+class OnnxProvider(EmbeddingProvider):
+    def __init__(self, model_path: str, max_length: int = 512):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as exc:
+            raise ValueError(
+                "The onnx embedding provider needs the onnxruntime and tokenizers packages"
+            ) from exc
+        if not os.path.isfile(os.path.join(model_path, "model.onnx")):
+            raise ValueError(f"No model.onnx found in {model_path!r}")
+
+        self._session = onnxruntime.InferenceSession(
+            os.path.join(model_path, "model.onnx"), providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length)
+        self._tokenizer.enable_padding()
+        self.name = f"onnx:{os.path.basename(os.path.normpath(model_path))}"
+        self.dim = len(self.embed(["dimension probe"])[0])
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        encodings = self._tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self._session.run(None, {k: v for k, v in feeds.items() if k in self._inputs})[0]
+        summed = (hidden * mask[:, :, None]).sum(axis=1)
+        pooled = summed / np.maximum(mask.sum(axis=1, keepdims=True), 1)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.where(norms > 0, norms, 1.0)).astype(np.float32).tolist()
+
+
+def space_dim(intent_space_id: int | None) -> int | None:
+    """Reduced embedding size configured for a space, or None for full size."""
+    return settings.embedding_space_dims.get(intent_space_id)
+
+
+def truncate_embeddings(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Keep the first ``dim`` components of each row and rescale rows to unit length.
+
+    Matryoshka-trained models (``text-embedding-3-*``) front-load information,
+    so a prefix is itself a usable, smaller embedding.
+    """
+    reduced = np.array(np.asarray(vectors)[:, :dim], dtype=np.float32)
+    norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+    return reduced / np.where(norms > 0, norms, 1.0)
+
+
+def create_provider(request: Callable) -> EmbeddingProvider:
+    """Build the provider named by ``settings.embedding_provider``.
+
+    ``request(model=..., input=...)`` calls the embeddings API, for the
+    ``openai`` provider.
+    """
+    kind = settings.embedding_provider
+    if kind == "openai":
+        return OpenAIProvider(settings.openai_embedding_model, settings.embedding_dim, request)
+    if kind == "local_hashing":
+        return HashingProvider(settings.embedding_local_dim)
+    if kind == "onnx":
+        return OnnxProvider(settings.embedding_onnx_model_path)
+    raise ValueError(f"Unknown embedding provider: {kind}")
@@ -1,33 +1,68 @@
+import hashlib
 import json
-from openai import OpenAI
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from src.config import settings
+from src.ml.llm_gateway import chat_completion
+from src.ml.lru_cache import LRUCache
+from src.ml.text_normalization import normalize_query
 
+logger = logging.getLogger(__name__)
 
-def classify_intent(
-    query: str,
-    intent_spaces: list[dict],
-) -> tuple[str, float]:
-    """Classify user query into an intent space using GPT zero-shot.
+# (normalized query, catalog hash) -> (intent, confidence); the LLM answers at temperature 0
+_cache = LRUCache(settings.intent_cache_size, ttl=settings.intent_cache_ttl_seconds)
 
-    Args:
-        query: The user's question.
-        intent_spaces: List of dicts with keys: name, description, keywords (list[str]).
 
-    Returns:
-        Tuple of (intent_name, confidence). intent_name is "general" if confidence
-        is below the configured threshold.
-    """
-    client = OpenAI(api_key=settings.openai_api_key)
+def catalog_hash(intent_spaces: list[dict]) -> str:
+    """Fingerprint of everything the classifier prompt says about the intent spaces."""
+    catalog = sorted(
+        (s["name"], s["description"], list(s["keywords"])) for s in intent_spaces
+    )
+    return hashlib.sha256(json.dumps(catalog).encode()).hexdigest()
+
+
+def _cache_key(query: str, intent_spaces: list[dict]) -> tuple[str, str]:
+    return normalize_query(query), catalog_hash(intent_spaces)
+
+
+def cached_intent(query: str, intent_spaces: list[dict]) -> tuple[str, float] | None:
+    """A previous ``classify_intent`` result for this query and catalog, if still cached."""
+    return _cache.get(_cache_key(query, intent_spaces))
+
+
+def invalidate_cache() -> None:
+    """Drop cached classifications; called when the intent catalog changes."""
+    _cache.clear()
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
 
-    spaces_text = "\n".join(
+
+def _spaces_text(intent_spaces: list[dict]) -> str:
+    return "\n".join(
         f"- {s['name']}: {s['description']}. Keywords: {', '.join(s['keywords'])}"
         for s in intent_spaces
     )
 
+
+def _result(item: dict) -> tuple[str, float]:
+    intent = item.get("intent", "general")
+    confidence = float(item.get("confidence", 0.0))
+    # Apply threshold — fall back to "general" if below threshold
+    if confidence < settings.intent_confidence_threshold:
+        intent = "general"
+    return intent, confidence
+
+
+def _classify_one(query: str, intent_spaces: list[dict]) -> tuple[str, float]:
     system_prompt = f"""You are an intent classifier for an enterprise knowledge base.
 Classify the user query into exactly one of these intent spaces:
 
-{spaces_text}
+{_spaces_text(intent_spaces)}
 
 Respond with valid JSON only (no markdown, no explanation):
 {{"intent": "<space_name>", "confidence": <0.0 to 1.0>}}
@@ -37,7 +72,7 @@ Rules:
 - If no intent clearly matches, still pick the closest one but set low confidence
 - Use the exact name from the list above"""
 
-    response = client.chat.completions.create(
+    response = chat_completion(
         model=settings.openai_chat_model,
         messages=[
             {"role": "system", "content": system_prompt},
@@ -49,15 +84,161 @@ Rules:
 
     raw = response.choices[0].message.content.strip()
     try:
-        result = json.loads(raw)
-        intent = result.get("intent", "general")
-        confidence = float(result.get("confidence", 0.0))
-    except (json.JSONDecodeError, ValueError):
-        intent = "general"
-        confidence = 0.0
+        return _result(json.loads(raw))
+    except (json.JSONDecodeError, ValueError, AttributeError):
+        return "general", 0.0
 
-    # Apply threshold — fall back to "general" if below threshold
-    if confidence < settings.intent_confidence_threshold:
-        intent = "general"
 
+def _classify_many(queries: list[str], intent_spaces: list[dict]) -> list[tuple[str, float]]:
+    """Classify several queries against one catalog in a single completion.
+
+    A response that is not one result per query is retried query by query.
+    """
+    if len(queries) == 1:
+        return [_classify_one(queries[0], intent_spaces)]
+    system_prompt = f"""You are an intent classifier for an enterprise knowledge base.
+Classify each user query into exactly one of these intent spaces:
+
+{_spaces_text(intent_spaces)}
+
+The user message is a JSON array of {len(queries)} queries.
+Respond with valid JSON only (no markdown, no explanation): an array with one
+object per query, in the same order:
+[{{"intent": "<space_name>", "confidence": <0.0 to 1.0>}}, ...]
+
+Rules:
+- confidence represents how certain you are (0.0 = no match, 1.0 = perfect match)
+- If no intent clearly matches, still pick the closest one but set low confidence
+- Use the exact name from the list above
+- Classify every query on its own; they come from different users"""
+
+    response = chat_completion(
+        model=settings.openai_chat_model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": json.dumps(queries, ensure_ascii=False)},
+        ],
+        max_tokens=20 + 30 * len(queries),
+        temperature=0,
+    )
+
+    raw = response.choices[0].message.content.strip()
+    try:
+        items = json.loads(raw)
+        if not isinstance(items, list) or len(items) != len(queries):
+            raise ValueError(f"expected {len(queries)} results")
+        return [_result(item) for item in items]
+    except (json.JSONDecodeError, ValueError, AttributeError, TypeError):
+        logger.warning("Malformed batched intent response; classifying %d queries one by one",
+                       len(queries))
+        return [_classify_one(query, intent_spaces) for query in queries]
+
+
+class IntentBatcher:
+    """Coalesces concurrent ``classify_intent`` calls into batched completions.
+
+    The first waiting query opens a batch that collects further arrivals for
+    up to ``intent_batch_max_wait_ms`` or until ``intent_batch_max_size``
+    queries. Queries are grouped by catalog (they share one system prompt),
+    duplicates are sent once, and each group is classified on a worker
+    thread while the next batch collects.
+    """
+
+    def __init__(self):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._pool: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._queries = 0
+
+    def submit(self, query: str, intent_spaces: list[dict]) -> Future:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=settings.intent_batch_concurrency,
+                    thread_name_prefix="intent-batch",
+                )
+                threading.Thread(target=self._collect, daemon=True, name="intent-batcher").start()
+        future = Future()
+        self._queue.put((query, intent_spaces, future))
+        return future
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + settings.intent_batch_max_wait_ms / 1000
+            while len(batch) < settings.intent_batch_max_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            groups: dict[str, list] = {}
+            for item in batch:
+                groups.setdefault(catalog_hash(item[1]), []).append(item)
+            for group in groups.values():
+                self._pool.submit(self._dispatch, group)
+
+    def _dispatch(self, group: list[tuple[str, list[dict], Future]]) -> None:
+        queries = list(dict.fromkeys(query for query, _, _ in group))
+        try:
+            results = dict(zip(queries, _classify_many(queries, group[0][1])))
+        except Exception as exc:
+            for _, _, future in group:
+                future.set_exception(exc)
+            return
+        with self._lock:
+            self._batches += 1
+            self._queries += len(queries)
+        for query, _, future in group:
+            future.set_result(results[query])
+
+    def stats(self) -> dict:
+        with self._lock:
+            batches, queries = self._batches, self._queries
+        return {
+            "batches": batches,
+            "queries": queries,
+            "mean_batch_size": queries / batches if batches else 0.0,
+        }
+
+
+_batcher = IntentBatcher()
+
+
+def batch_stats() -> dict:
+    return _batcher.stats()
+
+
+def classify_intent(
+    query: str,
+    intent_spaces: list[dict],
+) -> tuple[str, float]:
+    """Classify user query into an intent space using GPT zero-shot.
+
+    Args:
+        query: The user's question.
+        intent_spaces: List of dicts with keys: name, description, keywords (list[str]).
+
+    Returns:
+        Tuple of (intent_name, confidence). intent_name is "general" if confidence
+        is below the configured threshold.
+
+    Results are cached per normalized query and intent catalog. Concurrent
+    calls are classified together by the batcher unless
+    ``intent_batch_max_size`` is 1.
+    """
+    key = _cache_key(query, intent_spaces)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    if settings.intent_batch_max_size > 1:
+        intent, confidence = _batcher.submit(query, intent_spaces).result()
+    else:
+        intent, confidence = _classify_one(query, intent_spaces)
+
+    _cache.put(key, (intent, confidence))
     return intent, confidence
@@ -0,0 +1,86 @@
+"""Route queries by the keywords stored on each intent space.
+
+All spaces' keywords are compiled into one alternation regex, rebuilt when
+the catalog changes. A query mentioning keywords of exactly one space goes
+straight to it; keywords listed under several spaces are ignored, and hits
+for more than one space count as no match.
+
+Keywords are matched as whole words and case-insensitively, except short
+all-caps acronyms ("IT", "HR"), which must appear in capitals so that "it"
+in a sentence does not route to IT.
+"""
+
+import re
+import threading
+import unicodedata
+
+from src.ml.intent_classifier import catalog_hash
+
+_ACRONYM_MAX_LENGTH = 5
+
+
+def _is_acronym(keyword: str) -> bool:
+    return keyword.isupper() and len(keyword) <= _ACRONYM_MAX_LENGTH
+
+
+def _pattern(keyword: str) -> str:
+    escaped = r"\s+".join(re.escape(word) for word in keyword.split())
+    return escaped if _is_acronym(keyword) else f"(?i:{escaped})"
+
+
+class KeywordMatcher:
+    def __init__(self, intent_spaces: list[dict]):
+        owners: dict[str, set[str]] = {}
+        spellings: dict[str, set[str]] = {}
+        for space in intent_spaces:
+            for keyword in space["keywords"]:
+                keyword = " ".join(unicodedata.normalize("NFKC", keyword).split())
+                if keyword:
+                    key = keyword if _is_acronym(keyword) else keyword.casefold()
+                    owners.setdefault(key, set()).add(space["name"])
+                    # Case-insensitive regex matching does not fold "ß" to "ss",
+                    # so match the keyword as written as well as its folded key
+                    spellings.setdefault(key, {key}).add(keyword)
+        # Keywords shared between spaces say nothing about which one is meant
+        self._space_of = {k: names.pop() for k, names in owners.items() if len(names) == 1}
+        keywords = sorted(
+            (spelling for k in self._space_of for spelling in spellings[k]),
+            key=len, reverse=True,  # prefer the longest match
+        )
+        self._regex = (
+            re.compile(r"(?<!\w)(?:" + "|".join(_pattern(k) for k in keywords) + r")(?!\w)")
+            if keywords else None
+        )
+
+    def match(self, query: str) -> str | None:
+        """The only space whose keywords appear in ``query``, or None."""
+        if self._regex is None:
+            return None
+        text = " ".join(unicodedata.normalize("NFKC", query).split())
+        spaces = set()
+        for hit in self._regex.finditer(text):
+            keyword = " ".join(hit.group(0).split())
+            spaces.add(self._space_of.get(keyword) or self._space_of[keyword.casefold()])
+        return spaces.pop() if len(spaces) == 1 else None
+
+
+class KeywordRouter:
+    """Keeps a ``KeywordMatcher`` for the current catalog."""
+
+    def __init__(self):
+        self._matcher: tuple[str, KeywordMatcher] | None = None
+        self._lock = threading.Lock()
+
+    def match(self, query: str, intent_spaces: list[dict]) -> str | None:
+        version = catalog_hash(intent_spaces)
+        current = self._matcher
+        if current is None or current[0] != version:
+            with self._lock:
+                current = self._matcher
+                if current is None or current[0] != version:
+                    current = self._matcher = (version, KeywordMatcher(intent_spaces))
+        return current[1].match(query)
+
+
+# Module-level singleton
+keyword_router = KeywordRouter()
@@ -0,0 +1,88 @@
+"""k-nearest-neighbour intent model over labelled query embeddings.
+
+A fitted ``KnnIntentModel`` is immutable: retraining builds a new one and
+swaps it in, so predictions need no lock. Examples carry weights, so admin
+corrections can outvote labels the system assigned itself.
+"""
+
+import numpy as np
+
+_EVAL_SAMPLE = 500  # held-out queries scored at fit time
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+class KnnIntentModel:
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        labels: list[str],
+        weights: np.ndarray,
+        k: int,
+        min_similarity: float,
+        min_agreement: float,
+    ):
+        self.vectors = _unit_rows(np.asarray(vectors, dtype=np.float32))
+        self.labels = np.asarray(labels, dtype=object)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.k = k
+        self.min_similarity = min_similarity
+        self.min_agreement = min_agreement
+        self.accuracy, self.coverage = self._evaluate()
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def _vote(
+        self, similarities: np.ndarray, allowed: set[str] | None
+    ) -> tuple[str, float] | None:
+        k = min(self.k, len(similarities))
+        nearest = np.argpartition(-similarities, k - 1)[:k]
+        if similarities[nearest].max() < self.min_similarity:
+            return None
+        votes: dict[str, float] = {}
+        for i in nearest:
+            label = self.labels[i]
+            if allowed is None or label in allowed:
+                votes[label] = votes.get(label, 0.0) + self.weights[i] * max(similarities[i], 0.0)
+        total = sum(votes.values())
+        if not total:
+            return None
+        label, score = max(votes.items(), key=lambda item: item[1])
+        agreement = score / total
+        return (label, agreement) if agreement >= self.min_agreement else None
+
+    def predict(
+        self, query_embedding: list[float], allowed: set[str] | None = None
+    ) -> tuple[str, float] | None:
+        """(intent, neighbour agreement) when the neighbours agree, else None.
+
+        ``allowed`` restricts votes to intents that still exist.
+        """
+        if not len(self) or len(query_embedding) != self.dim:
+            return None
+        query = _unit_rows(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+        return self._vote(self.vectors @ query, allowed)
+
+    def _evaluate(self) -> tuple[float | None, float | None]:
+        """Leave-one-out accuracy of answered queries, and the share answered."""
+        if len(self) < 2:
+            return None, None
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(self), min(_EVAL_SAMPLE, len(self)), replace=False)
+        similarities = self.vectors[sample] @ self.vectors.T
+        similarities[np.arange(len(sample)), sample] = -np.inf  # leave the query itself out
+        answered = correct = 0
+        for row, i in enumerate(sample):
+            prediction = self._vote(similarities[row], None)
+            if prediction is not None:
+                answered += 1
+                correct += prediction[0] == self.labels[i]
+        return (correct / answered if answered else None), answered / len(sample)
@@ -0,0 +1,219 @@
+"""Shared access to the OpenAI API for every ML module.
+
+One sync and one async client per process, each keeping a pool of
+keep-alive connections, so calls skip the TCP and TLS handshake. Every
+request made through ``chat_completion`` / ``create_embeddings`` (or their
+async twins):
+
+- waits for one of ``llm_max_concurrency`` process-wide slots,
+- has a timeout (``llm_timeout_seconds`` unless the caller passes one),
+- is retried on rate limits, timeouts, connection and 5xx errors with
+  exponential backoff and full jitter (``retry-after`` is honoured),
+- is counted per endpoint: calls, errors, retries, latency and tokens
+  (``GET /analytics/llm``).
+
+The SDK's own retries are disabled; retrying happens here only.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Callable
+
+import httpx
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+from src.config import settings
+
+ENDPOINTS = ("chat.completions", "embeddings")
+RETRYABLE = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+_ASYNC_SLOT_POLL_SECONDS = 0.005
+
+_client: OpenAI | None = None
+_async_client: AsyncOpenAI | None = None
+_slots: threading.BoundedSemaphore | None = None
+_setup_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    n = settings.llm_max_concurrency
+    return httpx.Limits(max_connections=n, max_keepalive_connections=n, keepalive_expiry=60)
+
+
+def _setup() -> None:
+    global _slots
+    if _slots is None:
+        _slots = threading.BoundedSemaphore(settings.llm_max_concurrency)
+
+
+def get_client() -> OpenAI:
+    global _client
+    with _setup_lock:
+        _setup()
+        if _client is None:
+            _client = OpenAI(
+                api_key=settings.openai_api_key,
+                max_retries=0,
+                timeout=settings.llm_timeout_seconds,
+                http_client=DefaultHttpxClient(limits=_limits()),
+            )
+    return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    global _async_client
+    with _setup_lock:
+        _setup()
+        if _async_client is None:
+            _async_client = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                max_retries=0,
+                timeout=settings.llm_timeout_seconds,
+                http_client=DefaultAsyncHttpxClient(limits=_limits()),
+            )
+    return _async_client
+
+
+class _EndpointStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {endpoint: self._empty() for endpoint in ENDPOINTS}
+
+    @staticmethod
+    def _empty() -> dict:
+        return {
+            "calls": 0, "errors": 0, "retries": 0, "latency_ms_total": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+        }
+
+    def record(self, endpoint: str, seconds: float, response=None, error: bool = False) -> None:
+        usage = getattr(response, "usage", None)
+        with self._lock:
+            stats = self._stats[endpoint]
+            stats["calls"] += 1
+            stats["errors"] += error
+            stats["latency_ms_total"] += seconds * 1000
+            stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            stats["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def retried(self, endpoint: str) -> None:
+        with self._lock:
+            self._stats[endpoint]["retries"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                endpoint: {
+                    **stats,
+                    "mean_latency_ms": stats["latency_ms_total"] / stats["calls"]
+                    if stats["calls"] else 0.0,
+                }
+                for endpoint, stats in self._stats.items()
+            }
+
+
+_stats = _EndpointStats()
+
+
+def stats() -> dict:
+    """Per-endpoint call, error and retry counts, latency and token usage."""
+    return _stats.snapshot()
+
+
+def retry_after(error: Exception) -> float | None:
+    """The server's ``retry-after`` header in seconds, if the error carries one."""
+    try:
+        return float(error.response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than ``retry-after``."""
+    ceiling = min(settings.llm_retry_max_seconds, settings.llm_retry_base_seconds * 2**attempt)
+    return max(random.uniform(0, ceiling), retry_after(error) or 0.0)
+
+
+def _method(client: OpenAI | AsyncOpenAI, endpoint: str) -> Callable:
+    if endpoint == "chat.completions":
+        return client.chat.completions.create
+    return client.embeddings.create
+
+
+def _call(endpoint: str, timeout: float | None, retries: int | None, kwargs: dict):
+    create = _method(get_client(), endpoint)
+    retries = settings.llm_max_retries if retries is None else retries
+    timeout = timeout or settings.llm_timeout_seconds
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        try:
+            with _slots:
+                response = create(timeout=timeout, **kwargs)
+        except Exception as e:
+            _stats.record(endpoint, time.perf_counter() - started, error=True)
+            if not isinstance(e, RETRYABLE) or attempt == retries:
+                raise
+            error = e
+        else:
+            _stats.record(endpoint, time.perf_counter() - started, response)
+            return response
+        _stats.retried(endpoint)
+        time.sleep(_backoff(attempt, error))
+
+
+async def _acquire_slot() -> None:
+    # The slots are shared with sync callers, so poll rather than block the loop
+    while not _slots.acquire(blocking=False):
+        await asyncio.sleep(_ASYNC_SLOT_POLL_SECONDS)
+
+
+async def _acall(endpoint: str, timeout: float | None, retries: int | None, kwargs: dict):
+    create = _method(get_async_client(), endpoint)
+    retries = settings.llm_max_retries if retries is None else retries
+    timeout = timeout or settings.llm_timeout_seconds
+    for attempt in range(retries + 1):
+        await _acquire_slot()
+        started = time.perf_counter()
+        try:
+            response = await create(timeout=timeout, **kwargs)
+        except Exception as e:
+            _stats.record(endpoint, time.perf_counter() - started, error=True)
+            if not isinstance(e, RETRYABLE) or attempt == retries:
+                raise
+            error = e
+        else:
+            _stats.record(endpoint, time.perf_counter() - started, response)
+            return response
+        finally:
+            _slots.release()  # not held while backing off
+        _stats.retried(endpoint)
+        await asyncio.sleep(_backoff(attempt, error))
+
+
+def chat_completion(timeout: float | None = None, retries: int | None = None, **kwargs):
+    """``client.chat.completions.create(**kwargs)`` through the gateway."""
+    return _call("chat.completions", timeout, retries, kwargs)
+
+
+def create_embeddings(timeout: float | None = None, retries: int | None = None, **kwargs):
+    """``client.embeddings.create(**kwargs)`` through the gateway."""
+    return _call("embeddings", timeout, retries, kwargs)
+
+
+async def achat_completion(timeout: float | None = None, retries: int | None = None, **kwargs):
+    return await _acall("chat.completions", timeout, retries, kwargs)
+
+
+async def acreate_embeddings(timeout: float | None = None, retries: int | None = None, **kwargs):
+    return await _acall("embeddings", timeout, retries, kwargs)
@@ -1,5 +1,5 @@
-from openai import OpenAI
 from src.config import settings
+from src.ml.llm_gateway import chat_completion
 
 TELEGRAM_MAX_LENGTH = 4096
 
@@ -52,7 +52,6 @@ def generate_response(
         answer = "I couldn't find relevant information in the knowledge base."
         return answer, [], _format_for_channel(answer, [], channel, fallback=True)
 
-    client = OpenAI(api_key=settings.openai_api_key)
     format_hint = _CHANNEL_FORMAT_INSTRUCTIONS.get(channel, "")
 
     if no_kb_results:
@@ -90,7 +89,7 @@ Sources: {', '.join(source_docs)}"""
         messages.extend(conversation_history)
     messages.append({"role": "user", "content": user_message})
 
-    response = client.chat.completions.create(
+    response = chat_completion(
         model=settings.openai_chat_model,
         messages=messages,
         max_tokens=400,
@@ -0,0 +1,370 @@
+"""On-disk segment layout for intent-space vector data.
+
+Each intent space lives in ``<data_dir>/faiss/intent_{id}/``:
+
+- ``manifest.json`` lists the live segments. It is replaced atomically and is
+  the only commit point: files not referenced by it are ignored and cleaned up.
+- ``seg_NNNNNN.vec`` holds a segment's raw row-major embedding matrix.
+- ``seg_NNNNNN.json`` holds the segment's chunk ids, document ids, filenames
+  and text offsets, row-aligned with the matrix.
+- ``seg_NNNNNN.txt`` holds the chunk texts as concatenated UTF-8; row ``i``
+  is bytes ``text_offsets[i]:text_offsets[i + 1]``. It is memory-mapped and
+  only read for search hits, so resident memory does not grow with corpus text.
+- ``seg_NNNNNN.sum`` holds the float64 sum of the matrix rows, written
+  while the matrix is streamed out, so space centroids can be read without
+  mapping any matrix.
+- ``seg_NNNNNN.faiss`` holds a trained ANN index for large segments; flat
+  segments are re-indexed from the matrix on load.
+- ``deleted.log`` is an append-only list of chunk ids removed since the
+  segments holding them were last compacted.
+- ``deleted.sum`` holds the number of those ids and the float64 sum of their
+  vectors. It is rewritten after each deletion log change, and ignored when
+  its count does not match the log (an interrupted write).
+- ``write.lock`` / ``compact.lock`` are ``flock`` targets used when several
+  worker processes share the directory (``vector_shared_mode``).
+
+Segments are immutable once written, so an interrupted write can only leave
+behind an unreferenced file, never a corrupted index.
+"""
+
+import fcntl
+import json
+import os
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import numpy as np
+import faiss
+
+MANIFEST = "manifest.json"
+DELETED_LOG = "deleted.log"
+DELETED_SUM = "deleted.sum"
+WRITE_LOCK = "write.lock"
+COMPACT_LOCK = "compact.lock"
+
+# IVF lists are mapped by IO_FLAG_MMAP; flat-code storage (flat, SQ, PQ, HNSW
+# vectors) by IO_FLAG_MMAP_IFC, which older FAISS builds lack.
+_MMAP_IVF = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+_MMAP_CODES = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+_COPY_BLOCK_ROWS = 65_536
+
+
+@dataclass
+class Segment:
+    """An immutable batch of chunks plus the in-memory index over them.
+
+    Row ``i`` of ``vectors`` belongs to chunk ``ids[i]``; ids are ascending.
+    The index is attached once, before the segment is published to searches,
+    and is never modified afterwards. In shared mode flat segments have no
+    index and are scanned straight from ``vectors``.
+    """
+
+    name: str
+    ids: np.ndarray
+    document_ids: np.ndarray
+    filenames: dict[int, str]
+    text_offsets: np.ndarray
+    texts: np.ndarray | None  # memmapped .txt bytes; None when every text is empty
+    vectors: np.ndarray
+    index: faiss.Index | None = None
+    recall: float | None = None
+    _vector_sum: np.ndarray | None = field(default=None, repr=False)
+
+    @property
+    def rows(self) -> int:
+        return len(self.ids)
+
+    def row_of(self, chunk_id: int) -> int:
+        return int(np.searchsorted(self.ids, chunk_id))
+
+    def text(self, row: int) -> str:
+        start, end = int(self.text_offsets[row]), int(self.text_offsets[row + 1])
+        return self.texts[start:end].tobytes().decode("utf-8") if end > start else ""
+
+    def vector_sum(self) -> np.ndarray:
+        """Float64 sum of every row, deleted or not.
+
+        Read from the ``.sum`` file; computed here only for older segments.
+        """
+        if self._vector_sum is None:
+            total = np.zeros(self.vectors.shape[1], dtype=np.float64)
+            for start in range(0, self.rows, _COPY_BLOCK_ROWS):
+                block = self.vectors[start : start + _COPY_BLOCK_ROWS]
+                total += block.sum(axis=0, dtype=np.float64)
+            self._vector_sum = total
+        return self._vector_sum
+
+    def chunk(self, row: int) -> dict:
+        document_id = int(self.document_ids[row])
+        return {
+            "chunk_text": self.text(row),
+            "document_id": document_id,
+            "filename": self.filenames[document_id],
+        }
+
+
+def segment_name(number: int) -> str:
+    return f"seg_{number:06d}"
+
+
+def _stream_write(path: str, chunks: Iterable[bytes]) -> None:
+    """Write ``path`` via a fsynced temp file and an atomic rename."""
+    with open(f"{path}.tmp", "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{path}.tmp", path)
+
+
+def _fsync_write(path: str, data: bytes) -> None:
+    _stream_write(path, [data])
+
+
+def read_manifest(directory: str) -> dict | None:
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(directory: str, manifest: dict) -> None:
+    _fsync_write(os.path.join(directory, MANIFEST), json.dumps(manifest).encode())
+
+
+def write_segment(
+    directory: str,
+    name: str,
+    ids: np.ndarray,
+    document_ids: np.ndarray,
+    filenames: dict[int, str],
+    chunk_texts: Iterable[str],
+    vector_blocks: Iterable[np.ndarray],
+    dtype: np.dtype,
+) -> None:
+    """Write a segment's matrix, row sum, text and metadata files.
+
+    ``chunk_texts`` and ``vector_blocks`` are written in order, so a compaction
+    can stream rows out of existing segments without materialising them.
+    The metadata file goes last, as the others are useless without it.
+    """
+    sums: list[np.ndarray] = []
+
+    def encode(blocks: Iterable[np.ndarray]) -> Iterator[bytes]:
+        for block in blocks:
+            stored = np.ascontiguousarray(block, dtype=dtype)
+            sums.append(stored.sum(axis=0, dtype=np.float64))
+            yield stored.tobytes()
+
+    _stream_write(os.path.join(directory, f"{name}.vec"), encode(vector_blocks))
+    write_vector_sum(directory, name, np.sum(sums, axis=0))
+    offsets = [0]
+    _stream_write(os.path.join(directory, f"{name}.txt"), _encode_texts(chunk_texts, offsets))
+
+    _fsync_write(
+        os.path.join(directory, f"{name}.json"),
+        json.dumps({
+            "ids": ids.tolist(),
+            "document_ids": document_ids.tolist(),
+            "filenames": {str(k): v for k, v in filenames.items()},
+            "text_offsets": offsets,
+        }).encode(),
+    )
+
+
+def _encode_texts(texts: Iterable[str], offsets: list[int]) -> Iterator[bytes]:
+    """Encode texts for the .txt file, appending each end offset to ``offsets``."""
+    for text in texts:
+        data = text.encode("utf-8")
+        offsets.append(offsets[-1] + len(data))
+        yield data
+
+
+def iter_texts(segment: Segment, rows: np.ndarray) -> Iterator[str]:
+    for row in rows.tolist():
+        yield segment.text(row)
+
+
+def iter_rows(vectors: np.ndarray, rows: np.ndarray) -> Iterable[np.ndarray]:
+    """Yield ``vectors[rows]`` in bounded blocks."""
+    for start in range(0, len(rows), _COPY_BLOCK_ROWS):
+        yield vectors[rows[start : start + _COPY_BLOCK_ROWS]]
+
+
+def write_vector_sum(directory: str, name: str, total: np.ndarray) -> None:
+    _fsync_write(os.path.join(directory, f"{name}.sum"), np.asarray(total, np.float64).tobytes())
+
+
+def read_vector_sum(directory: str, name: str, dim: int) -> np.ndarray | None:
+    """A segment's stored row sum; None for segments written before sums were kept.
+
+    Raises ``FileNotFoundError`` if the segment itself is gone (compacted away).
+    """
+    path = os.path.join(directory, f"{name}.sum")
+    if not os.path.exists(path):
+        if not os.path.exists(os.path.join(directory, f"{name}.vec")):
+            raise FileNotFoundError(path)
+        return None
+    total = np.fromfile(path, dtype=np.float64)
+    return total if len(total) == dim else None
+
+
+def write_deleted_sum(directory: str, count: int, total: np.ndarray) -> None:
+    data = np.concatenate([[float(count)], np.asarray(total, dtype=np.float64)])
+    _fsync_write(os.path.join(directory, DELETED_SUM), data.tobytes())
+
+
+def read_deleted_sum(directory: str, dim: int) -> tuple[int, np.ndarray] | None:
+    """(count, vector sum) of the logged deletions, if recorded for ``dim``."""
+    path = os.path.join(directory, DELETED_SUM)
+    if not os.path.exists(path):
+        return None
+    data = np.fromfile(path, dtype=np.float64)
+    if len(data) != dim + 1:
+        return None
+    return int(data[0]), data[1:]
+
+
+def write_segment_index(directory: str, name: str, index: faiss.Index) -> None:
+    path = os.path.join(directory, f"{name}.faiss")
+    faiss.write_index(index, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+
+def open_segment(directory: str, entry: dict, dim: int, dtype: np.dtype) -> Segment:
+    """Map a segment listed in the manifest. The caller attaches the index."""
+    name = entry["name"]
+    with open(os.path.join(directory, f"{name}.json"), "r") as f:
+        data = json.load(f)
+    if "chunk_texts" in data:
+        data = _move_texts_out(directory, name, data)
+
+    ids = np.array(data["ids"], dtype=np.int64)
+    vectors = np.memmap(
+        os.path.join(directory, f"{name}.vec"), dtype=dtype, mode="r", shape=(len(ids), dim)
+    )
+    offsets = np.array(data["text_offsets"], dtype=np.int64)
+    texts = None
+    if offsets[-1] > 0:
+        texts = np.memmap(os.path.join(directory, f"{name}.txt"), dtype=np.uint8, mode="r")
+    vector_sum = read_vector_sum(directory, name, dim)
+    return Segment(
+        name=name,
+        ids=ids,
+        document_ids=np.array(data["document_ids"], dtype=np.int64),
+        filenames={int(k): v for k, v in data["filenames"].items()},
+        text_offsets=offsets,
+        texts=texts,
+        vectors=vectors,
+        recall=entry.get("recall"),
+        _vector_sum=vector_sum,
+    )
+
+
+def _move_texts_out(directory: str, name: str, data: dict) -> dict:
+    """Upgrade a segment that kept its texts inline in the metadata file."""
+    offsets = [0]
+    _stream_write(
+        os.path.join(directory, f"{name}.txt"), _encode_texts(data.pop("chunk_texts"), offsets)
+    )
+    data["text_offsets"] = offsets
+    _fsync_write(os.path.join(directory, f"{name}.json"), json.dumps(data).encode())
+    return data
+
+
+def read_segment_index(
+    directory: str, name: str, mmap: bool = False, index_type: str | None = None
+) -> faiss.Index | None:
+    """Read a saved index; with ``mmap`` its bulk data is mapped read-only.
+
+    Mapped pages come from the page cache, so processes mapping the same
+    file share one physical copy.
+    """
+    path = os.path.join(directory, f"{name}.faiss")
+    if not os.path.exists(path):
+        return None
+    flags = 0
+    if mmap:
+        flags = _MMAP_IVF if index_type in ("ivf_flat", "ivf_pq") else _MMAP_CODES
+    return faiss.read_index(path, flags)
+
+
+def remove_segment_files(directory: str, name: str) -> None:
+    for suffix in (".vec", ".sum", ".txt", ".json", ".faiss"):
+        path = os.path.join(directory, f"{name}{suffix}")
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def remove_unreferenced_files(directory: str, names: set[str]) -> None:
+    """Delete segment files left behind by an interrupted write or compaction."""
+    for filename in os.listdir(directory):
+        if filename.endswith(".tmp") or (
+            filename.startswith("seg_") and filename.split(".", 1)[0] not in names
+        ):
+            os.remove(os.path.join(directory, filename))
+
+
+@contextmanager
+def file_lock(directory: str, name: str, blocking: bool = True) -> Iterator[bool]:
+    """Hold an exclusive ``flock`` on ``directory/name``; yields whether it was taken.
+
+    Each call opens its own descriptor, so the lock also excludes other
+    threads of the same process.
+    """
+    fd = os.open(os.path.join(directory, name), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def disk_token(directory: str) -> tuple:
+    """Changes (almost always) when a manifest is committed or deletions are logged.
+
+    The manifest is replaced by rename and the deletion log only grows
+    between compactions. A freed inode can be reused by the next rename, so
+    the change time is included too; this is a cheap hint for readers, and
+    writers re-read the manifest under the write lock regardless.
+    """
+    token = []
+    for name in (MANIFEST, DELETED_LOG, DELETED_SUM):
+        try:
+            stat = os.stat(os.path.join(directory, name))
+            token.append((stat.st_ino, stat.st_size, stat.st_ctime_ns))
+        except FileNotFoundError:
+            token.append(None)
+    return tuple(token)
+
+
+def read_deleted(directory: str) -> set[int]:
+    path = os.path.join(directory, DELETED_LOG)
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r") as f:
+        # A torn trailing line from an interrupted append has no newline and is skipped
+        return {int(line) for line in f if line.endswith("\n") and line.strip().isdigit()}
+
+
+def append_deleted(directory: str, ids: list[int]) -> None:
+    with open(os.path.join(directory, DELETED_LOG), "a") as f:
+        f.write("".join(f"{i}\n" for i in ids))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def rewrite_deleted(directory: str, ids: set[int]) -> None:
+    _fsync_write(
+        os.path.join(directory, DELETED_LOG), "".join(f"{i}\n" for i in sorted(ids)).encode()
+    )
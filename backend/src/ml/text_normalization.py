@@ -0,0 +1,18 @@
+"""Query text normalization shared by the in-process caches.
+
+Two questions that differ only in case, spacing, Unicode form or trailing
+punctuation ("What is the leave policy?" / "what is the  leave policy")
+normalize to the same key.
+"""
+
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = "?!.,;:。？！"
+
+
+def normalize_query(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION).rstrip()
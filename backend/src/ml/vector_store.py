@@ -1,45 +1,458 @@
 import json
+import logging
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 import numpy as np
 import faiss
 from src.config import settings
+from src.ml import ann_index, segment_store
+from src.ml.embedding_providers import space_dim, truncate_embeddings
+from src.ml.segment_store import Segment
+
+logger = logging.getLogger(__name__)
+
+# Space directories, plus files of spaces not yet converted to segments
+_SPACE_ENTRY = re.compile(r"^intent_(\d+)(?:_meta\.json)?$")
+
+_SYNC_ATTEMPTS = 3  # re-reads of the manifest when another worker compacts meanwhile
+_LEGACY_DIM = 1536  # pre-segment files always held text-embedding-3-small vectors
+
+
+@dataclass(frozen=True, eq=False)
+class _Snapshot:
+    """A consistent view of one space: its segments and the ids deleted from them.
+
+    Snapshots are never mutated. Searches read ``_Space.snapshot`` once and
+    use only that object, so they need no lock; writers publish a new one.
+    """
+
+    segments: tuple[Segment, ...] = ()
+    deleted: frozenset[int] = frozenset()
+    tombstones: dict[str, int] = field(default_factory=dict)  # deleted rows per segment
+    deleted_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    selector: faiss.IDSelector | None = None  # rejects deleted_ids inside FAISS
+    memory_bytes: int = 0  # estimated resident size of indexes and per-row arrays
+
+    @classmethod
+    def build(
+        cls,
+        segments: tuple[Segment, ...],
+        deleted: frozenset[int],
+        previous: "_Snapshot | None" = None,
+    ) -> "_Snapshot":
+        deleted_ids = np.array(sorted(deleted), dtype=np.int64)
+        known = previous.tombstones if previous is not None and previous.deleted == deleted else {}
+        tombstones = {
+            s.name: known[s.name] if s.name in known
+            else int(np.isin(s.ids, deleted_ids, assume_unique=True).sum())
+            for s in segments
+        }
+        memory_bytes = sum(
+            ann_index.memory_bytes(s.index) + s.ids.nbytes + s.document_ids.nbytes
+            + s.text_offsets.nbytes
+            for s in segments
+        )
+        return cls(
+            segments, deleted, tombstones, deleted_ids,
+            ann_index.exclude_selector(deleted_ids), memory_bytes,
+        )
+
+    @property
+    def deleted_rows(self) -> int:
+        return sum(self.tombstones.values())
+
+    @property
+    def chunk_count(self) -> int:
+        return sum(s.rows for s in self.segments) - self.deleted_rows
+
+
+@dataclass
+class _Space:
+    """One intent space: writer bookkeeping plus the published snapshot.
+
+    ``next_id``, ``next_segment`` and ``pending_writes`` are only touched
+    under the space lock. ``dim`` is 0 until the first write fixes it.
+    """
+
+    directory: str
+    dim: int
+    dtype: np.dtype
+    next_id: int = 0
+    next_segment: int = 1
+    snapshot: _Snapshot = field(default_factory=_Snapshot)
+    pending_writes: int = 0  # adds between id allocation and publish; pins the space
+    disk_token: tuple | None = None  # segment_store.disk_token when last synced
+
+    def publish(self, segments: tuple[Segment, ...], deleted: frozenset[int]) -> None:
+        self.snapshot = _Snapshot.build(segments, deleted, previous=self.snapshot)
+
+    def manifest(self) -> dict:
+        return {
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "next_id": self.next_id,
+            "next_segment": self.next_segment,
+            "segments": [
+                {
+                    "name": s.name,
+                    "rows": s.rows,
+                    "index_type": ann_index.index_type_of(s.index),
+                    "recall": s.recall,
+                }
+                for s in self.snapshot.segments
+            ],
+        }
 
 
 class VectorStore:
-    """FAISS-based vector store with per-intent-space indexes, persisted to disk."""
+    """FAISS-based vector store with per-intent-space indexes, persisted to disk.
 
-    EMBEDDING_DIM = 1536  # text-embedding-3-small
+    Each intent space is an append-only set of immutable segments (see
+    ``segment_store``). Adding a document writes one new segment and a small
+    manifest; removing one appends its chunk ids to a deletion log. Every chunk
+    has a stable id used as its FAISS id, so removals only touch those ids.
+
+    A background compaction merges small segments, drops deleted rows, and
+    builds the configured ANN index type (see ``ann_index``) for segments that
+    reach ``vector_ann_min_chunks``.
+
+    Searches never lock: they run against the space's current ``_Snapshot``.
+    Writers serialise on a per-space lock but build segments and indexes
+    outside it, then publish a new snapshot in one assignment. Indexes are
+    never modified once published; deleted ids are filtered at search time
+    until compaction drops them. Files of replaced segments are unlinked
+    while older snapshots may still map them, which POSIX allows.
+
+    With ``vector_memory_budget_mb`` set, loaded spaces are kept in LRU order
+    and the least recently used ones are unloaded once their estimated size
+    exceeds the budget; they are reloaded from disk on next access.
+
+    With ``vector_shared_mode`` several worker processes serve one data
+    directory. Flat segments are scanned straight from the memory-mapped
+    matrix and ANN indexes are mmapped, so workers share one physical copy
+    through the page cache. Writers take a per-space file lock and persist
+    id allocations in the manifest before building; readers compare the
+    manifest and deletion log against ``disk_token`` on each access and
+    pick up other workers' commits, reusing segments they already have open.
+    """
 
     def __init__(self):
-        self._indexes: dict[int, faiss.IndexFlatL2] = {}
-        self._meta: dict[int, list[dict]] = {}  # intent_space_id -> chunk metadata
+        self._spaces: OrderedDict[int, _Space] = OrderedDict()  # least recently used first
+        self._residency_guard = threading.Lock()
+        self._residency = {"hits": 0, "misses": 0, "evictions": 0}
+        self._locks: dict[int, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+        self._compactions: dict[int, threading.Thread] = {}
+        self._search_pool: ThreadPoolExecutor | None = None
+        self._warmup: dict = {"state": "idle"}
+        self._centroids: dict[int, tuple[tuple, np.ndarray | None]] = {}  # id -> (disk token, mean)
+
+    def _space_dir(self, intent_space_id: int) -> str:
+        return os.path.join(settings.data_dir, "faiss", f"intent_{intent_space_id}")
+
+    def _legacy_path(self, intent_space_id: int, suffix: str) -> str:
+        return os.path.join(settings.data_dir, "faiss", f"intent_{intent_space_id}{suffix}")
+
+    @staticmethod
+    def _storage_dtype() -> np.dtype:
+        dtype = np.dtype(settings.vector_storage_dtype)
+        if dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported vector storage dtype: {settings.vector_storage_dtype}")
+        return dtype
+
+    def _lock(self, intent_space_id: int) -> threading.RLock:
+        """Per-space lock serialising writers (adds, removals, compaction swaps)."""
+        with self._locks_guard:
+            return self._locks.setdefault(intent_space_id, threading.RLock())
+
+    def _target_index_type(self, intent_space_id: int) -> str:
+        return settings.vector_space_index_types.get(intent_space_id, settings.vector_index_type)
+
+    def _segment_index_type(self, intent_space_id: int, rows: int) -> str:
+        target = self._target_index_type(intent_space_id)
+        return target if rows >= settings.vector_ann_min_chunks else "flat"
+
+    # ── Loading ────────────────────────────────────────────────────────────
+
+    def _load(self, intent_space_id: int) -> _Space:
+        directory = self._space_dir(intent_space_id)
+        manifest = segment_store.read_manifest(directory)
+        if manifest is None and os.path.exists(self._legacy_path(intent_space_id, "_meta.json")):
+            self._migrate_legacy_files(intent_space_id)
+            manifest = segment_store.read_manifest(directory)
+
+        if manifest is None:
+            return _Space(directory, 0, self._storage_dtype())
+
+        if not settings.vector_shared_mode:
+            # Another worker could be writing a reserved segment, so only a
+            # single process may treat unlisted files as leftovers.
+            segment_store.remove_unreferenced_files(
+                directory, {entry["name"] for entry in manifest["segments"]}
+            )
+        space = _Space(directory, manifest["dim"], np.dtype(manifest["dtype"]))
+        self._sync_from_disk(space)
+        return space
+
+    def _sync_from_disk(self, space: _Space) -> None:
+        """Publish the space's committed on-disk state, reusing segments already open.
+
+        Retried if another worker's compaction deletes a listed segment while
+        it is being opened.
+        """
+        for attempt in range(_SYNC_ATTEMPTS):
+            token = segment_store.disk_token(space.directory)
+            manifest = segment_store.read_manifest(space.directory)
+            if manifest is None:  # nothing committed yet
+                space.disk_token = token
+                return
+            open_segments = {s.name: s for s in space.snapshot.segments}
+            try:
+                segments = tuple(
+                    open_segments.get(e["name"])
+                    or self._open_segment(space.directory, e, space.dim, space.dtype)
+                    for e in manifest["segments"]
+                )
+                deleted = segment_store.read_deleted(space.directory)
+                break
+            except FileNotFoundError:
+                if attempt == _SYNC_ATTEMPTS - 1:
+                    raise
+        space.dim = manifest["dim"]
+        space.next_id = max(space.next_id, manifest["next_id"])
+        space.next_segment = max(space.next_segment, manifest["next_segment"])
+        space.publish(segments, frozenset(deleted))
+        space.disk_token = token
 
-    def _index_path(self, intent_space_id: int) -> str:
-        return os.path.join(settings.data_dir, "faiss", f"intent_{intent_space_id}.index")
+    def _open_segment(self, directory: str, entry: dict, dim: int, dtype: np.dtype) -> Segment:
+        segment = segment_store.open_segment(directory, entry, dim, dtype)
+        segment.index = segment_store.read_segment_index(
+            directory, segment.name,
+            mmap=settings.vector_index_mmap or settings.vector_shared_mode,
+            index_type=entry.get("index_type"),
+        )
+        if segment.index is None and not settings.vector_shared_mode:
+            segment.index = ann_index.build_index(
+                "flat", dim, segment.vectors, np.arange(segment.rows), segment.ids
+            )
+        return segment
 
-    def _meta_path(self, intent_space_id: int) -> str:
-        return os.path.join(settings.data_dir, "faiss", f"intent_{intent_space_id}_meta.json")
+    def _migrate_legacy_files(self, intent_space_id: int) -> None:
+        """Convert a space saved as single index/meta/matrix files into one segment."""
+        with open(self._legacy_path(intent_space_id, "_meta.json"), "r") as f:
+            data = json.load(f)
+        deleted_path = self._legacy_path(intent_space_id, "_deleted.log")
+        deleted: set[int] = set()
+        if os.path.exists(deleted_path):
+            with open(deleted_path, "r") as f:
+                deleted = {int(line) for line in f if line.endswith("\n") and line.strip().isdigit()}
 
-    def _load(self, intent_space_id: int) -> None:
-        idx_path = self._index_path(intent_space_id)
-        meta_path = self._meta_path(intent_space_id)
+        chunks = data["chunks"]
+        for chunk in chunks:
+            chunk.setdefault("id", chunk.get("faiss_id"))
+        chunks = sorted((c for c in chunks if c["id"] not in deleted), key=lambda c: c["id"])
 
-        if os.path.exists(idx_path) and os.path.exists(meta_path):
-            self._indexes[intent_space_id] = faiss.read_index(idx_path)
-            with open(meta_path, "r") as f:
-                self._meta[intent_space_id] = json.load(f)["chunks"]
+        if chunks and "embedding" in chunks[0]:
+            dtype = np.dtype(np.float32)
+            vectors = np.array([c["embedding"] for c in chunks], dtype=np.float32)
         else:
-            self._indexes[intent_space_id] = faiss.IndexFlatL2(self.EMBEDDING_DIM)
-            self._meta[intent_space_id] = []
+            dtype = np.dtype(data.get("dtype", "float32"))
+            rows = np.array([c["row"] for c in chunks], dtype=np.int64)
+            vectors = np.empty((0, _LEGACY_DIM), dtype=dtype)
+            if chunks:
+                matrix = np.memmap(
+                    self._legacy_path(intent_space_id, "_vectors.bin"),
+                    dtype=dtype,
+                    mode="r",
+                    shape=(data["rows"], _LEGACY_DIM),
+                )
+                vectors = matrix[rows]
+
+        directory = self._space_dir(intent_space_id)
+        os.makedirs(directory, exist_ok=True)
+        space = _Space(
+            directory,
+            vectors.shape[1],
+            dtype,
+            next_id=data.get("next_id", max((c["id"] for c in chunks), default=-1) + 1),
+        )
+        manifest = space.manifest()
+        if chunks:
+            name = segment_store.segment_name(space.next_segment)
+            segment_store.write_segment(
+                directory,
+                name,
+                np.array([c["id"] for c in chunks], dtype=np.int64),
+                np.array([c["document_id"] for c in chunks], dtype=np.int64),
+                {c["document_id"]: c["filename"] for c in chunks},
+                [c["chunk_text"] for c in chunks],
+                [vectors],
+                dtype,
+            )
+            manifest["next_segment"] = space.next_segment + 1
+            manifest["segments"] = [{"name": name, "rows": len(chunks), "index_type": "flat"}]
+        segment_store.write_manifest(directory, manifest)
+
+        for suffix in (".index", "_meta.json", "_vectors.bin", "_deleted.log"):
+            if os.path.exists(self._legacy_path(intent_space_id, suffix)):
+                os.remove(self._legacy_path(intent_space_id, suffix))
+
+    def _ensure_loaded(self, intent_space_id: int) -> _Space:
+        """Return the loaded space, loading it from disk on a miss.
+
+        Callers use the returned object rather than ``_spaces``, which may
+        drop the space at any time under a memory budget.
+        """
+        with self._residency_guard:
+            space = self._spaces.get(intent_space_id)
+            if space is not None:
+                self._spaces.move_to_end(intent_space_id)
+                self._residency["hits"] += 1
+        if space is not None:
+            if settings.vector_shared_mode:
+                self._refresh_if_changed(intent_space_id, space)
+            return space
+
+        with self._lock(intent_space_id):
+            space = self._spaces.get(intent_space_id)
+            if space is None:
+                space = self._load(intent_space_id)
+                with self._residency_guard:
+                    self._spaces[intent_space_id] = space
+                    self._residency["misses"] += 1
+                self._maybe_compact(intent_space_id)
+        self._enforce_memory_budget(keep=intent_space_id)
+        return space
+
+    def _refresh_if_changed(self, intent_space_id: int, space: _Space) -> None:
+        """Pick up commits made by other workers (shared mode)."""
+        if segment_store.disk_token(space.directory) == space.disk_token:
+            return
+        with self._lock(intent_space_id):
+            if segment_store.disk_token(space.directory) != space.disk_token:
+                self._sync_from_disk(space)
+
+    @contextmanager
+    def _write_lock(self, intent_space_id: int) -> Iterator[_Space]:
+        """Serialise writers to a space and yield it, loaded and current.
+
+        In shared mode the per-space lock is preceded by a file lock shared
+        with other workers, and the space is synced with disk under it.
+        """
+        if not settings.vector_shared_mode:
+            with self._lock(intent_space_id):
+                yield self._ensure_loaded(intent_space_id)
+            return
+
+        directory = self._space_dir(intent_space_id)
+        os.makedirs(directory, exist_ok=True)
+        with segment_store.file_lock(directory, segment_store.WRITE_LOCK):
+            with self._lock(intent_space_id):
+                space = self._ensure_loaded(intent_space_id)
+                # The disk token can miss a commit (inode numbers get reused),
+                # so writers always re-read the committed state under the lock
+                self._sync_from_disk(space)
+                yield space
+                # Nobody else could commit meanwhile, so our own writes need no re-sync
+                space.disk_token = segment_store.disk_token(directory)
+
+    def _reserve(self, space: _Space) -> None:
+        """Persist bumped id/segment counters so other workers cannot reuse them."""
+        if settings.vector_shared_mode:
+            segment_store.write_manifest(space.directory, space.manifest())
+
+    def _enforce_memory_budget(self, keep: int) -> None:
+        """Unload least recently used spaces until the loaded ones fit the budget.
+
+        Spaces with a writer in progress or a running compaction are skipped.
+        Searches already running keep their snapshot and finish normally.
+        """
+        budget = settings.vector_memory_budget_mb * 2**20
+        if budget <= 0:
+            return
+        with self._residency_guard:
+            loaded = list(self._spaces.items())
+        total = sum(space.snapshot.memory_bytes for _, space in loaded)
 
-    def _ensure_loaded(self, intent_space_id: int) -> None:
-        if intent_space_id not in self._indexes:
-            self._load(intent_space_id)
+        for sid, space in loaded:
+            if total <= budget:
+                break
+            if sid == keep:
+                continue
+            lock = self._lock(sid)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                compaction = self._compactions.get(sid)
+                if space.pending_writes or (compaction is not None and compaction.is_alive()):
+                    continue
+                with self._residency_guard:
+                    if self._spaces.get(sid) is not space:
+                        continue
+                    del self._spaces[sid]
+                    self._residency["evictions"] += 1
+                total -= space.snapshot.memory_bytes
+                logger.info("Unloaded intent space %d to stay within the memory budget", sid)
+            finally:
+                lock.release()
+
+    def residency_stats(self) -> dict:
+        """Loaded spaces and their estimated size against the budget, plus LRU counters."""
+        with self._residency_guard:
+            loaded = list(self._spaces.values())
+            counters = dict(self._residency)
+        return {
+            "budget_mb": settings.vector_memory_budget_mb,
+            "resident_mb": round(sum(s.snapshot.memory_bytes for s in loaded) / 2**20, 1),
+            "spaces_loaded": len(loaded),
+            **counters,
+        }
+
+    def start_preload(self) -> threading.Thread:
+        """Run ``preload`` in a background thread; not ready until it finishes."""
+        self._warmup = {"state": "warming_up"}
+        thread = threading.Thread(target=self.preload, daemon=True, name="faiss-preload")
+        thread.start()
+        return thread
+
+    def preload(self) -> None:
+        """Load every space on disk in parallel, then run one warm-up search in each.
+
+        The first query to a space then no longer pays for reading its files,
+        and the warm-up search faults in the index and matrix pages.
+        """
+        started = time.perf_counter()
+        self._warmup = {"state": "warming_up"}
+        space_ids = self.space_ids_on_disk()
+        try:
+            with ThreadPoolExecutor(
+                max_workers=settings.vector_preload_workers, thread_name_prefix="faiss-preload"
+            ) as pool:
+                list(pool.map(self._preload_space, space_ids))
+        except Exception:
+            logger.exception("Preloading vector indexes failed; spaces will load on first query")
+        seconds = time.perf_counter() - started
+        self._warmup = {"state": "ready", "spaces": len(space_ids), "seconds": round(seconds, 3)}
+        logger.info("Preloaded %d intent space(s) in %.2fs", len(space_ids), seconds)
 
-    def _persist(self, intent_space_id: int) -> None:
-        faiss.write_index(self._indexes[intent_space_id], self._index_path(intent_space_id))
-        with open(self._meta_path(intent_space_id), "w") as f:
-            json.dump({"chunks": self._meta[intent_space_id]}, f)
+    def _preload_space(self, intent_space_id: int) -> None:
+        dim = self._ensure_loaded(intent_space_id).dim
+        if not dim:
+            return
+        self._search_space(intent_space_id, np.zeros((1, dim), dtype=np.float32), 1)
+
+    def warmup_status(self) -> dict:
+        """Preload state; ``ready`` is False only while a preload is running."""
+        return {**self._warmup, "ready": self._warmup["state"] != "warming_up"}
+
+    # ── Writes ─────────────────────────────────────────────────────────────
 
     def add_document(
         self,
@@ -49,95 +462,578 @@ class VectorStore:
         document_id: int,
         filename: str,
     ) -> int:
-        """Add document chunks to the index. Returns number of chunks added."""
-        self._ensure_loaded(intent_space_id)
-        index = self._indexes[intent_space_id]
-        meta = self._meta[intent_space_id]
+        """Add document chunks to the index. Returns number of chunks added.
 
+        The chunks are written as one new segment; existing files are not rewritten.
+        Only id allocation and the final swap hold the space lock.
+        """
+        if not chunks:
+            return 0
         vectors = np.array(embeddings, dtype=np.float32)
-        start_id = index.ntotal
-        index.add(vectors)
-
-        for i, chunk_text in enumerate(chunks):
-            meta.append({
-                "faiss_id": start_id + i,
-                "document_id": document_id,
-                "filename": filename,
-                "chunk_text": chunk_text,
-            })
+        with self._write_lock(intent_space_id) as space:
+            if space.next_id == 0:
+                space.dim = vectors.shape[1]  # a new space takes its first write's dimension
+            if vectors.shape[1] != space.dim:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match "
+                    f"intent space dimension {space.dim}"
+                )
+            ids = np.arange(space.next_id, space.next_id + len(chunks), dtype=np.int64)
+            name = segment_store.segment_name(space.next_segment)
+            space.next_id += len(chunks)
+            space.next_segment += 1
+            space.pending_writes += 1
+            self._reserve(space)
 
-        self._persist(intent_space_id)
+        try:
+            os.makedirs(space.directory, exist_ok=True)
+            segment_store.write_segment(
+                space.directory,
+                name,
+                ids,
+                np.full(len(chunks), document_id, dtype=np.int64),
+                {document_id: filename},
+                chunks,
+                [vectors],
+                space.dtype,
+            )
+            segment = segment_store.open_segment(
+                space.directory, {"name": name}, space.dim, space.dtype
+            )
+            if not settings.vector_shared_mode:
+                segment.index = ann_index.build_index(
+                    "flat", space.dim, vectors, np.arange(len(chunks)), ids
+                )
+
+            with self._write_lock(intent_space_id):
+                snapshot = space.snapshot
+                space.publish(snapshot.segments + (segment,), snapshot.deleted)
+                segment_store.write_manifest(space.directory, space.manifest())
+                self._maybe_compact(intent_space_id)
+        finally:
+            with self._lock(intent_space_id):
+                space.pending_writes -= 1
+        self._enforce_memory_budget(keep=intent_space_id)
         return len(chunks)
 
     def remove_document(self, intent_space_id: int, document_id: int) -> None:
-        """Remove all chunks for a document. Rebuilds index (safe for MVP scale)."""
-        self._ensure_loaded(intent_space_id)
-        meta = self._meta[intent_space_id]
-
-        remaining = [m for m in meta if m["document_id"] != document_id]
-        if len(remaining) == len(meta):
-            return  # nothing to remove
-
-        # Rebuild index from remaining chunks
-        new_index = faiss.IndexFlatL2(self.EMBEDDING_DIM)
-        new_meta = []
-
-        if remaining:
-            # Re-embed and re-add is expensive; instead store embeddings in meta
-            # For MVP: store original embeddings in meta to allow cheap rebuilds
-            embeddings = [m.get("embedding", [0.0] * self.EMBEDDING_DIM) for m in remaining]
-            vectors = np.array(embeddings, dtype=np.float32)
-            new_index.add(vectors)
-            for i, m in enumerate(remaining):
-                new_meta.append({**m, "faiss_id": i})
-
-        self._indexes[intent_space_id] = new_index
-        self._meta[intent_space_id] = new_meta
-        self._persist(intent_space_id)
+        """Remove all chunks for a document.
+
+        Only the document's ids are written to disk (appended to the deletion
+        log) and published as deleted; searches filter them out. Their rows
+        are reclaimed by the next compaction.
+        """
+        with self._write_lock(intent_space_id) as space:
+            snapshot = space.snapshot
+            ids = {
+                i
+                for segment in snapshot.segments
+                for i in segment.ids[segment.document_ids == document_id].tolist()
+            } - snapshot.deleted
+            if not ids:
+                return  # nothing to remove
+
+            segment_store.append_deleted(space.directory, sorted(ids))
+            space.publish(snapshot.segments, snapshot.deleted | ids)
+            self._write_deleted_sum(space, previous=snapshot, added=ids)
+            self._maybe_compact(intent_space_id)
+
+    # ── Compaction ─────────────────────────────────────────────────────────
+
+    def _segments_to_compact(self, intent_space_id: int, snapshot: _Snapshot) -> list[Segment]:
+        segments = list(snapshot.segments)
+        if not segments:
+            return []
+        total_rows = sum(s.rows for s in segments)
+
+        # Index type change: merge everything into one segment of the right type
+        wanted = self._segment_index_type(intent_space_id, snapshot.chunk_count)
+        largest = max(segments, key=lambda s: s.rows)
+        if wanted != "flat" and ann_index.index_type_of(largest.index) != wanted:
+            return segments
+        if wanted == "flat" and any(
+            ann_index.index_type_of(s.index) != "flat" for s in segments
+        ):
+            return segments
+
+        if snapshot.deleted_rows > settings.vector_compaction_deleted_ratio * total_rows:
+            return segments
+        if len(segments) <= settings.vector_compaction_max_segments:
+            return []
+
+        # Size-tiered: keep each older segment that outweighs everything after it,
+        # so large segments are rewritten only logarithmically often.
+        start, tail = 0, total_rows
+        while start < len(segments) - 2:
+            tail -= segments[start].rows
+            if segments[start].rows <= tail:
+                break
+            start += 1
+        return segments[start:]
+
+    def _maybe_compact(self, intent_space_id: int) -> None:
+        merging = self._segments_to_compact(intent_space_id, self._spaces[intent_space_id].snapshot)
+        if not merging:
+            return
+        running = self._compactions.get(intent_space_id)
+        if running is not None and running.is_alive():
+            return
+        thread = threading.Thread(
+            target=self._compact,
+            args=(intent_space_id, [s.name for s in merging]),
+            daemon=True,
+            name=f"faiss-compact-{intent_space_id}",
+        )
+        self._compactions[intent_space_id] = thread
+        thread.start()
+
+    def _compact(self, intent_space_id: int, names: list[str]) -> None:
+        """Merge segments into one, dropping deleted rows, then swap it in.
+
+        The merged segment and its index are built without holding the space
+        lock. Ids removed meanwhile stay in the published deleted set, since
+        the merged segment still holds them. In shared mode a non-blocking
+        file lock makes sure only one worker compacts a space at a time.
+        """
+        try:
+            with self._compaction_lease(intent_space_id) as leased:
+                if leased:
+                    self._compact_segments(intent_space_id, names)
+        except Exception:
+            logger.exception("Compacting intent space %d failed", intent_space_id)
+        self._enforce_memory_budget(keep=intent_space_id)
+
+    @contextmanager
+    def _compaction_lease(self, intent_space_id: int) -> Iterator[bool]:
+        if not settings.vector_shared_mode:
+            yield True
+            return
+        with segment_store.file_lock(
+            self._space_dir(intent_space_id), segment_store.COMPACT_LOCK, blocking=False
+        ) as leased:
+            yield leased
+
+    def _compact_segments(self, intent_space_id: int, names: list[str]) -> None:
+        with self._write_lock(intent_space_id) as space:
+            captured = space.snapshot
+            # Another worker may have compacted some of them already
+            merging = [s for s in captured.segments if s.name in names]
+            if not merging:
+                return
+            name = segment_store.segment_name(space.next_segment)
+            space.next_segment += 1
+            self._reserve(space)
+
+        deleted = captured.deleted_ids
+        runs, ids, document_ids = self._live_rows(merging, deleted)
+        replacement = []
+        if len(ids):
+            replacement.append(self._write_merged_segment(
+                intent_space_id, space, name, merging, runs, ids, document_ids
+            ))
+
+        merged_ids = np.concatenate([s.ids for s in merging])
+        dropped = frozenset(deleted[np.isin(deleted, merged_ids)].tolist())
+
+        with self._write_lock(intent_space_id):
+            current = space.snapshot
+            merged = {s.name for s in merging}
+            position = next(i for i, s in enumerate(current.segments) if s.name in merged)
+            segments = (
+                current.segments[:position] + tuple(replacement)
+                + tuple(s for s in current.segments[position:] if s.name not in merged)
+            )
+            space.publish(segments, current.deleted - dropped)
+            segment_store.write_manifest(space.directory, space.manifest())
+            segment_store.rewrite_deleted(space.directory, space.snapshot.deleted)
+            self._write_deleted_sum(space)
+            for old in merging:
+                segment_store.remove_segment_files(space.directory, old.name)
+
+    @staticmethod
+    def _live_rows(
+        segments: list[Segment], deleted: np.ndarray
+    ) -> tuple[list[tuple[Segment, np.ndarray]], np.ndarray, np.ndarray]:
+        """Rows not in ``deleted``, ordered by chunk id, plus their chunk and document ids.
+
+        Concurrent adds can publish segments out of id order, while a segment's
+        ids must ascend (``Segment.row_of``), so the rows come back as runs of
+        ``(segment, rows)`` that together list every live row by chunk id.
+        """
+        keep = [np.flatnonzero(~np.isin(s.ids, deleted)) for s in segments]
+        empty = [np.empty(0, dtype=np.int64)]
+        ids = np.concatenate(empty + [s.ids[rows] for s, rows in zip(segments, keep)])
+        document_ids = np.concatenate(
+            empty + [s.document_ids[rows] for s, rows in zip(segments, keep)]
+        )
+        source = np.concatenate(empty + [np.full(len(rows), i) for i, rows in enumerate(keep)])
+        rows = np.concatenate(empty + keep)
+        order = np.argsort(ids, kind="stable")
+        breaks = np.flatnonzero(np.diff(source[order])) + 1
+        runs = [
+            (segments[source[run[0]]], rows[run])
+            for run in np.split(order, breaks) if len(run)
+        ]
+        return runs, ids[order], document_ids[order]
+
+    @staticmethod
+    def _rows_sum(segments: tuple[Segment, ...], ids: np.ndarray, dim: int) -> np.ndarray:
+        """Float64 sum of the stored vectors of chunk ``ids``."""
+        total = np.zeros(dim, dtype=np.float64)
+        for segment in segments:
+            rows = np.flatnonzero(np.isin(segment.ids, ids))
+            if len(rows):
+                total += segment.vectors[rows].sum(axis=0, dtype=np.float64)
+        return total
+
+    def _write_deleted_sum(
+        self, space: _Space, previous: _Snapshot | None = None, added: set[int] | None = None
+    ) -> None:
+        """Record the count and vector sum of the logged deletions (see ``space_centroid``).
+
+        With ``added`` only those rows are read, on top of the sum recorded
+        for ``previous``, when that record is intact.
+        """
+        current = space.snapshot
+        stored = None
+        if previous is not None:
+            stored = segment_store.read_deleted_sum(space.directory, space.dim)
+        if stored is not None and stored[0] == len(previous.deleted):
+            ids = np.array(sorted(added), dtype=np.int64)
+            total = stored[1] + self._rows_sum(current.segments, ids, space.dim)
+        else:
+            total = self._rows_sum(current.segments, current.deleted_ids, space.dim)
+        segment_store.write_deleted_sum(space.directory, len(current.deleted), total)
+
+    def _write_merged_segment(
+        self,
+        intent_space_id: int,
+        space: _Space,
+        name: str,
+        merging: list[Segment],
+        runs: list[tuple[Segment, np.ndarray]],
+        ids: np.ndarray,
+        document_ids: np.ndarray,
+        dim: int | None = None,
+    ) -> Segment:
+        """Write ``runs`` (see ``_live_rows``) of ``merging`` as segment ``name`` and index it.
+
+        With ``dim`` the vectors are truncated to that size and renormalized.
+        """
+        dim = dim or space.dim
+        live_documents = set(document_ids.tolist())
+        filenames = {
+            doc: filename
+            for s in merging for doc, filename in s.filenames.items()
+            if doc in live_documents
+        }
+        segment_store.write_segment(
+            space.directory,
+            name,
+            ids,
+            document_ids,
+            filenames,
+            (
+                text
+                for s, rows in runs
+                for text in segment_store.iter_texts(s, rows)
+            ),
+            (
+                truncate_embeddings(block, dim) if dim < space.dim else block
+                for s, rows in runs
+                for block in segment_store.iter_rows(s.vectors, rows)
+            ),
+            space.dtype,
+        )
+        segment = segment_store.open_segment(space.directory, {"name": name}, dim, space.dtype)
+        index_type = self._segment_index_type(intent_space_id, segment.rows)
+        logger.info(
+            "Compacting %d segment(s) of intent space %d into %s (%d chunks, %s)",
+            len(merging), intent_space_id, name, segment.rows, index_type,
+        )
+        if index_type == "flat" and settings.vector_shared_mode:
+            return segment  # scanned from the mapped matrix
+        segment.index = ann_index.build_index(
+            index_type, dim, segment.vectors, np.arange(segment.rows), segment.ids
+        )
+        if index_type != "flat":
+            segment.recall = ann_index.recall_at_k(
+                segment.index, segment.vectors, segment.ids,
+                settings.vector_recall_k, settings.vector_recall_sample_size,
+            )
+            logger.info(
+                "Intent space %d %s recall@%d vs flat: %.3f",
+                intent_space_id, index_type, settings.vector_recall_k, segment.recall,
+            )
+            segment_store.write_segment_index(space.directory, name, segment.index)
+            if settings.vector_shared_mode:
+                # Serve the mapped file like other workers do, not a private copy
+                segment.index = segment_store.read_segment_index(
+                    space.directory, name, mmap=True, index_type=index_type
+                )
+        return segment
+
+    def reproject_space(self, intent_space_id: int, dim: int) -> int:
+        """Cut a space's stored vectors to their first ``dim`` components, renormalized.
+
+        Every segment is rewritten into one (dropping deleted rows) under the
+        write lock, so this is an offline operation; see
+        ``scripts/reproject_embeddings.py``. Returns the number of chunks kept.
+        """
+        compaction = self._compactions.get(intent_space_id)
+        if compaction is not None:
+            compaction.join()
+        with self._write_lock(intent_space_id) as space:
+            if space.pending_writes:
+                raise ValueError(f"Intent space {intent_space_id} has writes in progress")
+            if not 0 < dim < space.dim:
+                raise ValueError(
+                    f"Cannot reproject intent space {intent_space_id} "
+                    f"from dimension {space.dim} to {dim}"
+                )
+            merging = list(space.snapshot.segments)
+            runs, ids, document_ids = self._live_rows(merging, space.snapshot.deleted_ids)
+            replacement = []
+            if len(ids):
+                name = segment_store.segment_name(space.next_segment)
+                space.next_segment += 1
+                replacement.append(self._write_merged_segment(
+                    intent_space_id, space, name, merging, runs, ids, document_ids, dim=dim
+                ))
+            space.dim = dim
+            space.publish(tuple(replacement), frozenset())
+            segment_store.write_manifest(space.directory, space.manifest())
+            segment_store.rewrite_deleted(space.directory, set())
+            self._write_deleted_sum(space)
+            for old in merging:
+                segment_store.remove_segment_files(space.directory, old.name)
+        logger.info("Reprojected intent space %d to %d dimensions", intent_space_id, dim)
+        return len(ids)
+
+    # ── Reads ──────────────────────────────────────────────────────────────
+
+    def space_ids_on_disk(self) -> list[int]:
+        """Ids of every intent space with data under ``<data_dir>/faiss``."""
+        faiss_dir = os.path.join(settings.data_dir, "faiss")
+        if not os.path.isdir(faiss_dir):
+            return []
+        found = set()
+        for name in os.listdir(faiss_dir):
+            match = _SPACE_ENTRY.match(name)
+            if match:
+                found.add(int(match.group(1)))
+        return sorted(found)
+
+    def _search_space(
+        self, intent_space_id: int, queries: np.ndarray, k: int, skip_mismatched: bool = False
+    ) -> list[tuple[Segment, np.ndarray, np.ndarray]]:
+        """Per-segment (segment, distances, chunk_ids) top-k blocks of one space.
+
+        Runs against one snapshot without locking. Deleted ids are skipped
+        inside FAISS where the index supports it and are masked with an
+        infinite distance otherwise. A space whose dimension the queries
+        cannot match raises, or with ``skip_mismatched`` is logged and skipped.
+        """
+        space = self._ensure_loaded(intent_space_id)
+        snapshot = space.snapshot
+        if snapshot.segments and queries.shape[1] != space.dim:
+            if queries.shape[1] > space.dim and space_dim(intent_space_id) == space.dim:
+                queries = truncate_embeddings(queries, space.dim)
+            elif skip_mismatched:
+                logger.warning(
+                    "Skipping intent space %d: dimension %d does not match query dimension %d",
+                    intent_space_id, space.dim, queries.shape[1],
+                )
+                return []
+            else:
+                raise ValueError(
+                    f"Query dimension {queries.shape[1]} does not match "
+                    f"intent space {intent_space_id} dimension {space.dim}"
+                )
+        blocks = []
+
+        for segment in snapshot.segments:
+            tombstones = snapshot.tombstones[segment.name]
+            if tombstones == segment.rows:
+                continue
+            distances, chunk_ids = ann_index.search(
+                segment.index, segment.vectors, segment.ids, queries, k,
+                snapshot.selector if tombstones else None, tombstones,
+            )
+            distances[(chunk_ids < 0) | np.isin(chunk_ids, snapshot.deleted_ids)] = np.inf
+            blocks.append((segment, distances, chunk_ids))
+        return blocks
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._locks_guard:
+            if self._search_pool is None:
+                self._search_pool = ThreadPoolExecutor(
+                    max_workers=settings.vector_search_workers,
+                    thread_name_prefix="faiss-search",
+                )
+            return self._search_pool
+
+    def search_batch(
+        self,
+        space_ids: list[int] | None,
+        query_matrix: np.ndarray | list[list[float]],
+        k: int = 5,
+    ) -> list[list[dict]]:
+        """Search an N×D matrix of queries in one FAISS call per segment.
+
+        ``space_ids`` selects the spaces to search; None means every space on
+        disk, skipping spaces of another dimension (e.g. built with a previous
+        embedding provider). Spaces are searched in parallel and merged per query with a
+        vectorised top-k, so only the returned hits cost Python work.
+        Returns one result list per query, shaped like ``search`` results.
+        """
+        queries = np.ascontiguousarray(query_matrix, dtype=np.float32)
+        if queries.ndim != 2:
+            raise ValueError("query_matrix must be a 2-D array of query embeddings")
+
+        if space_ids is None:
+            targets = sorted(set(self.space_ids_on_disk()) | set(self._spaces))
+        else:
+            targets = list(dict.fromkeys(space_ids))
+
+        def search_one(sid: int) -> list[tuple[Segment, np.ndarray, np.ndarray]]:
+            return self._search_space(sid, queries, k, skip_mismatched=space_ids is None)
+
+        if len(targets) > 1:
+            per_space = list(self._executor().map(search_one, targets))
+        else:
+            per_space = [search_one(sid) for sid in targets]
+
+        blocks = [block for space_blocks in per_space for block in space_blocks]
+        if not blocks:
+            return [[] for _ in range(len(queries))]
+
+        segments = [segment for segment, _, _ in blocks]
+        distances = np.hstack([d for _, d, _ in blocks])
+        chunk_ids = np.hstack([i for _, _, i in blocks])
+        owners = np.hstack([
+            np.full(d.shape, n, dtype=np.int32) for n, (_, d, _) in enumerate(blocks)
+        ])
+
+        # Lower distance = better
+        top = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        top_distances = np.take_along_axis(distances, top, axis=1).tolist()
+        top_ids = np.take_along_axis(chunk_ids, top, axis=1).tolist()
+        top_owners = np.take_along_axis(owners, top, axis=1).tolist()
+
+        results = []
+        for row_distances, row_ids, row_owners in zip(top_distances, top_ids, top_owners):
+            hits = []
+            for dist, chunk_id, owner in zip(row_distances, row_ids, row_owners):
+                if dist == float("inf"):
+                    break
+                segment = segments[owner]
+                hits.append({
+                    **segment.chunk(segment.row_of(chunk_id)),
+                    "distance": dist,
+                    "similarity": 1.0 / (1.0 + dist),
+                })
+            results.append(hits)
+        return results
 
     def search(
         self,
         intent_space_id: int | None,
         query_embedding: list[float],
         k: int = 5,
+        space_ids: list[int] | None = None,
     ) -> list[dict]:
         """Search for top-k similar chunks.
 
-        If intent_space_id is None, search across all loaded indexes.
+        If intent_space_id is None, every space on disk (optionally restricted
+        to ``space_ids``) is searched in parallel and the results merged.
         Returns list of: {chunk_text, document_id, filename, distance, similarity}
         """
-        query_vec = np.array([query_embedding], dtype=np.float32)
-        results: list[dict] = []
-
-        space_ids = list(self._indexes.keys()) if intent_space_id is None else [intent_space_id]
+        targets = [intent_space_id] if intent_space_id is not None else space_ids
+        return self.search_batch(targets, [query_embedding], k)[0]
 
-        for sid in space_ids:
-            self._ensure_loaded(sid)
-            index = self._indexes[sid]
-            meta = self._meta[sid]
+    def space_centroid(self, intent_space_id: int) -> np.ndarray | None:
+        """Mean of the space's live chunk vectors; None for an empty space.
 
-            if index.ntotal == 0:
-                continue
+        Computed from the row sums stored next to each segment and the
+        deletion sum, so the space is never loaded for it and the memory
+        budget's LRU is not touched. Cached until the space's files change.
+        """
+        directory = self._space_dir(intent_space_id)
+        token = segment_store.disk_token(directory)
+        cached = self._centroids.get(intent_space_id)
+        if cached is not None and cached[0] == token:
+            return cached[1]
+        complete, centroid = self._read_centroid(intent_space_id)
+        if not complete:
+            # Written before sums were kept (or mid-write): store them once
+            self._write_missing_sums(intent_space_id)
+            token = segment_store.disk_token(directory)
+            complete, centroid = self._read_centroid(intent_space_id)
+        if complete:
+            self._centroids[intent_space_id] = (token, centroid)
+        return centroid
 
-            actual_k = min(k, index.ntotal)
-            distances, indices = index.search(query_vec, actual_k)
+    def _read_centroid(self, intent_space_id: int) -> tuple[bool, np.ndarray | None]:
+        """(sums were all present, centroid) from the space's files on disk."""
+        directory = self._space_dir(intent_space_id)
+        for _ in range(_SYNC_ATTEMPTS):
+            manifest = segment_store.read_manifest(directory)
+            if manifest is None:
+                legacy = os.path.exists(self._legacy_path(intent_space_id, "_meta.json"))
+                return not legacy, None
+            dim = manifest["dim"]
+            total = np.zeros(dim, dtype=np.float64)
+            rows = 0
+            try:
+                for entry in manifest["segments"]:
+                    vector_sum = segment_store.read_vector_sum(directory, entry["name"], dim)
+                    if vector_sum is None:
+                        return False, None
+                    total += vector_sum
+                    rows += entry["rows"]
+            except FileNotFoundError:
+                continue  # compacted away meanwhile; re-read the manifest
+            deleted = segment_store.read_deleted(directory)
+            if deleted:
+                stored = segment_store.read_deleted_sum(directory, dim)
+                if stored is None or stored[0] != len(deleted):
+                    return False, None
+                total -= stored[1]
+                rows -= stored[0]
+            return True, (total / rows).astype(np.float32) if rows > 0 else None
+        return False, None
 
-            for dist, idx in zip(distances[0], indices[0]):
-                if idx < 0 or idx >= len(meta):
-                    continue
-                chunk_meta = meta[idx]
-                similarity = 1.0 / (1.0 + float(dist))
-                results.append({
-                    "chunk_text": chunk_meta["chunk_text"],
-                    "document_id": chunk_meta["document_id"],
-                    "filename": chunk_meta["filename"],
-                    "distance": float(dist),
-                    "similarity": similarity,
-                })
+    def _write_missing_sums(self, intent_space_id: int) -> None:
+        with self._write_lock(intent_space_id) as space:
+            for segment in space.snapshot.segments:
+                if segment_store.read_vector_sum(space.directory, segment.name, space.dim) is None:
+                    segment_store.write_vector_sum(
+                        space.directory, segment.name, segment.vector_sum()
+                    )
+            if space.snapshot.deleted:
+                self._write_deleted_sum(space)
 
-        # Sort by distance (lower = better) and return top-k
-        results.sort(key=lambda x: x["distance"])
-        return results[:k]
+    def index_stats(self) -> list[dict]:
+        """Index type, size and measured recall@k for every loaded space."""
+        stats = []
+        for sid, space in list(self._spaces.items()):
+            snapshot = space.snapshot
+            segments = snapshot.segments
+            largest = max(segments, key=lambda s: s.rows, default=None)
+            recalls = [s.recall for s in segments if s.recall is not None]
+            compaction = self._compactions.get(sid)
+            stats.append({
+                "intent_space_id": sid,
+                "index_type": ann_index.index_type_of(largest.index) if largest else "flat",
+                "target_index_type": self._target_index_type(sid),
+                "dim": space.dim,
+                "chunks": snapshot.chunk_count,
+                "segments": len(segments),
+                "recall_at_k": min(recalls) if recalls else None,
+                "compacting": compaction is not None and compaction.is_alive(),
+            })
+        return stats
 
     def add_document_with_embeddings_stored(
         self,
@@ -147,26 +1043,12 @@ class VectorStore:
         document_id: int,
         filename: str,
     ) -> int:
-        """Add document chunks and store embeddings in meta for later rebuilds."""
-        self._ensure_loaded(intent_space_id)
-        index = self._indexes[intent_space_id]
-        meta = self._meta[intent_space_id]
-
-        vectors = np.array(embeddings, dtype=np.float32)
-        start_id = index.ntotal
-        index.add(vectors)
-
-        for i, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
-            meta.append({
-                "faiss_id": start_id + i,
-                "document_id": document_id,
-                "filename": filename,
-                "chunk_text": chunk_text,
-                "embedding": embedding,
-            })
+        """Add document chunks and store embeddings for later rebuilds.
 
-        self._persist(intent_space_id)
-        return len(chunks)
+        Embeddings are always kept in the segment matrix now; this is an alias
+        of ``add_document`` kept for existing callers.
+        """
+        return self.add_document(intent_space_id, chunks, embeddings, document_id, filename)
 
 
 # Module-level singleton
@@ -4,6 +4,13 @@ import json
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from src.db.models import QueryLog, Document, IntentSpace
+from src.ml.embedder import query_cache_stats
+from src.ml.embedding_cache import embedding_cache
+from src.ml import llm_gateway
+from src.ml.intent_classifier import batch_stats as intent_batch_stats, cache_stats as intent_cache_stats
+from src.ml.vector_store import vector_store
+from src.services.intent_feedback import feedback_trainer
+from src.services.intent_router import route_stats
 
 def reclassify_query(query_id: int, correct_intent: str, db: Session) -> None:
     """Admin overrides the detected intent for a query — used as a feedback signal."""
@@ -18,6 +25,7 @@ def reclassify_query(query_id: int, correct_intent: str, db: Session) -> None:
     log.detected_intent = correct_intent
     log.response_status = "reclassified"
     db.commit()
+    feedback_trainer.request_retrain()
 
 
 def get_query_logs(
@@ -76,6 +84,38 @@ def get_kb_stats(db: Session) -> dict:
     }
 
 
+def get_vector_store_stats() -> dict:
+    """Index, memory residency and warm-up state of the vector store, for tuning."""
+    return {
+        "spaces": vector_store.index_stats(),
+        "residency": vector_store.residency_stats(),
+        "warmup": vector_store.warmup_status(),
+    }
+
+
+def get_cache_stats() -> dict:
+    """Hit rates of the embedding and intent classification caches."""
+    return {
+        "query_embeddings": query_cache_stats(),
+        "chunk_embeddings": embedding_cache.stats(),
+        "intent_classifications": intent_cache_stats(),
+    }
+
+
+def get_intent_routing_stats() -> dict:
+    """How many queries each intent routing tier answered, plus kNN and LLM batching metrics."""
+    return {
+        **route_stats(),
+        "knn_model": feedback_trainer.stats(),
+        "llm_batching": intent_batch_stats(),
+    }
+
+
+def get_llm_stats() -> dict:
+    """Calls, errors, retries, latency and tokens per OpenAI endpoint."""
+    return llm_gateway.stats()
+
+
 def export_csv(db: Session) -> str:
     logs = db.query(QueryLog).order_by(QueryLog.timestamp.desc()).all()
     output = io.StringIO()
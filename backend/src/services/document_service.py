@@ -6,6 +6,7 @@ from src.config import settings
 from src.db.models import Document, IntentSpace
 from src.ml.document_parser import parse_document
 from src.ml.embedder import embed_texts
+from src.ml.embedding_providers import space_dim
 from src.ml.vector_store import vector_store
 
 
@@ -60,7 +61,7 @@ def save_and_parse(
     # Parse and vectorize synchronously (acceptable for MVP; no background task queue)
     try:
         chunks = parse_document(file_bytes, filename)
-        embeddings = embed_texts(chunks)
+        embeddings = embed_texts(chunks, dim=space_dim(intent_space_id))
         vector_store.add_document_with_embeddings_stored(
             intent_space_id=intent_space_id,
             chunks=chunks,
@@ -99,7 +100,7 @@ def reparse_document(doc_id: int, db: Session) -> Document:
             file_bytes = f.read()
 
         chunks = parse_document(file_bytes, doc.filename)
-        embeddings = embed_texts(chunks)
+        embeddings = embed_texts(chunks, dim=space_dim(doc.intent_space_id))
         vector_store.add_document_with_embeddings_stored(
             intent_space_id=doc.intent_space_id,
             chunks=chunks,
@@ -0,0 +1,173 @@
+"""Learn intents from logged queries and admin reclassifications.
+
+Queries the LLM classified confidently (directly or from its cache) are weak
+labels; queries an admin reclassified are strong ones, weighted by
+``intent_knn_feedback_weight``. Answers of the local tiers, this model's
+included, are never trained on, so it cannot reinforce its own mistakes.
+A background thread refits a ``KnnIntentModel`` over their embeddings every
+``intent_knn_retrain_seconds``, or as soon as a query is reclassified. Only
+texts new since the last fit are embedded, so retraining is incremental.
+"""
+
+import datetime
+import logging
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.db.database import SessionLocal
+from src.db.models import IntentSpace, QueryLog
+from src.ml.embedder import embed_texts, get_provider
+from src.ml.knn_classifier import KnnIntentModel
+from src.ml.text_normalization import normalize_query
+
+logger = logging.getLogger(__name__)
+
+_TEACHER_TIERS = ("llm", "cache")  # routing tiers whose answers are used as labels
+
+
+class FeedbackTrainer:
+    def __init__(self):
+        self.model: KnnIntentModel | None = None
+        self._vectors: dict[str, list[float]] = {}  # normalized query -> embedding
+        self._provider_key: tuple | None = None
+        self._feedback_examples = 0
+        self._trained_at: datetime.datetime | None = None
+        self._train_seconds: float | None = None
+        self._consulted = 0
+        self._answered = 0
+        self._lock = threading.Lock()  # guards the counters
+        self._train_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _examples(self, db: Session) -> dict[str, tuple[str, bool, str]]:
+        """Normalized query -> (intent, reclassified, query as asked), newest first.
+
+        An admin correction beats any automatic label of the same text.
+        """
+        names = {name for (name,) in db.query(IntentSpace.name)}
+        rows = (
+            db.query(QueryLog.user_query, QueryLog.detected_intent, QueryLog.response_status)
+            .filter(or_(
+                QueryLog.response_status == "reclassified",
+                and_(
+                    QueryLog.routing_tier.in_(_TEACHER_TIERS),
+                    QueryLog.confidence_score >= settings.intent_confidence_threshold,
+                ),
+            ))
+            .order_by(QueryLog.timestamp.desc(), QueryLog.id.desc())
+            .limit(settings.intent_knn_max_examples)
+            .all()
+        )
+        examples: dict[str, tuple[str, bool, str]] = {}
+        for query, intent, status in rows:
+            text = normalize_query(query)
+            if not text or intent not in names:
+                continue
+            reclassified = status == "reclassified"
+            if text not in examples or (reclassified and not examples[text][1]):
+                examples[text] = (intent, reclassified, query)
+        return examples
+
+    def retrain(self, db: Session | None = None) -> None:
+        """Refit the model on the current logs; ``db`` defaults to a new session."""
+        with self._train_lock:
+            started = time.perf_counter()
+            if db is None:
+                with SessionLocal() as session:
+                    examples = self._examples(session)
+            else:
+                examples = self._examples(db)
+
+            provider = get_provider()
+            if (provider.name, provider.dim) != self._provider_key:
+                self._vectors = {}
+                self._provider_key = (provider.name, provider.dim)
+            # Embedded as asked, like embed_query does for incoming queries
+            queries = [query for _, _, query in examples.values()]
+            missing = list(dict.fromkeys(q for q in queries if q not in self._vectors))
+            if missing:
+                embedded = embed_texts(missing, use_cache=settings.query_embedding_cache_persistent)
+                self._vectors.update(zip(missing, embedded))
+            self._vectors = {query: self._vectors[query] for query in queries}
+
+            if examples:
+                weight = settings.intent_knn_feedback_weight
+                self.model = KnnIntentModel(
+                    np.array([self._vectors[query] for query in queries], dtype=np.float32),
+                    [intent for intent, _, _ in examples.values()],
+                    np.array([weight if strong else 1.0 for _, strong, _ in examples.values()]),
+                    k=settings.intent_knn_k,
+                    min_similarity=settings.intent_knn_min_similarity,
+                    min_agreement=settings.intent_knn_min_agreement,
+                )
+            else:
+                self.model = None
+            self._feedback_examples = sum(strong for _, strong, _ in examples.values())
+            self._trained_at = datetime.datetime.utcnow()
+            self._train_seconds = time.perf_counter() - started
+            logger.info(
+                "Intent kNN retrained on %d queries (%d reclassified) in %.2fs",
+                len(examples), self._feedback_examples, self._train_seconds,
+            )
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    def predict(
+        self, query_embedding: list[float], intent_spaces: list[dict]
+    ) -> tuple[str, float] | None:
+        """(intent, confidence) when the nearest labelled queries agree, else None."""
+        model = self.model
+        if model is None:
+            return None
+        prediction = model.predict(query_embedding, {space["name"] for space in intent_spaces})
+        with self._lock:
+            self._consulted += 1
+            self._answered += prediction is not None
+        return prediction
+
+    def request_retrain(self) -> None:
+        """Wake the background thread to retrain now, e.g. after a reclassification."""
+        self._wake.set()
+
+    def start(self) -> threading.Thread:
+        """Train once, then keep retraining in a daemon thread."""
+        self._thread = threading.Thread(target=self._run, daemon=True, name="intent-knn-retrain")
+        self._thread.start()
+        return self._thread
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.retrain()
+            except Exception:
+                logger.exception("Retraining the intent kNN model failed")
+            self._wake.wait(settings.intent_knn_retrain_seconds)
+            self._wake.clear()
+
+    def stats(self) -> dict:
+        """Training set size, held-out accuracy, and how often the tier escalated."""
+        model = self.model
+        with self._lock:
+            consulted, answered = self._consulted, self._answered
+        return {
+            "examples": len(model) if model else 0,
+            "feedback_examples": self._feedback_examples,
+            "trained_at": self._trained_at.isoformat() if self._trained_at else None,
+            "train_seconds": self._train_seconds,
+            "holdout_accuracy": model.accuracy if model else None,
+            "holdout_coverage": model.coverage if model else None,
+            "consulted": consulted,
+            "answered": answered,
+            "escalation_rate": (consulted - answered) / consulted if consulted else None,
+        }
+
+
+feedback_trainer = FeedbackTrainer()
@@ -0,0 +1,147 @@
+"""Tiered intent routing: cheap local tiers first, the LLM only when unsure.
+
+A query naming keywords of exactly one space is routed by them (keyword
+tier). Next, a kNN model trained on logged queries and admin
+reclassifications answers when the nearest past queries agree (knn tier).
+Otherwise the centroid tier answers when its best space beats the
+runner-up by at least ``intent_centroid_margin``; ambiguous or weak matches
+escalate to the GPT classifier, unless it already classified the same
+question against the same catalog (cache tier). Per-tier counts are kept for
+``GET /analytics/intent-routing``.
+"""
+
+import logging
+import math
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+
+from src.config import settings
+from src.ml.centroid_classifier import centroid_classifier
+from src.ml.intent_classifier import cached_intent, classify_intent
+from src.ml.keyword_router import keyword_router
+from src.services.intent_feedback import feedback_trainer
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("keyword", "knn", "centroid", "cache", "llm")
+_KEYWORD_CONFIDENCE = 1.0  # the query names the space's own keyword
+
+_counts = dict.fromkeys(TIERS, 0)
+_counts_lock = threading.Lock()
+
+
+def _count(tier: str) -> None:
+    with _counts_lock:
+        _counts[tier] += 1
+
+
+def _confidence(scores: list[tuple[str, float]]) -> float:
+    """Softmax probability of the best space over all of them."""
+    temperature = settings.intent_centroid_temperature
+    top = scores[0][1]
+    return 1.0 / sum(math.exp((score - top) / temperature) for _, score in scores)
+
+
+def rank_spaces(query_embedding: list[float], intent_spaces: list[dict]) -> list[tuple[str, float]]:
+    """Centroid scores, best first; empty if they cannot be computed."""
+    try:
+        return centroid_classifier.scores(query_embedding, intent_spaces)
+    except Exception:
+        logger.exception("Centroid intent classification failed; asking the LLM")
+        return []
+
+
+def _centroid_decision(scores: list[tuple[str, float]]) -> tuple[str, float] | None:
+    if not scores:
+        return None
+    name, top = scores[0]
+    runner_up = scores[1][1] if len(scores) > 1 else -1.0
+    if top < settings.intent_centroid_min_similarity:
+        return None
+    if top - runner_up < settings.intent_centroid_margin:
+        return None
+    return name, _confidence(scores)
+
+
+def _embedding_available(query_embedding: list[float] | Future) -> bool:
+    # Centroid mode waits for the embedding anyway; llm mode never blocks on it
+    if settings.intent_router_mode == "centroid" or not isinstance(query_embedding, Future):
+        return True
+    return query_embedding.done()
+
+
+def route_intent(
+    query: str,
+    query_embedding: list[float] | Future,
+    intent_spaces: list[dict],
+    on_escalate: Callable[[list[tuple[str, float]]], None] | None = None,
+) -> tuple[str, float]:
+    """Classify ``query`` into an intent space; same result shape as ``classify_intent``.
+
+    ``intent_spaces`` are dicts with keys: id, name, description, keywords.
+    ``query_embedding`` may be a future still being computed; in ``llm`` mode
+    it is never waited for, and the kNN tier is skipped unless the embedding
+    is already done. ``on_escalate`` is called with the centroid ranking just
+    before the LLM is asked, so callers can start work on the likely spaces
+    while it answers.
+    """
+    intent, confidence, _ = route_intent_with_tier(
+        query, query_embedding, intent_spaces, on_escalate
+    )
+    return intent, confidence
+
+
+def route_intent_with_tier(
+    query: str,
+    query_embedding: list[float] | Future,
+    intent_spaces: list[dict],
+    on_escalate: Callable[[list[tuple[str, float]]], None] | None = None,
+) -> tuple[str, float, str]:
+    """``route_intent`` plus the name of the tier (see ``TIERS``) that answered."""
+    if settings.intent_keyword_routing:
+        name = keyword_router.match(query, intent_spaces)
+        if name is not None:
+            _count("keyword")
+            return name, _KEYWORD_CONFIDENCE, "keyword"
+    if (
+        settings.intent_knn_enabled
+        and feedback_trainer.ready
+        and _embedding_available(query_embedding)
+    ):
+        if isinstance(query_embedding, Future):
+            query_embedding = query_embedding.result()
+        prediction = feedback_trainer.predict(query_embedding, intent_spaces)
+        if prediction is not None:
+            _count("knn")
+            return *prediction, "knn"
+    if settings.intent_router_mode == "centroid":
+        if isinstance(query_embedding, Future):
+            query_embedding = query_embedding.result()
+        scores = rank_spaces(query_embedding, intent_spaces)
+        decision = _centroid_decision(scores)
+        if decision is not None:
+            _count("centroid")
+            return *decision, "centroid"
+    cached = cached_intent(query, intent_spaces)
+    if cached is not None:
+        _count("cache")
+        return *cached, "cache"
+    if settings.intent_router_mode == "centroid" and on_escalate is not None:
+        on_escalate(scores)
+    _count("llm")
+    return *classify_intent(query, intent_spaces), "llm"
+
+
+def route_stats() -> dict:
+    """Queries answered by each tier, each tier's share, and the share kept off the LLM."""
+    with _counts_lock:
+        counts = dict(_counts)
+    total = sum(counts.values())
+    return {
+        "total": total,
+        "short_circuit_share": (total - counts["llm"]) / total if total else 0.0,
+        "tiers": {
+            tier: {"count": n, "share": n / total if total else 0.0} for tier, n in counts.items()
+        },
+    }
@@ -1,6 +1,7 @@
 import json
 from sqlalchemy.orm import Session
 from src.db.models import IntentSpace, Document
+from src.ml.intent_classifier import invalidate_cache
 
 
 def list_intent_spaces(db: Session) -> list[IntentSpace]:
@@ -27,6 +28,7 @@ def create_intent_space(name: str, description: str, keywords: list[str], db: Se
     )
     db.add(space)
     db.commit()
+    invalidate_cache()
     db.refresh(space)
     return space
 
@@ -45,6 +47,7 @@ def update_intent_space(
     if keywords is not None:
         space.keywords = json.dumps(keywords)
     db.commit()
+    invalidate_cache()
     db.refresh(space)
     return space
 
@@ -58,6 +61,7 @@ def delete_intent_space(space_id: int, db: Session) -> None:
         raise ValueError(f"Cannot delete: {doc_count} document(s) are associated with this intent space")
     db.delete(space)
     db.commit()
+    invalidate_cache()
 
 
 def get_document_count(space_id: int, db: Session) -> int:
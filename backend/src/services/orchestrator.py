@@ -1,16 +1,21 @@
 import json
 import time
 import datetime
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from sqlalchemy.orm import Session
 
 from src.db.models import IntentSpace, Document, QueryLog
-from src.ml.intent_classifier import classify_intent
 from src.ml.embedder import embed_query
 from src.ml.vector_store import vector_store
 from src.ml.rag_engine import generate_response
+from src.services.intent_router import route_intent_with_tier
 from src.config import settings
 
+_pipeline: ThreadPoolExecutor | None = None
+_pipeline_guard = threading.Lock()
+
 
 @dataclass
 class QueryResult:
@@ -24,32 +29,18 @@ class QueryResult:
     response_time_ms: int
 
 
-def process_query(query: str, channel: str, user_id: str | None, db: Session) -> QueryResult:
-    """Main orchestration pipeline: classify → retrieve → generate → log."""
-    start_time = time.time()
+def _executor() -> ThreadPoolExecutor:
+    global _pipeline
+    with _pipeline_guard:
+        if _pipeline is None:
+            _pipeline = ThreadPoolExecutor(
+                max_workers=settings.query_pipeline_workers, thread_name_prefix="query-pipeline"
+            )
+        return _pipeline
 
-    # 1. Load intent spaces for classification
-    spaces = db.query(IntentSpace).all()
-    intent_space_list = [
-        {
-            "name": s.name,
-            "description": s.description,
-            "keywords": json.loads(s.keywords),
-        }
-        for s in spaces
-    ]
-
-    # 2. Classify intent
-    detected_intent, confidence = classify_intent(query, intent_space_list)
 
-    # 3. Determine which FAISS index to search
-    intent_space_id: int | None = None
-    if detected_intent != "general":
-        space = db.query(IntentSpace).filter_by(name=detected_intent).first()
-        if space:
-            intent_space_id = space.id
-
-    # 4. Load recent conversation history for this user (same channel)
+def _load_history(user_id: str | None, channel: str, db: Session) -> list[dict]:
+    """Recent Q&A turns of this user on this channel, oldest first."""
     conversation_history: list[dict] = []
     if user_id:
         limit = settings.conversation_history_limit
@@ -65,12 +56,58 @@ def process_query(query: str, channel: str, user_id: str | None, db: Session) ->
             conversation_history.append({"role": "user", "content": log.user_query})
             if log.agent_response:
                 conversation_history.append({"role": "assistant", "content": log.agent_response})
+    return conversation_history
+
+
+def process_query(query: str, channel: str, user_id: str | None, db: Session) -> QueryResult:
+    """Main orchestration pipeline: classify → retrieve → generate → log.
+
+    The query embedding is computed while conversation history loads. If
+    classification has to ask the LLM, the best-ranked candidate spaces are
+    searched meanwhile and the winner's results are used as they are.
+    """
+    start_time = time.time()
+    pool = _executor()
+
+    # 1. Start embedding the query; classification and retrieval both use it
+    embedding_future = pool.submit(embed_query, query)
+
+    # 2. Load intent spaces and conversation history (the session stays on this thread)
+    spaces = db.query(IntentSpace).all()
+    intent_space_list = [
+        {
+            "id": s.id,
+            "name": s.name,
+            "description": s.description,
+            "keywords": json.loads(s.keywords),
+        }
+        for s in spaces
+    ]
+    space_ids = {s["name"]: s["id"] for s in intent_space_list}
+    conversation_history = _load_history(user_id, channel, db)
+
+    # 3. Classify intent, pre-searching the likely spaces if the LLM is consulted
+    speculative: dict[int, Future] = {}
+
+    def presearch(candidates: list[tuple[str, float]]) -> None:
+        for name, _ in candidates[: settings.query_speculative_spaces]:
+            sid = space_ids[name]
+            speculative[sid] = pool.submit(
+                vector_store.search, sid, embedding_future.result(), k=5
+            )
+
+    detected_intent, confidence, routing_tier = route_intent_with_tier(
+        query, embedding_future, intent_space_list, on_escalate=presearch
+    )
 
-    # 5. Embed query and retrieve chunks
-    query_embedding = embed_query(query)
-    chunks = vector_store.search(intent_space_id, query_embedding, k=5)
+    # 4. Retrieve chunks from the detected space (every space for "general")
+    intent_space_id = space_ids.get(detected_intent) if detected_intent != "general" else None
+    if intent_space_id in speculative:
+        chunks = speculative[intent_space_id].result()
+    else:
+        chunks = vector_store.search(intent_space_id, embedding_future.result(), k=5)
 
-    # 6. Generate RAG response
+    # 5. Generate RAG response
     fallback = detected_intent == "general" or not chunks
     answer, source_docs, channel_formatted = generate_response(
         query, chunks, channel, conversation_history
@@ -79,7 +116,7 @@ def process_query(query: str, channel: str, user_id: str | None, db: Session) ->
     response_time_ms = int((time.time() - start_time) * 1000)
     response_status = "fallback" if fallback or not source_docs else "success"
 
-    # 7. Increment access_count for source documents
+    # 6. Increment access_count for source documents
     if source_docs:
         db.query(Document).filter(
             Document.filename.in_(source_docs)
@@ -88,7 +125,7 @@ def process_query(query: str, channel: str, user_id: str | None, db: Session) ->
             synchronize_session=False,
         )
 
-    # 8. Log the query and persist the agent response
+    # 7. Log the query and persist the agent response
     log = QueryLog(
         user_query=query,
         agent_response=answer,
@@ -99,6 +136,7 @@ def process_query(query: str, channel: str, user_id: str | None, db: Session) ->
         channel=channel,
         user_id=user_id,
         response_time_ms=response_time_ms,
+        routing_tier=routing_tier,
     )
     db.add(log)
     db.commit()
@@ -0,0 +1,96 @@
+"""Memory per million chunks vs recall for every vector index type.
+
+Run from ``backend/``::
+
+    python -m tests.benchmarks.bench_quantization --chunks 100000 --output quant.json
+
+Each index is built over the same synthetic corpus (see ``synthetic``). Memory
+is the serialised index size, which is what a loaded segment keeps resident;
+the exact vectors used for rescoring stay in the on-disk matrix. Recall@k is
+measured against an exact flat search, with and without rescoring.
+"""
+
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from src.config import settings
+from src.ml import ann_index
+from tests.benchmarks import synthetic
+
+
+def _recall(expected: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(e) & set(f)) for e, f in zip(expected.tolist(), found.tolist()))
+    return hits / expected.size
+
+
+def run(chunks: int, dim: int, n_queries: int, k: int, index_types: list[str]) -> list[dict]:
+    vectors = synthetic.embeddings(chunks, dim)
+    queries = synthetic.queries(n_queries, dim)
+    ids = np.arange(chunks, dtype=np.int64)
+    expected = ann_index.exact_search(vectors, ids, ids, queries, k)
+
+    report = []
+    for index_type in index_types:
+        started = time.perf_counter()
+        index = ann_index.build_index(index_type, dim, vectors, ids, ids)
+        build_seconds = time.perf_counter() - started
+        index_bytes = faiss.serialize_index(index).nbytes
+
+        started = time.perf_counter()
+        _, raw = index.search(queries, k, params=ann_index.search_params(index))
+        raw_ms = (time.perf_counter() - started) * 1000 / n_queries
+
+        started = time.perf_counter()
+        _, served = ann_index.search(index, vectors, ids, queries, k)
+        served_ms = (time.perf_counter() - started) * 1000 / n_queries
+
+        report.append({
+            "index_type": index_type,
+            "rescored": ann_index.needs_rescore(index) and settings.vector_rescore_factor > 1,
+            "bytes_per_chunk": index_bytes / chunks,
+            "mb_per_million_chunks": index_bytes / chunks * 1_000_000 / 2**20,
+            "recall_at_k_raw": _recall(expected, raw),
+            "recall_at_k": _recall(expected, served),
+            "build_seconds": build_seconds,
+            "search_ms_per_query": served_ms,
+            "raw_search_ms_per_query": raw_ms,
+        })
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-types", nargs="+", default=list(ann_index.INDEX_TYPES))
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "chunks": args.chunks,
+        "dim": args.dim,
+        "k": args.k,
+        "rescore_factor": settings.vector_rescore_factor,
+        "results": run(args.chunks, args.dim, args.queries, args.k, args.index_types),
+    }
+
+    print(f"{'index':<10} {'MB / 1M chunks':>15} {'recall raw':>11} {'recall':>8} {'ms/query':>9}")
+    for row in report["results"]:
+        print(
+            f"{row['index_type']:<10} {row['mb_per_million_chunks']:>15.0f} "
+            f"{row['recall_at_k_raw']:>11.3f} {row['recall_at_k']:>8.3f} "
+            f"{row['search_ms_per_query']:>9.2f}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""VectorStore micro-benchmarks over synthetic corpora.
+
+Run from ``backend/`` (no OpenAI key or network needed)::
+
+    python -m tests.benchmarks.bench_vector_store --sizes 10000 100000 --output vs.json
+
+For each corpus size a fresh data directory is filled document by document
+through ``add_document_with_embeddings_stored``, then single and batched
+search, ``remove_document`` and a cold load are timed. The cold load runs in
+a child process so its RSS is not inflated by the ingest that preceded it.
+The ``VECTOR_*`` settings in effect (env / .env) are recorded in the report,
+so runs of different index layouts can be compared release to release.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from src.config import settings
+from src.ml.vector_store import VectorStore
+from tests.benchmarks import synthetic
+
+SPACE_ID = 1
+DEFAULT_DIM = 1536  # text-embedding-3-small
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _rss_mb() -> float:
+    """Current resident set size; peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentiles(samples_ms: list[float]) -> dict:
+    values = np.asarray(samples_ms)
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _wait_for_compaction(store: VectorStore) -> None:
+    while (thread := store._compactions.get(SPACE_ID)) is not None and thread.is_alive():
+        thread.join()
+
+
+def _ingest(store: VectorStore, chunks: int, dim: int, doc_chunks: int) -> dict:
+    rss_before = _rss_mb()
+    latencies = []
+    started = time.perf_counter()
+    document_id = 0
+    for block in synthetic.iter_embeddings(chunks, dim, block=doc_chunks):
+        document_id += 1
+        texts = [f"doc {document_id} chunk {i}" for i in range(len(block))]
+        call_started = time.perf_counter()
+        store.add_document_with_embeddings_stored(
+            SPACE_ID, texts, block.tolist(), document_id, f"doc_{document_id}.pdf"
+        )
+        latencies.append((time.perf_counter() - call_started) * 1000)
+    seconds = time.perf_counter() - started
+    _wait_for_compaction(store)
+    return {
+        "documents": document_id,
+        "seconds": seconds,
+        "chunks_per_second": chunks / seconds,
+        "compaction_wait_seconds": time.perf_counter() - started - seconds,
+        "rss_mb_delta": _rss_mb() - rss_before,
+        **_percentiles(latencies),
+    }
+
+
+def _search(store: VectorStore, queries: np.ndarray, k: int) -> dict:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        store.search(SPACE_ID, query.tolist(), k=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    store.search_batch([SPACE_ID], queries, k=k)
+    batch_seconds = time.perf_counter() - started
+    return {
+        "queries": len(queries),
+        "k": k,
+        **_percentiles(latencies),
+        "batch_queries_per_second": len(queries) / batch_seconds,
+    }
+
+
+def _remove(store: VectorStore, documents: int, removals: int) -> dict:
+    latencies = []
+    for document_id in np.linspace(1, documents, min(removals, documents), dtype=int).tolist():
+        started = time.perf_counter()
+        store.remove_document(SPACE_ID, document_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+    _wait_for_compaction(store)
+    return {"documents": len(latencies), **_percentiles(latencies)}
+
+
+def cold_load(k: int) -> dict:
+    """Load the space in this (fresh) process and run its first search."""
+    rss_before = _rss_mb()
+    store = VectorStore()
+    started = time.perf_counter()
+    space = store._ensure_loaded(SPACE_ID)
+    load_seconds = time.perf_counter() - started
+
+    query = synthetic.queries(1, space.dim)[0].tolist()
+    started = time.perf_counter()
+    store.search(SPACE_ID, query, k=k)
+    first_search_ms = (time.perf_counter() - started) * 1000
+    return {
+        "seconds": load_seconds,
+        "first_search_ms": first_search_ms,
+        "segments": len(space.snapshot.segments),
+        "estimated_resident_mb": space.snapshot.memory_bytes / 2**20,
+        "rss_mb_before": rss_before,
+        "rss_mb_after": _rss_mb(),
+    }
+
+
+def _cold_load_in_child(data_dir: str, k: int) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-m", "tests.benchmarks.bench_vector_store", "--cold-load", "--k", str(k)],
+        cwd=BACKEND_DIR,  # so ``-m tests.benchmarks...`` resolves from any directory
+        env={**os.environ, "DATA_DIR": data_dir},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_size(
+    chunks: int, doc_chunks: int, n_queries: int, k: int, removals: int, dim: int = DEFAULT_DIM
+) -> dict:
+    data_dir = tempfile.mkdtemp(prefix="bench_vector_store_")
+    original_data_dir = settings.data_dir
+    settings.data_dir = data_dir
+    try:
+        os.makedirs(os.path.join(data_dir, "faiss"))
+        store = VectorStore()
+        add = _ingest(store, chunks, dim, doc_chunks)
+        search = _search(store, synthetic.queries(n_queries, dim), k)
+        remove = _remove(store, add["documents"], removals)
+        space = store._ensure_loaded(SPACE_ID)
+        disk_bytes = sum(
+            os.path.getsize(os.path.join(space.directory, name))
+            for name in os.listdir(space.directory)
+        )
+        return {
+            "chunks": chunks,
+            "dim": dim,
+            "add": add,
+            "search": search,
+            "remove": remove,
+            "cold_load": _cold_load_in_child(data_dir, k),
+            "index_stats": store.index_stats(),
+            "disk_mb": disk_bytes / 2**20,
+        }
+    finally:
+        settings.data_dir = original_data_dir
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def run(
+    sizes: list[int],
+    doc_chunks: int = 50,
+    n_queries: int = 200,
+    k: int = 5,
+    removals: int = 20,
+    dim: int = DEFAULT_DIM,
+) -> dict:
+    return {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "faiss": faiss.__version__,
+        "numpy": np.__version__,
+        "settings": {
+            name: value for name, value in settings.model_dump().items()
+            if name.startswith("vector_")
+        },
+        "results": [run_size(n, doc_chunks, n_queries, k, removals, dim) for n in sizes],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--doc-chunks", type=int, default=50, help="chunks per added document")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="embedding dimension")
+    parser.add_argument("--removals", type=int, default=20)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--cold-load", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_load:
+        print(json.dumps(cold_load(args.k)))
+        return
+
+    report = run(args.sizes, args.doc_chunks, args.queries, args.k, args.removals, args.dim)
+    print(f"{'chunks':>9} {'add/s':>9} {'search p50':>11} {'p95':>8} {'remove p50':>11} "
+          f"{'cold load':>10} {'RSS MB':>8}")
+    for row in report["results"]:
+        print(
+            f"{row['chunks']:>9} {row['add']['chunks_per_second']:>9.0f} "
+            f"{row['search']['p50_ms']:>9.2f}ms {row['search']['p95_ms']:>6.2f}ms "
+            f"{row['remove']['p50_ms']:>9.2f}ms {row['cold_load']['seconds']:>9.2f}s "
+            f"{row['cold_load']['rss_mb_after']:>8.0f}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Synthetic embeddings for vector-store benchmarks.
+
+Real embeddings are clustered by topic, so uniform noise would make every
+ANN index look worse than it is. Vectors here are drawn around a fixed set of
+random topic centres and L2-normalised like OpenAI embeddings.
+"""
+
+from collections.abc import Iterator
+
+import numpy as np
+
+_TOPICS = 256
+_SPREAD = 0.6
+
+
+def _centres(dim: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((_TOPICS, dim)).astype(np.float32)
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def iter_embeddings(n: int, dim: int, block: int = 10_000, seed: int = 0) -> Iterator[np.ndarray]:
+    """Yield ``n`` embeddings in blocks of at most ``block`` rows."""
+    centres = _centres(dim, seed)
+    for number, start in enumerate(range(0, n, block)):
+        rng = np.random.default_rng((seed, number))
+        rows = min(block, n - start)
+        topics = rng.integers(0, _TOPICS, rows)
+        noise = rng.standard_normal((rows, dim)).astype(np.float32) * _SPREAD
+        yield _normalise(centres[topics] + noise)
+
+
+def embeddings(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    return np.concatenate(list(iter_embeddings(n, dim, seed=seed)))
+
+
+def queries(n: int, dim: int, seed: int = 1) -> np.ndarray:
+    """Queries near the same topics as ``embeddings`` (drawn with another seed)."""
+    centres = _centres(dim, 0)
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * _SPREAD
+    return _normalise(centres[rng.integers(0, _TOPICS, n)] + noise)
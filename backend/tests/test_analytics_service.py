@@ -4,7 +4,8 @@ import json
 import pytest
 from src.db.models import QueryLog, IntentSpace
 from src.services.analytics_service import (
-    get_query_logs, get_kb_stats, reclassify_query, export_csv,
+    get_query_logs, get_kb_stats, reclassify_query, export_csv, get_vector_store_stats,
+    get_cache_stats,
 )
 
 
@@ -92,3 +93,17 @@ class TestExportCsv:
         _add_query_log(db_session)
         csv_content = export_csv(db_session)
         assert "leave policy" in csv_content
+
+
+class TestVectorStoreStats:
+    def test_reports_residency_counters(self):
+        stats = get_vector_store_stats()
+        assert set(stats) == {"spaces", "residency", "warmup"}
+        assert {"hits", "misses", "evictions", "budget_mb"} <= set(stats["residency"])
+
+
+class TestCacheStats:
+    def test_reports_embedding_caches(self):
+        stats = get_cache_stats()
+        assert set(stats) == {"query_embeddings", "chunk_embeddings", "intent_classifications"}
+        assert {"hits", "misses", "hit_rate"} <= set(stats["query_embeddings"])
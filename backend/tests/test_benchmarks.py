@@ -0,0 +1,17 @@
+"""Smoke test for the benchmark suite — a tiny corpus end to end."""
+
+from tests.benchmarks import bench_vector_store
+
+
+class TestVectorStoreBenchmark:
+    def test_report_covers_every_operation(self):
+        report = bench_vector_store.run([300], doc_chunks=100, n_queries=5, k=3, removals=2)
+
+        assert report["settings"]["vector_index_type"] == "flat"
+        [result] = report["results"]
+        assert result["chunks"] == 300
+        assert result["add"]["documents"] == 3
+        assert result["search"]["queries"] == 5
+        assert result["remove"]["documents"] == 2
+        assert result["cold_load"]["segments"] >= 1
+        assert result["cold_load"]["rss_mb_after"] > 0
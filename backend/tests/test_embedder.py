@@ -0,0 +1,208 @@
+"""Tests for embedder: persistent embedding cache in front of the API."""
+
+import importlib.util
+import threading
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import pytest
+from openai import InternalServerError, RateLimitError
+
+from src.config import settings
+from src.ml import embedder
+from src.ml.embedding_cache import EmbeddingCache
+from src.ml.embedding_providers import EmbeddingProvider, HashingProvider
+from src.ml.lru_cache import LRUCache
+from src.ml.text_normalization import normalize_query
+
+
+class _FakeEmbeddings:
+    def __init__(self):
+        self.calls: list[list[str]] = []
+        self.rate_limits = 0  # how many upcoming requests answer 429
+        self.server_errors = 0  # how many upcoming requests answer 500
+        self._lock = threading.Lock()
+
+    def create(self, model, input):
+        with self._lock:
+            self.calls.append(list(input))
+            if self.rate_limits:
+                self.rate_limits -= 1
+                response = httpx.Response(
+                    429, headers={"retry-after": "0"}, request=httpx.Request("POST", "http://x")
+                )
+                raise RateLimitError("rate limited", response=response, body=None)
+            if self.server_errors:
+                self.server_errors -= 1
+                response = httpx.Response(500, request=httpx.Request("POST", "http://x"))
+                raise InternalServerError("server error", response=response, body=None)
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=[float(len(text)), 1.0, 0.5]) for text in input]
+        )
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    fake = _FakeEmbeddings()
+    monkeypatch.setattr(embedder, "_request_embeddings", fake.create)
+    monkeypatch.setattr(
+        embedder, "embedding_cache", EmbeddingCache(str(tmp_path / "embedding_cache.db"))
+    )
+    monkeypatch.setattr(embedder, "_query_cache", LRUCache(100))
+    monkeypatch.setattr(settings, "embedding_dim", 3)
+    return fake
+
+
+class TestEmbeddingCache:
+    def test_repeat_call_skips_api(self, api):
+        first = embedder.embed_texts(["alpha", "beta"])
+        second = embedder.embed_texts(["alpha", "beta"])
+        assert second == first
+        assert api.calls == [["alpha", "beta"]]
+
+    def test_only_missing_texts_are_sent(self, api):
+        embedder.embed_texts(["alpha"])
+        result = embedder.embed_texts(["gamma", "alpha", "be"])
+        assert api.calls == [["alpha"], ["gamma", "be"]]
+        assert [v[0] for v in result] == [5.0, 5.0, 2.0]
+
+    def test_duplicates_within_call_sent_once(self, api):
+        result = embedder.embed_texts(["same", "other", "same"], batch_size=1)
+        assert sorted(api.calls) == [["other"], ["same"]]
+        assert result[0] == result[2]
+
+    def test_model_change_misses(self, api, monkeypatch):
+        embedder.embed_texts(["alpha"])
+        monkeypatch.setattr(settings, "openai_embedding_model", "another-model")
+        embedder.embed_texts(["alpha"])
+        assert len(api.calls) == 2
+
+    def test_disabled_bypasses_cache(self, api, monkeypatch):
+        monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+        embedder.embed_texts(["alpha"])
+        embedder.embed_texts(["alpha"])
+        assert len(api.calls) == 2
+
+    def test_queries_not_persisted_by_default(self, api):
+        embedder.embed_query("what is the leave policy?")
+        embedder._query_cache.clear()
+        embedder.embed_query("what is the leave policy?")
+        assert len(api.calls) == 2
+
+    def test_reduced_dim_truncates_after_cache(self, api):
+        [reduced] = embedder.embed_texts(["alpha"], dim=2)
+        assert reduced == pytest.approx([5 / np.hypot(5, 1), 1 / np.hypot(5, 1)])
+        assert embedder.embed_texts(["alpha"]) == [[5.0, 1.0, 0.5]]
+        assert len(api.calls) == 1
+
+class TestBatching:
+    def test_batches_split_by_token_budget(self, monkeypatch):
+        monkeypatch.setattr(embedder, "count_tokens", lambda text, model=None: len(text))
+        batches = embedder.token_batches(["aaaa", "bbbb", "cc", "dddddddd", "e"], 10, 8)
+        assert batches == [[0, 1], [2], [3], [4]]
+
+    def test_batches_split_by_text_count(self):
+        assert embedder.token_batches(["a"] * 5, 2, 1_000) == [[0, 1], [2, 3], [4]]
+
+    def test_oversized_text_gets_own_batch(self, monkeypatch):
+        monkeypatch.setattr(embedder, "count_tokens", lambda text, model=None: len(text))
+        assert embedder.token_batches(["a", "b" * 20, "c"], 10, 8) == [[0], [1], [2]]
+
+    def test_concurrent_batches_keep_order(self, api, monkeypatch):
+        monkeypatch.setattr(settings, "embedding_concurrency", 8)
+        texts = ["x" * n for n in range(1, 101)]
+        result = embedder.embed_texts(texts, batch_size=3)
+        assert len(api.calls) == 34
+        assert [v[0] for v in result] == [float(n) for n in range(1, 101)]
+
+    def test_single_batch_runs_on_calling_thread(self, api, monkeypatch):
+        monkeypatch.setattr(embedder, "ThreadPoolExecutor", None)
+        assert embedder.embed_query("How do I reset my VPN?")[0] == 22.0
+
+    def test_rate_limit_is_retried(self, api):
+        api.rate_limits = 2
+        result = embedder.embed_texts(["alpha", "beta"])
+        assert [v[0] for v in result] == [5.0, 4.0]
+        assert len(api.calls) == 3
+
+    def test_rate_limit_gives_up_after_max_retries(self, api, monkeypatch):
+        monkeypatch.setattr(settings, "embedding_max_retries", 1)
+        api.rate_limits = 5
+        with pytest.raises(RateLimitError):
+            embedder.embed_texts(["alpha"])
+        assert len(api.calls) == 2
+
+    def test_transient_server_error_is_retried(self, api, monkeypatch):
+        monkeypatch.setattr(embedder, "_BACKOFF_BASE_SECONDS", 0.0)
+        api.server_errors = 1
+        assert [v[0] for v in embedder.embed_texts(["a"])] == [1.0]
+        assert len(api.calls) == 2
+
+
+class TestQueryCache:
+    def test_normalized_repeats_hit_memory(self, api):
+        first = embedder.embed_query("What is the leave policy?")
+        second = embedder.embed_query("  what is the LEAVE   policy ")
+        assert second == first
+        assert api.calls == [["What is the leave policy?"]]
+        stats = embedder.query_cache_stats()
+        assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+    def test_persistent_backing(self, api, monkeypatch):
+        monkeypatch.setattr(settings, "query_embedding_cache_persistent", True)
+        embedder.embed_query("leave policy")
+        embedder._query_cache.clear()
+        embedder.embed_query("leave policy")
+        assert len(api.calls) == 1
+
+    def test_original_text_is_embedded(self, api):
+        embedder.embed_query("Is IT open?")
+        embedder.embed_query("Is it open")  # same cache key, served from memory
+        assert api.calls == [["Is IT open?"]]
+
+    def test_normalize_query(self):
+        assert normalize_query("Ｗhat  IS\tthe policy ?!") == "what is the policy"
+        assert normalize_query("?") == ""
+
+
+class TestProviders:
+    def test_local_hashing_runs_without_api(self, api, monkeypatch):
+        monkeypatch.setattr(settings, "embedding_provider", "local_hashing")
+        monkeypatch.setattr(settings, "embedding_local_dim", 64)
+        vectors = embedder.embed_texts(["annual leave policy", "expense claims"])
+        query = embedder.embed_query("Annual leave policy?")
+        assert api.calls == []
+        assert [len(v) for v in vectors] == [64, 64]
+        assert query == pytest.approx(vectors[0])
+
+    def test_hashing_is_deterministic_and_normalized(self):
+        provider = HashingProvider(128)
+        first, similar, other = np.array(
+            provider.embed(["leave policy for staff", "staff leave policy", "server outage runbook"])
+        )
+        assert provider.embed(["leave policy for staff"])[0] == pytest.approx(first.tolist())
+        assert np.linalg.norm(first) == pytest.approx(1.0)
+        assert first @ similar > first @ other
+
+    def test_empty_text_embeds_to_zeros(self):
+        assert HashingProvider(8).embed([""]) == [[0.0] * 8]
+
+    def test_provider_without_embed_cannot_be_built(self):
+        class Incomplete(EmbeddingProvider):
+            name, dim = "incomplete", 8
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    def test_unknown_provider_raises(self, monkeypatch):
+        monkeypatch.setattr(settings, "embedding_provider", "nope")
+        with pytest.raises(ValueError, match="Unknown embedding provider"):
+            embedder.get_provider()
+
+    def test_onnx_without_runtime_raises(self, monkeypatch):
+        if importlib.util.find_spec("onnxruntime") and importlib.util.find_spec("tokenizers"):
+            pytest.skip("onnxruntime is installed")
+        monkeypatch.setattr(settings, "embedding_provider", "onnx")
+        with pytest.raises(ValueError, match="onnxruntime"):
+            embedder.get_provider()
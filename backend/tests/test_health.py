@@ -0,0 +1,18 @@
+"""Tests for the health endpoint — readiness during vector index warm-up."""
+
+from fastapi import Response
+from src.api import health
+
+
+class TestHealthCheck:
+    def test_ok_when_ready(self, monkeypatch):
+        monkeypatch.setattr(health.vector_store, "_warmup", {"state": "ready"})
+        response = Response()
+        assert health.health_check(response)["status"] == "ok"
+        assert response.status_code == 200
+
+    def test_503_while_warming_up(self, monkeypatch):
+        monkeypatch.setattr(health.vector_store, "_warmup", {"state": "warming_up"})
+        response = Response()
+        assert health.health_check(response)["status"] == "warming_up"
+        assert response.status_code == 503
@@ -0,0 +1,139 @@
+"""Tests for intent_classifier's result cache and micro-batching."""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from src.ml import intent_classifier
+from src.ml.lru_cache import LRUCache
+from src.services.intent_service import create_intent_space
+
+SPACES = [
+    {"name": "HR", "description": "Human resources", "keywords": ["leave"]},
+    {"name": "IT", "description": "IT support", "keywords": ["vpn"]},
+]
+
+
+class _FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        content = json.dumps({"intent": "HR", "confidence": 0.9})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    completions = _FakeCompletions()
+    monkeypatch.setattr(intent_classifier, "chat_completion", completions.create)
+    monkeypatch.setattr(intent_classifier, "_cache", LRUCache(100, ttl=3600))
+    return completions
+
+
+class TestClassificationCache:
+    def test_repeat_question_skips_llm(self, llm):
+        assert intent_classifier.classify_intent("How much leave do I get?", SPACES) == ("HR", 0.9)
+        assert intent_classifier.classify_intent("how much leave do I get", SPACES) == ("HR", 0.9)
+        assert llm.calls == 1
+        assert intent_classifier.cached_intent("HOW much leave do I get?", SPACES) == ("HR", 0.9)
+
+    def test_catalog_change_misses(self, llm):
+        intent_classifier.classify_intent("How much leave do I get?", SPACES)
+        changed = [SPACES[0], {**SPACES[1], "keywords": ["vpn", "laptop"]}]
+        intent_classifier.classify_intent("How much leave do I get?", changed)
+        assert llm.calls == 2
+
+    def test_catalog_hash_ignores_order(self):
+        reordered = SPACES[::-1]
+        assert intent_classifier.catalog_hash(SPACES) == intent_classifier.catalog_hash(reordered)
+
+    def test_intent_crud_invalidates(self, llm, db_session):
+        intent_classifier.classify_intent("How much leave do I get?", SPACES)
+        create_intent_space("Facilities", "Office and buildings", ["desk"], db_session)
+        assert intent_classifier.cached_intent("How much leave do I get?", SPACES) is None
+
+
+class _BatchingCompletions:
+    """Answers single and batched prompts; HR for leave questions, IT otherwise."""
+
+    def __init__(self, malformed=False):
+        self.requests: list[list[str] | str] = []
+        self.malformed = malformed
+
+    @staticmethod
+    def _answer(query):
+        return {"intent": "HR" if "leave" in query else "IT", "confidence": 0.9}
+
+    def create(self, **kwargs):
+        user = kwargs["messages"][1]["content"]
+        if user.startswith("["):
+            queries = json.loads(user)
+            self.requests.append(queries)
+            answers = [self._answer(q) for q in queries]
+            content = json.dumps(answers[:-1] if self.malformed else answers)
+        else:
+            self.requests.append(user)
+            content = json.dumps(self._answer(user))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def batching_llm(monkeypatch):
+    def install(**kwargs):
+        completions = _BatchingCompletions(**kwargs)
+        monkeypatch.setattr(intent_classifier, "chat_completion", completions.create)
+        return completions
+
+    monkeypatch.setattr(intent_classifier, "_cache", LRUCache(100, ttl=3600))
+    monkeypatch.setattr(intent_classifier.settings, "intent_batch_max_wait_ms", 200)
+    monkeypatch.setattr(intent_classifier, "_batcher", intent_classifier.IntentBatcher())
+    return install
+
+
+def _classify_concurrently(queries, spaces_per_query=None):
+    spaces_per_query = spaces_per_query or [SPACES] * len(queries)
+    with ThreadPoolExecutor(len(queries)) as pool:
+        return list(pool.map(intent_classifier.classify_intent, queries, spaces_per_query))
+
+
+class TestMicroBatching:
+    def test_concurrent_queries_share_one_call(self, batching_llm):
+        llm = batching_llm()
+        queries = ["How much leave do I get?", "VPN is down", "How much leave do I get?"]
+        results = _classify_concurrently(queries)
+        assert results == [("HR", 0.9), ("IT", 0.9), ("HR", 0.9)]
+        assert len(llm.requests) == 1
+        assert sorted(llm.requests[0]) == ["How much leave do I get?", "VPN is down"]
+        assert intent_classifier.batch_stats()["mean_batch_size"] == 2
+
+    def test_catalogs_are_batched_separately(self, batching_llm):
+        llm = batching_llm()
+        other = [SPACES[0], {**SPACES[1], "description": "Help desk"}]
+        _classify_concurrently(["leave days", "VPN is down"], [SPACES, other])
+        assert sorted(llm.requests) == ["VPN is down", "leave days"]
+
+    def test_malformed_batch_falls_back_to_single_calls(self, batching_llm):
+        llm = batching_llm(malformed=True)
+        results = _classify_concurrently(["How much leave do I get?", "VPN is down"])
+        assert results == [("HR", 0.9), ("IT", 0.9)]
+        assert len(llm.requests) == 3
+
+    def test_errors_reach_every_caller(self, batching_llm, monkeypatch):
+        def broken_completion(**kwargs):
+            raise RuntimeError("LLM unavailable")
+
+        batching_llm()
+        monkeypatch.setattr(intent_classifier, "chat_completion", broken_completion)
+        with pytest.raises(RuntimeError, match="unavailable"):
+            _classify_concurrently(["How much leave do I get?", "VPN is down"])
+        assert intent_classifier.cached_intent("VPN is down", SPACES) is None
+
+    def test_disabled_calls_directly(self, batching_llm, monkeypatch):
+        llm = batching_llm()
+        monkeypatch.setattr(intent_classifier.settings, "intent_batch_max_size", 1)
+        _classify_concurrently(["How much leave do I get?", "VPN is down"])
+        assert sorted(llm.requests) == ["How much leave do I get?", "VPN is down"]
@@ -0,0 +1,172 @@
+"""Tests for the kNN intent model learned from query logs and reclassifications."""
+
+import json
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from src.config import settings
+from src.db.models import QueryLog
+from src.ml.embedder import embed_query
+from src.ml.knn_classifier import KnnIntentModel
+from src.services import intent_router
+from src.services.analytics_service import reclassify_query
+from src.services.intent_feedback import FeedbackTrainer
+
+SPACES = [{"id": 1, "name": "HR"}, {"id": 2, "name": "Legal"}, {"id": 3, "name": "Finance"}]
+
+
+def _model(vectors, labels, weights=None, **kwargs):
+    options = {"k": 3, "min_similarity": 0.5, "min_agreement": 0.6, **kwargs}
+    weights = np.ones(len(labels)) if weights is None else np.asarray(weights)
+    return KnnIntentModel(np.asarray(vectors, dtype=np.float32), labels, weights, **options)
+
+
+class TestKnnIntentModel:
+    def test_neighbours_vote(self):
+        model = _model([[1, 0], [0.9, 0.1], [0, 1]], ["HR", "HR", "Legal"])
+        assert model.predict([1, 0.05])[0] == "HR"
+
+    def test_split_vote_abstains(self):
+        model = _model([[1, 0], [1, 0.01], [1, -0.01]], ["HR", "Legal", "Finance"])
+        assert model.predict([1, 0]) is None
+
+    def test_weights_break_ties(self):
+        model = _model([[1, 0], [1, 0.01]], ["HR", "Legal"], weights=[1.0, 3.0], k=2)
+        assert model.predict([1, 0])[0] == "Legal"
+
+    def test_distant_query_abstains(self):
+        model = _model([[1, 0], [0.9, 0.1]], ["HR", "HR"], min_similarity=0.9)
+        assert model.predict([0, 1]) is None
+
+    def test_removed_intents_get_no_votes(self):
+        model = _model([[1, 0], [0.9, 0.1], [0.8, 0.2]], ["HR", "HR", "Legal"])
+        assert model.predict([1, 0], allowed={"Legal", "Finance"}) == ("Legal", 1.0)
+
+    def test_wrong_dimension_abstains(self):
+        model = _model([[1, 0], [0.9, 0.1]], ["HR", "HR"])
+        assert model.predict([1, 0, 0]) is None
+
+    def test_holdout_metrics(self):
+        rng = np.random.default_rng(0)
+        vectors = np.vstack([rng.normal([5, 0], 0.1, (20, 2)), rng.normal([0, 5], 0.1, (20, 2))])
+        model = _model(vectors, ["HR"] * 20 + ["Legal"] * 20)
+        assert model.accuracy == 1.0
+        assert model.coverage == 1.0
+
+
+def _log(db, query, intent, confidence=0.9, status="success", tier="llm"):
+    log = QueryLog(
+        user_query=query,
+        detected_intent=intent,
+        confidence_score=confidence,
+        source_documents=json.dumps([]),
+        response_status=status,
+        channel="api",
+        routing_tier=tier,
+    )
+    db.add(log)
+    db.commit()
+    return log
+
+
+@pytest.fixture
+def trainer(monkeypatch):
+    monkeypatch.setattr(settings, "embedding_provider", "local_hashing")
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(settings, "intent_knn_min_similarity", 0.8)
+    return FeedbackTrainer()
+
+
+class TestFeedbackTrainer:
+    def test_untrained_abstains(self, trainer):
+        assert not trainer.ready
+        assert trainer.predict(embed_query("anything"), SPACES) is None
+
+    def test_learns_confident_labels(self, db_session, trainer):
+        _log(db_session, "How many vacation days do I get?", "HR")
+        _log(db_session, "Who signs supplier NDAs?", "Legal")
+        trainer.retrain(db_session)
+        assert trainer.predict(embed_query("how many vacation days do i get"), SPACES)[0] == "HR"
+
+    def test_skips_unconfident_and_unknown_intents(self, db_session, trainer):
+        _log(db_session, "How many vacation days do I get?", "HR", confidence=0.3)
+        _log(db_session, "Where is the cafeteria?", "general")
+        trainer.retrain(db_session)
+        assert not trainer.ready
+
+    def test_local_tier_answers_are_not_labels(self, db_session, trainer):
+        for tier in ("keyword", "knn", "centroid", None):
+            _log(db_session, f"How many vacation days do I get? ({tier})", "HR", tier=tier)
+        trainer.retrain(db_session)
+        assert not trainer.ready
+
+    def test_cached_llm_answers_are_labels(self, db_session, trainer):
+        _log(db_session, "How many vacation days do I get?", "HR", tier="cache")
+        trainer.retrain(db_session)
+        assert trainer.stats()["examples"] == 1
+
+    def test_reclassification_overrides_later_labels(self, db_session, trainer):
+        log = _log(db_session, "Who approves travel expenses?", "HR", tier="centroid")
+        reclassify_query(log.id, "Finance", db_session)
+        _log(db_session, "Who approves travel expenses?", "HR")
+        trainer.retrain(db_session)
+        assert trainer.predict(embed_query("Who approves travel expenses"), SPACES)[0] == "Finance"
+        assert trainer.stats()["feedback_examples"] == 1
+
+    def test_retrain_only_embeds_new_queries(self, db_session, trainer, monkeypatch):
+        from src.services import intent_feedback
+
+        embedded = []
+        real_embed = intent_feedback.embed_texts
+
+        def recording_embed(texts, **kwargs):
+            embedded.extend(texts)
+            return real_embed(texts, **kwargs)
+
+        monkeypatch.setattr(intent_feedback, "embed_texts", recording_embed)
+        _log(db_session, "How many vacation days do I get?", "HR")
+        trainer.retrain(db_session)
+        _log(db_session, "Who signs supplier NDAs?", "Legal")
+        trainer.retrain(db_session)
+        assert embedded == ["How many vacation days do I get?", "Who signs supplier NDAs?"]
+
+    def test_escalation_rate(self, db_session, trainer):
+        _log(db_session, "How many vacation days do I get?", "HR")
+        trainer.retrain(db_session)
+        trainer.predict(embed_query("How many vacation days do I get?"), SPACES)
+        trainer.predict(embed_query("printer on floor three is jammed"), SPACES)
+        stats = trainer.stats()
+        assert stats["examples"] == 1
+        assert (stats["consulted"], stats["answered"]) == (2, 1)
+        assert stats["escalation_rate"] == 0.5
+
+
+@pytest.fixture
+def knn_tier(db_session, trainer, monkeypatch):
+    monkeypatch.setattr(intent_router, "feedback_trainer", trainer)
+    monkeypatch.setattr(intent_router, "_counts", dict.fromkeys(intent_router.TIERS, 0))
+    monkeypatch.setattr(settings, "intent_keyword_routing", False)
+    _log(db_session, "Who approves travel expenses?", "Finance")
+    trainer.retrain(db_session)
+
+
+class TestKnnTier:
+    def test_answers_before_centroid_and_llm(self, knn_tier, monkeypatch):
+        monkeypatch.setattr(intent_router, "classify_intent", pytest.fail)
+        query = "who approves travel expenses?"
+        assert intent_router.route_intent(query, embed_query(query), SPACES)[0] == "Finance"
+        assert intent_router.route_stats()["tiers"]["knn"]["count"] == 1
+
+    def test_llm_mode_does_not_wait_for_the_embedding(self, knn_tier, monkeypatch):
+        monkeypatch.setattr(settings, "intent_router_mode", "llm")
+        monkeypatch.setattr(intent_router, "cached_intent", lambda query, spaces: None)
+        monkeypatch.setattr(intent_router, "classify_intent", lambda query, spaces: ("HR", 0.9))
+        query = "who approves travel expenses?"
+        pending = Future()
+        assert intent_router.route_intent(query, pending, SPACES) == ("HR", 0.9)
+
+        done = Future()
+        done.set_result(embed_query(query))
+        assert intent_router.route_intent(query, done, SPACES)[0] == "Finance"
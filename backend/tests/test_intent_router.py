@@ -0,0 +1,184 @@
+"""Tests for intent_router: local centroid tier with LLM escalation."""
+
+import os
+
+import pytest
+
+from src.config import settings
+from src.ml import centroid_classifier as centroid_module
+from src.ml.centroid_classifier import CentroidClassifier
+from src.ml import intent_classifier
+from src.ml.embedder import embed_query, embed_texts
+from src.ml.keyword_router import KeywordMatcher, KeywordRouter
+from src.ml.lru_cache import LRUCache
+from src.ml.vector_store import VectorStore
+from src.services import intent_router
+
+SPACES = [
+    {
+        "id": 1,
+        "name": "HR",
+        "description": "Human resources: annual leave, holidays, payroll and employee benefits",
+        "keywords": ["leave", "vacation", "salary", "benefits"],
+    },
+    {
+        "id": 2,
+        "name": "IT",
+        "description": "IT support: VPN, laptops, password resets and software access",
+        "keywords": ["vpn", "password", "laptop", "network"],
+    },
+]
+
+
+class _Calls(list):
+    """LLM classifier calls, plus the vector store the centroids are built from."""
+
+    store: VectorStore
+
+
+@pytest.fixture
+def llm_calls(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "data_dir", str(tmp_path))
+    os.makedirs(tmp_path / "faiss")
+    monkeypatch.setattr(settings, "embedding_provider", "local_hashing")
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    store = VectorStore()
+    monkeypatch.setattr(centroid_module, "vector_store", store)
+    monkeypatch.setattr(intent_router, "centroid_classifier", CentroidClassifier())
+    monkeypatch.setattr(intent_router, "_counts", dict.fromkeys(intent_router.TIERS, 0))
+    monkeypatch.setattr(intent_classifier, "_cache", LRUCache(100))
+    monkeypatch.setattr(settings, "intent_keyword_routing", False)  # see TestKeywordTier
+
+    calls = _Calls()
+
+    def fake_classify(query, intent_spaces):
+        calls.append(query)
+        return "general", 0.0
+
+    monkeypatch.setattr(intent_router, "classify_intent", fake_classify)
+    calls.store = store
+    return calls
+
+
+def _route(query):
+    return intent_router.route_intent(query, embed_query(query), SPACES)
+
+
+class TestIntentRouter:
+    def test_clear_match_skips_llm(self, llm_calls):
+        intent, confidence = _route("how do I reset my VPN password")
+        assert intent == "IT"
+        assert 0.5 < confidence <= 1.0
+        assert llm_calls == []
+
+    def test_ambiguous_match_escalates(self, llm_calls, monkeypatch):
+        monkeypatch.setattr(settings, "intent_centroid_margin", 2.0)
+        assert _route("how do I reset my VPN password") == ("general", 0.0)
+        assert llm_calls == ["how do I reset my VPN password"]
+
+    def test_escalation_hook_gets_ranking(self, llm_calls, monkeypatch):
+        monkeypatch.setattr(settings, "intent_centroid_margin", 2.0)
+        seen = []
+        query = "how do I reset my VPN password"
+        intent_router.route_intent(query, embed_query(query), SPACES, on_escalate=seen.append)
+        [ranking] = seen
+        assert [name for name, _ in ranking] == ["IT", "HR"]
+
+    def test_decisive_match_skips_hook(self, llm_calls):
+        seen = []
+        query = "how do I reset my VPN password"
+        intent_router.route_intent(query, embed_query(query), SPACES, on_escalate=seen.append)
+        assert seen == []
+
+    def test_cached_classification_skips_llm_and_hook(self, llm_calls, monkeypatch):
+        monkeypatch.setattr(settings, "intent_centroid_margin", 2.0)
+        intent_classifier._cache.put(
+            intent_classifier._cache_key("reset my VPN password", SPACES), ("IT", 0.95)
+        )
+        seen = []
+        query = "Reset my VPN password?"
+        result = intent_router.route_intent(query, embed_query(query), SPACES, seen.append)
+        assert result == ("IT", 0.95)
+        assert llm_calls == [] and seen == []
+        assert intent_router.route_stats()["tiers"]["cache"]["count"] == 1
+
+    def test_llm_mode_always_asks_llm(self, llm_calls, monkeypatch):
+        monkeypatch.setattr(settings, "intent_router_mode", "llm")
+        _route("annual leave allowance")
+        assert len(llm_calls) == 1
+
+    def test_centroid_failure_falls_back_to_llm(self, llm_calls, monkeypatch):
+        def broken(*args):
+            raise RuntimeError("embedding backend down")
+
+        monkeypatch.setattr(intent_router.centroid_classifier, "scores", broken)
+        assert _route("annual leave allowance") == ("general", 0.0)
+        assert len(llm_calls) == 1
+
+    def test_stored_chunks_shape_the_centroid(self, llm_calls):
+        classifier = intent_router.centroid_classifier
+        query = embed_query("expense claim receipts")
+        before = dict(classifier.scores(query, SPACES))
+
+        chunks = ["Submit expense claim receipts within 30 days", "Expense claims are paid monthly"]
+        llm_calls.store.add_document(1, chunks, embed_texts(chunks), 10, "expenses.pdf")
+        after = dict(classifier.scores(query, SPACES))
+        assert after["HR"] > before["HR"]
+        assert after["IT"] == pytest.approx(before["IT"])
+
+    def test_route_stats(self, llm_calls, monkeypatch):
+        _route("how do I reset my VPN password")
+        monkeypatch.setattr(settings, "intent_router_mode", "llm")
+        _route("anything")
+        stats = intent_router.route_stats()
+        assert stats["total"] == 2
+        assert stats["tiers"]["centroid"] == {"count": 1, "share": 0.5}
+        assert stats["short_circuit_share"] == 0.5
+
+
+class TestKeywordTier:
+    def test_single_space_keyword_short_circuits(self, llm_calls, monkeypatch):
+        monkeypatch.setattr(settings, "intent_keyword_routing", True)
+        monkeypatch.setattr(settings, "intent_router_mode", "llm")
+        assert _route("My Laptop will not boot") == ("IT", 1.0)
+        assert llm_calls == []
+        assert intent_router.route_stats()["tiers"]["keyword"]["count"] == 1
+
+    def test_keywords_of_two_spaces_fall_through(self, llm_calls, monkeypatch):
+        monkeypatch.setattr(settings, "intent_keyword_routing", True)
+        monkeypatch.setattr(settings, "intent_router_mode", "llm")
+        _route("can I use leave to fix my laptop")
+        assert len(llm_calls) == 1
+
+
+class TestKeywordMatcher:
+    def test_whole_words_only(self):
+        matcher = KeywordMatcher([{"name": "HR", "keywords": ["leave"]}])
+        assert matcher.match("annual LEAVE request") == "HR"
+        assert matcher.match("please leaves") is None
+
+    def test_acronyms_are_case_sensitive(self):
+        matcher = KeywordMatcher([{"name": "IT", "keywords": ["IT", "VPN access"]}])
+        assert matcher.match("is it raining") is None
+        assert matcher.match("ask IT about it") == "IT"
+        assert matcher.match("need vpn   Access") == "IT"
+
+    def test_keywords_match_as_written_and_casefolded(self):
+        matcher = KeywordMatcher([{"name": "Facilities", "keywords": ["Straße"]}])
+        assert matcher.match("parking on the straße") == "Facilities"
+        assert matcher.match("parking on the STRASSE") == "Facilities"
+
+    def test_shared_keywords_are_ignored(self):
+        matcher = KeywordMatcher([
+            {"name": "HR", "keywords": ["policy", "leave"]},
+            {"name": "Legal", "keywords": ["Policy", "contract"]},
+        ])
+        assert matcher.match("policy question") is None
+        assert matcher.match("leave policy") == "HR"
+
+    def test_router_rebuilds_on_catalog_change(self):
+        router = KeywordRouter()
+        spaces = [{"name": "HR", "description": "", "keywords": ["leave"]}]
+        assert router.match("leave", spaces) == "HR"
+        spaces = [{"name": "Time off", "description": "", "keywords": ["leave"]}]
+        assert router.match("leave", spaces) == "Time off"
@@ -0,0 +1,143 @@
+"""Tests for llm_gateway: retries, concurrency limit and per-endpoint counters."""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError, RateLimitError
+
+from src.config import settings
+from src.ml import llm_gateway
+
+_REQUEST = httpx.Request("POST", "http://llm")
+
+
+def _rate_limited(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=_REQUEST)
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+class _FakeCompletions:
+    def __init__(self):
+        self.failures: list[Exception] = []  # raised by the next calls, in order
+        self.calls: list[dict] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def _enter(self, kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failure = self.failures.pop(0) if self.failures else None
+        return failure
+
+    def _response(self):
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=3)
+        message = SimpleNamespace(content="ok")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    def create(self, **kwargs):
+        failure = self._enter(kwargs)
+        try:
+            time.sleep(self.delay)
+            if failure:
+                raise failure
+            return self._response()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    async def acreate(self, **kwargs):
+        failure = self._enter(kwargs)
+        try:
+            await asyncio.sleep(self.delay)
+            if failure:
+                raise failure
+            return self._response()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = _FakeCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=fake))
+    async_completions = SimpleNamespace(create=fake.acreate)
+    async_client = SimpleNamespace(chat=SimpleNamespace(completions=async_completions))
+    monkeypatch.setattr(llm_gateway, "_client", client)
+    monkeypatch.setattr(llm_gateway, "_async_client", async_client)
+    monkeypatch.setattr(llm_gateway, "_slots", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(llm_gateway, "_stats", llm_gateway._EndpointStats())
+    monkeypatch.setattr(settings, "llm_retry_base_seconds", 0.0)
+    return fake
+
+
+class TestRetries:
+    def test_transient_errors_are_retried(self, llm):
+        llm.failures = [_rate_limited(), APIConnectionError(request=_REQUEST)]
+        response = llm_gateway.chat_completion(model="m", messages=[])
+        assert response.choices[0].message.content == "ok"
+        stats = llm_gateway.stats()["chat.completions"]
+        assert (stats["calls"], stats["errors"], stats["retries"]) == (3, 2, 2)
+        assert (stats["prompt_tokens"], stats["completion_tokens"]) == (10, 3)
+
+    def test_gives_up_after_max_retries(self, llm, monkeypatch):
+        monkeypatch.setattr(settings, "llm_max_retries", 1)
+        llm.failures = [_rate_limited(), _rate_limited(), _rate_limited()]
+        with pytest.raises(RateLimitError):
+            llm_gateway.chat_completion(model="m", messages=[])
+        assert len(llm.calls) == 2
+
+    def test_client_errors_are_not_retried(self, llm):
+        response = httpx.Response(400, request=_REQUEST)
+        llm.failures = [BadRequestError("bad", response=response, body=None)]
+        with pytest.raises(BadRequestError):
+            llm_gateway.chat_completion(model="m", messages=[])
+        assert len(llm.calls) == 1
+
+    def test_backoff_honours_retry_after(self, monkeypatch):
+        monkeypatch.setattr(settings, "llm_retry_base_seconds", 0.1)
+        assert llm_gateway._backoff(0, _rate_limited(retry_after=2)) == 2.0
+        assert 0.0 <= llm_gateway._backoff(10, _rate_limited()) <= settings.llm_retry_max_seconds
+
+
+class TestLimits:
+    def test_default_timeout_is_applied(self, llm):
+        llm_gateway.chat_completion(model="m", messages=[])
+        llm_gateway.chat_completion(model="m", messages=[], timeout=2)
+        assert [call["timeout"] for call in llm.calls] == [settings.llm_timeout_seconds, 2]
+
+    def test_concurrency_is_bounded(self, llm):
+        llm.delay = 0.02
+        request = {"model": "m", "messages": []}
+        threads = [
+            threading.Thread(target=llm_gateway.chat_completion, kwargs=request) for _ in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(llm.calls) == 6
+        assert llm.max_in_flight == 2
+
+    def test_async_calls_share_the_limit(self, llm):
+        llm.delay = 0.02
+        llm.failures = [_rate_limited()]
+
+        async def burst():
+            return await asyncio.gather(
+                *(llm_gateway.achat_completion(model="m", messages=[]) for _ in range(5))
+            )
+
+        assert len(asyncio.run(burst())) == 5
+        assert llm.max_in_flight == 2
+        assert llm_gateway._slots.acquire(blocking=False)  # every slot was released
+        assert llm_gateway.stats()["chat.completions"]["retries"] == 1
@@ -0,0 +1,45 @@
+"""Tests for the in-process LRU cache."""
+
+import time
+
+from src.ml.lru_cache import LRUCache
+
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_stats(self):
+        cache = LRUCache(10)
+        cache.put("a", 1)
+        cache.get("a")
+        cache.get("missing")
+        assert cache.stats() == {
+            "size": 1, "maxsize": 10, "hits": 1, "misses": 1, "evictions": 0, "expirations": 0,
+            "hit_rate": 0.5,
+        }
+
+    def test_zero_size_disables(self):
+        cache = LRUCache(0)
+        cache.put("a", 1)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_entries_expire_after_ttl(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        cache = LRUCache(10, ttl=60)
+        cache.put("a", 1)
+        now[0] += 59
+        assert cache.get("a") == 1
+        now[0] += 2
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+        assert len(cache) == 0
@@ -0,0 +1,98 @@
+"""Tests for orchestrator.process_query — the parallel classify/retrieve pipeline."""
+
+import threading
+
+import pytest
+
+from src.config import settings
+from src.db.models import IntentSpace, QueryLog
+from src.services import orchestrator
+
+
+class _FakeStore:
+    def __init__(self):
+        self.searched: list[int | None] = []
+        self._lock = threading.Lock()
+
+    def search(self, intent_space_id, query_embedding, k=5):
+        with self._lock:
+            self.searched.append(intent_space_id)
+        return [{"chunk_text": f"from {intent_space_id}", "filename": f"{intent_space_id}.pdf"}]
+
+
+@pytest.fixture
+def pipeline(db_session, monkeypatch):
+    store = _FakeStore()
+    monkeypatch.setattr(orchestrator, "vector_store", store)
+    monkeypatch.setattr(orchestrator, "embed_query", lambda query: [0.1, 0.2])
+
+    def generate(query, chunks, channel, history):
+        return chunks[0]["chunk_text"], [chunks[0]["filename"]], ""
+
+    monkeypatch.setattr(orchestrator, "generate_response", generate)
+    return store
+
+
+def _route_escalating_to(winner, ranking):
+    def route(query, query_embedding, intent_spaces, on_escalate=None):
+        assert query_embedding.result() == [0.1, 0.2]
+        on_escalate(ranking)
+        return winner, 0.9, "llm"
+
+    return route
+
+
+class TestProcessQuery:
+    def test_uses_presearched_results_of_winner(self, pipeline, db_session, monkeypatch):
+        ids = {s.name: s.id for s in db_session.query(IntentSpace)}
+        monkeypatch.setattr(
+            orchestrator, "route_intent_with_tier",
+            _route_escalating_to("Legal", [("HR", 0.4), ("Legal", 0.39), ("Finance", 0.1)]),
+        )
+        result = orchestrator.process_query("notice period?", "api", None, db_session)
+
+        assert result.detected_intent == "Legal"
+        assert result.answer == f"from {ids['Legal']}"
+        assert sorted(pipeline.searched) == sorted([ids["HR"], ids["Legal"]])
+
+    def test_searches_winner_outside_candidates(self, pipeline, db_session, monkeypatch):
+        ids = {s.name: s.id for s in db_session.query(IntentSpace)}
+        monkeypatch.setattr(settings, "query_speculative_spaces", 1)
+        monkeypatch.setattr(
+            orchestrator, "route_intent_with_tier",
+            _route_escalating_to("Finance", [("HR", 0.4), ("Legal", 0.39), ("Finance", 0.38)]),
+        )
+        result = orchestrator.process_query("budget?", "api", None, db_session)
+
+        assert result.answer == f"from {ids['Finance']}"
+        assert sorted(pipeline.searched) == sorted([ids["HR"], ids["Finance"]])
+
+    def test_general_searches_every_space(self, pipeline, db_session, monkeypatch):
+        monkeypatch.setattr(
+            orchestrator, "route_intent_with_tier",
+            lambda query, query_embedding, intent_spaces, on_escalate=None: ("general", 0.2, "llm"),
+        )
+        result = orchestrator.process_query("hello", "api", "u1", db_session)
+
+        assert pipeline.searched == [None]
+        assert result.fallback
+        log = db_session.query(QueryLog).one()
+        assert (log.detected_intent, log.routing_tier) == ("general", "llm")
+
+    def test_history_is_passed_to_generation(self, pipeline, db_session, monkeypatch):
+        seen = []
+        monkeypatch.setattr(
+            orchestrator, "route_intent_with_tier",
+            lambda query, query_embedding, intent_spaces, on_escalate=None: ("HR", 0.9, "knn"),
+        )
+        monkeypatch.setattr(
+            orchestrator, "generate_response",
+            lambda query, chunks, channel, history: (seen.append(history), ("ok", [], ""))[1],
+        )
+        orchestrator.process_query("first", "telegram", "u1", db_session)
+        orchestrator.process_query("second", "telegram", "u1", db_session)
+
+        assert seen[1] == [
+            {"role": "user", "content": "first"},
+            {"role": "assistant", "content": "ok"},
+        ]
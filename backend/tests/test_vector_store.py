@@ -0,0 +1,654 @@
+"""Tests for vector_store — on-disk layout, add/remove, compaction and search."""
+
+import json
+import os
+import threading
+import faiss
+import numpy as np
+import pytest
+from src.config import settings
+from src.ml import segment_store
+from src.ml.vector_store import VectorStore
+
+DIM = 1536
+
+
+@pytest.fixture()
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "data_dir", str(tmp_path))
+    os.makedirs(tmp_path / "faiss")
+    return VectorStore()
+
+
+def _embeddings(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, DIM)).astype(np.float32).tolist()
+
+
+def _wait_for_compaction(store, sid=1):
+    if sid in store._compactions:
+        store._compactions[sid].join()
+
+
+def _manifest(store, sid=1):
+    return segment_store.read_manifest(store._space_dir(sid))
+
+
+class TestSegmentLayout:
+    def test_each_add_writes_one_segment(self, store):
+        store.add_document(1, ["a", "b"], _embeddings(2), 10, "a.pdf")
+        store.add_document(1, ["c"], _embeddings(1, seed=1), 20, "c.pdf")
+        manifest = _manifest(store)
+        assert [s["name"] for s in manifest["segments"]] == ["seg_000001", "seg_000002"]
+        assert manifest["next_id"] == 3
+        assert os.path.getsize(os.path.join(store._space_dir(1), "seg_000001.vec")) == 2 * DIM * 4
+
+    def test_segment_json_has_no_float_lists_or_texts(self, store):
+        store.add_document_with_embeddings_stored(1, ["a"], _embeddings(1), 10, "a.pdf")
+        with open(os.path.join(store._space_dir(1), "seg_000001.json")) as f:
+            data = json.load(f)
+        assert set(data) == {"ids", "document_ids", "filenames", "text_offsets"}
+
+    def test_chunk_texts_are_read_from_disk_on_hit(self, store):
+        emb = _embeddings(3)
+        store.add_document(1, ["héllo", "", "wörld ✓"], emb, 10, "a.pdf")
+        reloaded = VectorStore()
+        reloaded._ensure_loaded(1)
+        segment = reloaded._spaces[1].snapshot.segments[0]
+        assert isinstance(segment.texts, np.memmap)
+        assert [reloaded.search(1, e, k=1)[0]["chunk_text"] for e in emb] == ["héllo", "", "wörld ✓"]
+
+    def test_upgrades_segment_with_inline_texts(self, store):
+        emb = _embeddings(2)
+        store.add_document(1, ["a", "b"], emb, 10, "a.pdf")
+        json_path = os.path.join(store._space_dir(1), "seg_000001.json")
+        with open(json_path) as f:
+            data = json.load(f)
+        del data["text_offsets"]
+        data["chunk_texts"] = ["a", "b"]
+        with open(json_path, "w") as f:
+            json.dump(data, f)
+        os.remove(os.path.join(store._space_dir(1), "seg_000001.txt"))
+
+        reloaded = VectorStore()
+        assert reloaded.search(1, emb[1], k=1)[0]["chunk_text"] == "b"
+        with open(json_path) as f:
+            assert "chunk_texts" not in json.load(f)
+
+    def test_reload_maps_stored_vectors(self, store):
+        emb = _embeddings(3)
+        store.add_document(1, ["a", "b", "c"], emb, 10, "a.pdf")
+        reloaded = VectorStore()
+        reloaded._ensure_loaded(1)
+        segment = reloaded._spaces[1].snapshot.segments[0]
+        assert isinstance(segment.vectors, np.memmap)
+        np.testing.assert_allclose(segment.vectors[2], emb[2])
+        assert reloaded.search(1, emb[1], k=1)[0]["chunk_text"] == "b"
+
+    def test_float16_storage(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_storage_dtype", "float16")
+        store.add_document(1, ["a"], _embeddings(1), 10, "a.pdf")
+        assert os.path.getsize(os.path.join(store._space_dir(1), "seg_000001.vec")) == DIM * 2
+
+    def test_unreferenced_segment_is_ignored_and_removed(self, store):
+        store.add_document(1, ["a"], _embeddings(1), 10, "a.pdf")
+        orphan = os.path.join(store._space_dir(1), "seg_000009.vec")
+        with open(orphan, "wb") as f:
+            f.write(b"partial")
+
+        reloaded = VectorStore()
+        reloaded._ensure_loaded(1)
+        assert len(reloaded._spaces[1].snapshot.segments) == 1
+        assert not os.path.exists(orphan)
+
+    def test_migrates_inline_embeddings(self, store):
+        emb = _embeddings(2)
+        legacy_index = faiss.IndexFlatL2(DIM)
+        legacy_index.add(np.array(emb, dtype=np.float32))
+        chunks = [
+            {"faiss_id": i, "document_id": 10, "filename": "a.pdf",
+             "chunk_text": t, "embedding": e}
+            for i, (t, e) in enumerate(zip(["a", "b"], emb))
+        ]
+        faiss.write_index(legacy_index, store._legacy_path(1, ".index"))
+        with open(store._legacy_path(1, "_meta.json"), "w") as f:
+            json.dump({"chunks": chunks}, f)
+
+        store._ensure_loaded(1)
+        assert store.search(1, emb[1], k=1)[0]["chunk_text"] == "b"
+        assert _manifest(store)["next_id"] == 2
+        assert not os.path.exists(store._legacy_path(1, "_meta.json"))
+
+
+class TestSpaceDimension:
+    def test_new_space_takes_first_write_dimension(self, store):
+        store.add_document(1, ["a"], [[1.0, 0.0, 0.0, 0.0]], 10, "a.pdf")
+        store.add_document(2, ["b"], _embeddings(1), 20, "b.pdf")
+        assert _manifest(store, 1)["dim"] == 4
+        assert VectorStore().search(1, [1.0, 0.0, 0.0, 0.0], k=1)[0]["chunk_text"] == "a"
+        assert {s["intent_space_id"]: s["dim"] for s in store.index_stats()} == {1: 4, 2: DIM}
+
+    def test_mismatched_dimension_is_rejected(self, store):
+        store.add_document(1, ["a"], [[1.0, 0.0, 0.0, 0.0]], 10, "a.pdf")
+        with pytest.raises(ValueError, match="dimension"):
+            store.add_document(1, ["b"], _embeddings(1), 20, "b.pdf")
+        with pytest.raises(ValueError, match="dimension"):
+            store.search(1, _embeddings(1)[0], k=1)
+
+
+    def test_global_search_skips_spaces_of_another_dimension(self, store):
+        store.add_document(1, ["old"], [[1.0] * 8], 10, "old.pdf")
+        store.add_document(2, ["new"], [[1.0, 0.0, 0.0, 0.0]], 20, "new.pdf")
+        hits = store.search(None, [1.0, 0.0, 0.0, 0.0], k=5)
+        assert [h["chunk_text"] for h in hits] == ["new"]
+        with pytest.raises(ValueError, match="dimension"):
+            store.search(None, [1.0, 0.0, 0.0, 0.0], k=5, space_ids=[1, 2])
+
+class TestReprojection:
+    def test_reprojects_and_serves_full_size_queries(self, store, monkeypatch):
+        emb = _embeddings(4)
+        store.add_document(1, ["a", "b"], emb[:2], 10, "a.pdf")
+        store.add_document(1, ["c", "d"], emb[2:], 20, "c.pdf")
+        store.remove_document(1, 10)
+
+        assert store.reproject_space(1, 256) == 2
+        manifest = _manifest(store)
+        assert manifest["dim"] == 256
+        [segment] = manifest["segments"]
+        name = segment["name"]
+        assert sorted(os.listdir(store._space_dir(1))) == [
+            "deleted.log", "deleted.sum", "manifest.json",
+            f"{name}.json", f"{name}.sum", f"{name}.txt", f"{name}.vec",
+        ]
+        assert os.path.getsize(os.path.join(store._space_dir(1), f"{name}.vec")) == 2 * 256 * 4
+        with pytest.raises(ValueError, match="dimension"):
+            store.search(1, emb[3], k=1)
+
+        monkeypatch.setattr(settings, "embedding_space_dims", {1: 256})
+        reloaded = VectorStore()
+        hits = reloaded.search(1, emb[3], k=2)
+        assert [h["chunk_text"] for h in hits] == ["d", "c"]
+        assert hits[0]["distance"] == pytest.approx(0.0, abs=1e-5)
+        assert reloaded.search(1, (np.array(emb[3]) * 3).tolist(), k=1)[0]["chunk_text"] == "d"
+
+    def test_rejects_growing_dimension(self, store):
+        store.add_document(1, ["a"], _embeddings(1), 10, "a.pdf")
+        with pytest.raises(ValueError, match="Cannot reproject"):
+            store.reproject_space(1, DIM * 2)
+
+
+class TestCentroid:
+    def test_mean_of_live_rows(self, store):
+        emb = np.array(_embeddings(4))
+        store.add_document(1, ["a", "b"], emb[:2].tolist(), 10, "a.pdf")
+        store.add_document(1, ["c", "d"], emb[2:].tolist(), 20, "c.pdf")
+        np.testing.assert_allclose(store.space_centroid(1), emb.mean(axis=0), rtol=1e-5, atol=1e-6)
+        store.remove_document(1, 10)
+        expected = emb[2:].mean(axis=0)
+        np.testing.assert_allclose(store.space_centroid(1), expected, rtol=1e-5, atol=1e-6)
+        assert store.space_centroid(2) is None
+
+    def test_read_without_loading_the_space(self, store):
+        emb = np.array(_embeddings(3))
+        store.add_document(1, ["a", "b", "c"], emb.tolist(), 10, "a.pdf")
+        fresh = VectorStore()
+        np.testing.assert_allclose(fresh.space_centroid(1), emb.mean(axis=0), rtol=1e-5, atol=1e-6)
+        assert fresh.space_centroid(1) is fresh.space_centroid(1)  # cached until files change
+        assert 1 not in fresh._spaces
+        assert fresh.residency_stats()["misses"] == 0
+
+    def test_compaction_keeps_centroid(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_compaction_deleted_ratio", 0.0)
+        emb = np.array(_embeddings(4))
+        store.add_document(1, ["a", "b"], emb[:2].tolist(), 10, "a.pdf")
+        store.add_document(1, ["c", "d"], emb[2:].tolist(), 20, "c.pdf")
+        store.remove_document(1, 10)
+        _wait_for_compaction(store)
+        assert len(_manifest(store)["segments"]) == 1
+        expected = emb[2:].mean(axis=0)
+        np.testing.assert_allclose(store.space_centroid(1), expected, rtol=1e-5, atol=1e-6)
+
+    def test_missing_sums_are_rebuilt(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_compaction_deleted_ratio", 1.0)
+        emb = np.array(_embeddings(4))
+        store.add_document(1, ["a", "b"], emb[:2].tolist(), 10, "a.pdf")
+        store.add_document(1, ["c", "d"], emb[2:].tolist(), 20, "c.pdf")
+        store.remove_document(1, 10)
+        directory = store._space_dir(1)
+        os.remove(os.path.join(directory, "seg_000002.sum"))  # segment from an older release
+        segment_store.write_deleted_sum(directory, 5, np.zeros(DIM))  # torn write
+
+        fresh = VectorStore()
+        expected = emb[2:].mean(axis=0)
+        np.testing.assert_allclose(fresh.space_centroid(1), expected, rtol=1e-5, atol=1e-6)
+        assert os.path.exists(os.path.join(directory, "seg_000002.sum"))
+        assert segment_store.read_deleted_sum(directory, DIM)[0] == 2
+
+
+class TestRemoveDocument:
+    def test_remove_keeps_other_documents_searchable(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_compaction_deleted_ratio", 1.0)
+        emb_a, emb_b = _embeddings(2, seed=1), _embeddings(2, seed=2)
+        store.add_document(1, ["a1", "a2"], emb_a, 10, "a.pdf")
+        store.add_document(1, ["b1", "b2"], emb_b, 20, "b.pdf")
+        store.remove_document(1, 10)
+
+        results = store.search(1, emb_b[1], k=1)
+        assert results[0]["chunk_text"] == "b2"
+        # Published indexes are never modified; removed ids become tombstones
+        assert store._spaces[1].snapshot.segments[0].index.ntotal == 2
+        assert store._spaces[1].snapshot.tombstones == {"seg_000001": 2, "seg_000002": 0}
+
+    def test_remove_only_logs_deleted_ids(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_compaction_deleted_ratio", 1.0)
+        store.add_document(1, ["a1", "a2"], _embeddings(2, seed=1), 10, "a.pdf")
+        store.add_document(1, ["b1"], _embeddings(1, seed=2), 20, "b.pdf")
+        manifest_path = os.path.join(store._space_dir(1), segment_store.MANIFEST)
+        manifest_mtime = os.path.getmtime(manifest_path)
+        store.remove_document(1, 10)
+
+        with open(os.path.join(store._space_dir(1), segment_store.DELETED_LOG)) as f:
+            assert f.read().split() == ["0", "1"]
+        assert os.path.getmtime(manifest_path) == manifest_mtime
+
+        reloaded = VectorStore()
+        reloaded._ensure_loaded(1)
+        assert reloaded._spaces[1].snapshot.chunk_count == 1
+        assert [r["chunk_text"] for r in reloaded.search(1, _embeddings(1)[0], k=5)] == ["b1"]
+
+    def test_torn_deletion_log_line_is_ignored(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_compaction_deleted_ratio", 1.0)
+        store.add_document(1, [f"c{i}" for i in range(13)], _embeddings(13), 10, "a.pdf")
+        with open(os.path.join(store._space_dir(1), segment_store.DELETED_LOG), "w") as f:
+            f.write("0\n1")  # "12" was being written when the process died
+
+        reloaded = VectorStore()
+        reloaded._ensure_loaded(1)
+        assert reloaded._spaces[1].snapshot.deleted == {0}
+
+    def test_chunk_ids_stay_stable_after_removal(self, store):
+        store.add_document(1, ["a1"], _embeddings(1, seed=1), 10, "a.pdf")
+        store.add_document(1, ["b1"], _embeddings(1, seed=2), 20, "b.pdf")
+        store.remove_document(1, 10)
+        _wait_for_compaction(store)
+        store.add_document(1, ["c1"], _embeddings(1, seed=3), 30, "c.pdf")
+        ids = [i for s in store._spaces[1].snapshot.segments for i in s.ids.tolist()]
+        assert ids == [1, 2]
+
+
+class TestCompaction:
+    def test_merges_segments_and_drops_deleted_rows(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_compaction_max_segments", 3)
+        monkeypatch.setattr(settings, "vector_compaction_deleted_ratio", 1.0)
+        emb = _embeddings(4)
+        store.add_document(1, ["a"], emb[:1], 10, "a.pdf")
+        store.remove_document(1, 10)
+        for i in range(1, 4):
+            store.add_document(1, [f"c{i}"], emb[i : i + 1], 10 + i, f"{i}.pdf")
+        _wait_for_compaction(store)
+
+        manifest = _manifest(store)
+        assert len(manifest["segments"]) == 1
+        assert manifest["segments"][0]["rows"] == 3
+        assert sorted(os.listdir(store._space_dir(1))) == [
+            "deleted.log", "deleted.sum", "manifest.json",
+            "seg_000005.json", "seg_000005.sum", "seg_000005.txt", "seg_000005.vec",
+        ]
+        assert store.search(1, emb[2], k=1)[0]["chunk_text"] == "c2"
+
+    def test_segments_published_out_of_id_order(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_compaction_max_segments", 1)
+        emb = _embeddings(8)
+        write_segment = segment_store.write_segment
+        a_reserved, b_published = threading.Event(), threading.Event()
+
+        def slow_first_write(directory, name, ids, *args):
+            if ids[0] == 0:
+                a_reserved.set()
+                b_published.wait(timeout=10)
+            write_segment(directory, name, ids, *args)
+
+        monkeypatch.setattr(segment_store, "write_segment", slow_first_write)
+        a = threading.Thread(
+            target=store.add_document,
+            args=(1, [f"A{i}" for i in range(4)], emb[:4], 10, "A.pdf"),
+        )
+        a.start()
+        a_reserved.wait(timeout=10)
+        store.add_document(1, [f"B{i}" for i in range(4)], emb[4:], 20, "B.pdf")
+        b_published.set()
+        a.join()
+        _wait_for_compaction(store)
+
+        assert len(_manifest(store)["segments"]) == 1
+        for i, text in enumerate([f"A{i}" for i in range(4)] + [f"B{i}" for i in range(4)]):
+            assert store.search(1, emb[i], k=1)[0]["chunk_text"] == text
+
+    def test_size_tiered_keeps_large_older_segment(self, store, monkeypatch):
+        store.add_document(1, [f"a{i}" for i in range(20)], _embeddings(20), 10, "a.pdf")
+        monkeypatch.setattr(settings, "vector_compaction_max_segments", 3)
+        for i in range(3):
+            store.add_document(1, [f"b{i}"], _embeddings(1, seed=i + 1), 20 + i, "b.pdf")
+        _wait_for_compaction(store)
+
+        rows = [s["rows"] for s in _manifest(store)["segments"]]
+        assert rows == [20, 3]
+
+
+class TestAnnPromotion:
+    @pytest.fixture()
+    def ann_settings(self, monkeypatch):
+        monkeypatch.setattr(settings, "vector_ann_min_chunks", 300)
+        monkeypatch.setattr(settings, "vector_ivf_nlist", 4)
+        monkeypatch.setattr(settings, "vector_ivf_nprobe", 4)
+
+    def _fill(self, store, n):
+        emb = _embeddings(n)
+        store.add_document(1, [f"c{i}" for i in range(n)], emb, 10, "a.pdf")
+        _wait_for_compaction(store)
+        return emb
+
+    def test_stays_flat_below_threshold(self, store, ann_settings, monkeypatch):
+        monkeypatch.setattr(settings, "vector_index_type", "ivf_flat")
+        self._fill(store, 100)
+        assert store.index_stats()[0]["index_type"] == "flat"
+
+    def test_promotes_to_ivf_and_reports_recall(self, store, ann_settings, monkeypatch):
+        monkeypatch.setattr(settings, "vector_index_type", "ivf_flat")
+        emb = self._fill(store, 400)
+        stats = store.index_stats()[0]
+        assert stats["index_type"] == "ivf_flat"
+        assert stats["recall_at_k"] == pytest.approx(1.0)  # nprobe == nlist is exhaustive
+        assert store.search(1, emb[7], k=1)[0]["chunk_text"] == "c7"
+
+        reloaded = VectorStore()
+        reloaded._ensure_loaded(1)
+        assert reloaded.index_stats()[0]["index_type"] == "ivf_flat"
+
+    def test_hnsw_removal_skips_stale_ids(self, store, ann_settings, monkeypatch):
+        monkeypatch.setattr(settings, "vector_space_index_types", {1: "hnsw"})
+        monkeypatch.setattr(settings, "vector_compaction_deleted_ratio", 1.0)
+        emb = self._fill(store, 300)
+        store.add_document(1, ["other"], _embeddings(1, seed=5), 20, "b.pdf")
+        store.remove_document(1, 10)
+
+        assert store.index_stats()[0]["index_type"] == "hnsw"
+        results = store.search(1, emb[0], k=3)
+        assert [r["chunk_text"] for r in results] == ["other"]
+
+
+class TestQuantizedIndexes:
+    @pytest.fixture()
+    def quantized_settings(self, monkeypatch):
+        monkeypatch.setattr(settings, "vector_ann_min_chunks", 300)
+        monkeypatch.setattr(settings, "vector_pq_m", 16)
+
+    @pytest.mark.parametrize("index_type", ["sq8", "sq_fp16", "pq"])
+    def test_promotes_and_reloads(self, store, quantized_settings, monkeypatch, index_type):
+        monkeypatch.setattr(settings, "vector_index_type", index_type)
+        emb = _embeddings(400)
+        store.add_document(1, [f"c{i}" for i in range(400)], emb, 10, "a.pdf")
+        _wait_for_compaction(store)
+
+        assert store.index_stats()[0]["index_type"] == index_type
+        assert store.search(1, emb[7], k=1)[0]["chunk_text"] == "c7"
+        reloaded = VectorStore()
+        reloaded._ensure_loaded(1)
+        assert reloaded.index_stats()[0]["index_type"] == index_type
+
+    def test_rescoring_returns_exact_distances(self, store, quantized_settings, monkeypatch):
+        monkeypatch.setattr(settings, "vector_index_type", "pq")
+        emb = np.array(_embeddings(400))
+        store.add_document(1, [f"c{i}" for i in range(400)], emb.tolist(), 10, "a.pdf")
+        _wait_for_compaction(store)
+
+        query = emb[3] + 0.01
+        results = store.search(1, query.tolist(), k=5)
+        exact = ((emb - query) ** 2).sum(axis=1)
+        assert results[0]["chunk_text"] == "c3"
+        for r in results:
+            assert r["distance"] == pytest.approx(exact[int(r["chunk_text"][1:])], rel=1e-4)
+        assert [r["distance"] for r in results] == sorted(r["distance"] for r in results)
+
+
+class TestSnapshots:
+    def test_old_snapshot_is_unaffected_by_writes(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_compaction_deleted_ratio", 1.0)
+        store.add_document(1, ["a1"], _embeddings(1, seed=1), 10, "a.pdf")
+        before = store._spaces[1].snapshot
+        store.remove_document(1, 10)
+        store.add_document(1, ["b1"], _embeddings(1, seed=2), 20, "b.pdf")
+
+        assert before.deleted == frozenset()
+        assert [s.name for s in before.segments] == ["seg_000001"]
+        assert store._spaces[1].snapshot.deleted == {0}
+
+    def test_pq_removal_overfetches_past_tombstones(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_ann_min_chunks", 300)
+        monkeypatch.setattr(settings, "vector_pq_m", 16)
+        monkeypatch.setattr(settings, "vector_index_type", "pq")
+        monkeypatch.setattr(settings, "vector_compaction_deleted_ratio", 1.0)
+        emb = _embeddings(300)
+        store.add_document(1, [f"a{i}" for i in range(150)], emb[:150], 10, "a.pdf")
+        store.add_document(1, [f"b{i}" for i in range(150)], emb[150:], 20, "b.pdf")
+        _wait_for_compaction(store)
+        store.remove_document(1, 10)
+
+        results = store.search(1, emb[0], k=3)
+        assert len(results) == 3
+        assert all(r["document_id"] == 20 for r in results)
+
+    def test_searches_run_during_writes(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_compaction_max_segments", 2)
+        emb = _embeddings(40)
+        store.add_document(1, ["seed"], emb[:1], 1, "1.pdf")
+        errors, done = [], threading.Event()
+
+        def reader():
+            while not done.is_set():
+                try:
+                    for hit in store.search(1, emb[0], k=5):
+                        assert hit["filename"] == f"{hit['document_id']}.pdf"
+                except Exception as exc:  # noqa: BLE001 - surfaced below
+                    errors.append(exc)
+                    return
+
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        for t in readers:
+            t.start()
+        for i in range(1, 40):
+            store.add_document(1, [f"c{i}"], emb[i : i + 1], 100 + i, f"{100 + i}.pdf")
+            if i % 3 == 0:
+                store.remove_document(1, 100 + i)
+        done.set()
+        for t in readers:
+            t.join()
+        _wait_for_compaction(store)
+
+        assert errors == []
+        texts = {r["chunk_text"] for r in store.search(1, emb[3], k=40)}
+        assert "c3" not in texts and "c4" in texts
+
+
+class TestPreload:
+    def test_preloads_every_space_on_disk(self, store):
+        for sid in (1, 2, 3):
+            store.add_document(sid, [f"s{sid}"], _embeddings(1, seed=sid), sid, "a.pdf")
+
+        fresh = VectorStore()
+        assert fresh.warmup_status() == {"state": "idle", "ready": True}
+        fresh.start_preload().join()
+
+        assert sorted(fresh._spaces) == [1, 2, 3]
+        status = fresh.warmup_status()
+        assert status["ready"] and status["spaces"] == 3
+
+    def test_not_ready_while_warming_up(self, store):
+        store._warmup = {"state": "warming_up"}
+        assert store.warmup_status()["ready"] is False
+
+    def test_mmap_reads_saved_ann_index(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_ann_min_chunks", 300)
+        monkeypatch.setattr(settings, "vector_ivf_nlist", 4)
+        monkeypatch.setattr(settings, "vector_index_type", "ivf_flat")
+        emb = _embeddings(300)
+        store.add_document(1, [f"c{i}" for i in range(300)], emb, 10, "a.pdf")
+        _wait_for_compaction(store)
+
+        monkeypatch.setattr(settings, "vector_index_mmap", True)
+        fresh = VectorStore()
+        fresh.preload()
+        assert fresh.index_stats()[0]["index_type"] == "ivf_flat"
+        assert fresh.search(1, emb[9], k=1)[0]["chunk_text"] == "c9"
+
+
+class TestMemoryBudget:
+    def _fill_spaces(self, store, sids):
+        emb = {}
+        for sid in sids:
+            emb[sid] = _embeddings(50, seed=sid)
+            store.add_document(sid, [f"s{sid}-{i}" for i in range(50)], emb[sid], sid, "a.pdf")
+        return emb
+
+    def test_evicts_least_recently_used_space(self, store, monkeypatch):
+        # One 50-row flat space is ~0.3 MB; the budget fits two of them
+        monkeypatch.setattr(settings, "vector_memory_budget_mb", 0.7)
+        emb = self._fill_spaces(store, (1, 2))
+        store.search(1, emb[1][0], k=1)  # space 2 becomes least recently used
+        self._fill_spaces(store, (3,))
+
+        assert list(store._spaces) == [1, 3]
+        stats = store.residency_stats()
+        assert stats["evictions"] == 1 and stats["spaces_loaded"] == 2
+        assert stats["resident_mb"] <= 0.7
+
+    def test_evicted_space_reloads_on_access(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_memory_budget_mb", 0.4)
+        emb = self._fill_spaces(store, (1, 2))
+        assert 1 not in store._spaces
+        misses = store.residency_stats()["misses"]
+
+        assert store.search(1, emb[1][4], k=1)[0]["chunk_text"] == "s1-4"
+        assert store.residency_stats()["misses"] == misses + 1
+        assert list(store._spaces) == [1]
+
+    def test_no_budget_keeps_everything(self, store):
+        self._fill_spaces(store, (1, 2, 3))
+        assert store.residency_stats()["evictions"] == 0
+        assert len(store._spaces) == 3
+
+    def test_pending_write_pins_space(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_memory_budget_mb", 0.01)
+        self._fill_spaces(store, (1,))
+        store._spaces[1].pending_writes += 1
+        self._fill_spaces(store, (2,))
+        assert 1 in store._spaces
+
+
+class TestSharedMode:
+    """Two VectorStore instances on one directory stand in for two workers."""
+
+    @pytest.fixture()
+    def workers(self, store, monkeypatch):
+        monkeypatch.setattr(settings, "vector_shared_mode", True)
+        monkeypatch.setattr(settings, "vector_compaction_deleted_ratio", 1.0)
+        return store, VectorStore()
+
+    def test_worker_picks_up_other_workers_writes(self, workers):
+        a, b = workers
+        emb = _embeddings(3)
+        a.add_document(1, ["a1"], emb[:1], 10, "a.pdf")
+        assert b.search(1, emb[0], k=1)[0]["chunk_text"] == "a1"
+
+        a.add_document(1, ["a2"], emb[1:2], 20, "b.pdf")
+        assert b.search(1, emb[1], k=1)[0]["chunk_text"] == "a2"
+        b.remove_document(1, 10)
+        assert [r["chunk_text"] for r in a.search(1, emb[0], k=5)] == ["a2"]
+
+    def test_flat_segments_are_scanned_from_the_mapped_matrix(self, workers):
+        a, _ = workers
+        emb = _embeddings(5)
+        a.add_document(1, [f"c{i}" for i in range(5)], emb, 10, "a.pdf")
+        segment = a._spaces[1].snapshot.segments[0]
+        assert segment.index is None
+        assert a._spaces[1].snapshot.memory_bytes < 5 * DIM
+        assert a.search(1, emb[3], k=1)[0]["chunk_text"] == "c3"
+
+    def test_concurrent_writers_never_reuse_ids(self, workers):
+        stores = workers
+        emb = _embeddings(20)
+
+        def ingest(worker, offset):
+            for i in range(10):
+                row = offset + i
+                worker.add_document(1, [f"c{row}"], emb[row : row + 1], row, f"{row}.pdf")
+
+        threads = [threading.Thread(target=ingest, args=(w, 10 * n)) for n, w in enumerate(stores)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        fresh = VectorStore()
+        ids = [i for s in fresh._ensure_loaded(1).snapshot.segments for i in s.ids.tolist()]
+        assert sorted(ids) == list(range(20))
+
+    def test_other_workers_compaction_is_picked_up(self, workers, monkeypatch):
+        a, b = workers
+        monkeypatch.setattr(settings, "vector_compaction_max_segments", 2)
+        emb = _embeddings(4)
+        b.add_document(1, ["c0"], emb[:1], 10, "a.pdf")
+        assert b.search(1, emb[0], k=1)[0]["chunk_text"] == "c0"
+        for i in range(1, 4):
+            a.add_document(1, [f"c{i}"], emb[i : i + 1], 10 + i, f"{i}.pdf")
+        _wait_for_compaction(a)
+
+        assert "seg_000001" not in [e["name"] for e in _manifest(a)["segments"]]
+        assert b.search(1, emb[2], k=1)[0]["chunk_text"] == "c2"
+        assert [s.name for s in b._spaces[1].snapshot.segments] == [
+            e["name"] for e in _manifest(a)["segments"]
+        ]
+
+
+class TestGlobalSearch:
+    def test_searches_spaces_that_are_not_loaded(self, store):
+        emb = _embeddings(3)
+        store.add_document(1, ["hr"], emb[:1], 10, "hr.pdf")
+        store.add_document(2, ["legal"], emb[1:2], 20, "legal.pdf")
+        store.add_document(3, ["finance"], emb[2:], 30, "finance.pdf")
+
+        fresh = VectorStore()
+        results = fresh.search(None, emb[2], k=3)
+        assert [r["chunk_text"] for r in results][0] == "finance"
+        assert {r["chunk_text"] for r in results} == {"hr", "legal", "finance"}
+
+    def test_space_filter(self, store):
+        emb = _embeddings(2)
+        store.add_document(1, ["hr"], emb[:1], 10, "hr.pdf")
+        store.add_document(2, ["legal"], emb[1:], 20, "legal.pdf")
+
+        results = VectorStore().search(None, emb[1], k=5, space_ids=[1])
+        assert [r["chunk_text"] for r in results] == ["hr"]
+
+
+class TestSearchBatch:
+    def test_matches_single_query_search(self, store):
+        emb = _embeddings(6)
+        store.add_document(1, [f"hr{i}" for i in range(3)], emb[:3], 10, "hr.pdf")
+        store.add_document(2, [f"legal{i}" for i in range(3)], emb[3:], 20, "legal.pdf")
+
+        queries = np.array(emb[1:5], dtype=np.float32)
+        batched = store.search_batch(None, queries, k=2)
+        assert len(batched) == 4
+        for query, results in zip(queries, batched):
+            assert results == store.search(None, query.tolist(), k=2)
+
+    def test_restricts_to_given_spaces(self, store):
+        emb = _embeddings(2)
+        store.add_document(1, ["hr"], emb[:1], 10, "hr.pdf")
+        store.add_document(2, ["legal"], emb[1:], 20, "legal.pdf")
+        batched = store.search_batch([2], np.array(emb, dtype=np.float32), k=5)
+        assert [[r["chunk_text"] for r in row] for row in batched] == [["legal"], ["legal"]]
+
+    def test_empty_store_returns_empty_rows(self, store):
+        assert store.search_batch(None, np.zeros((3, DIM), dtype=np.float32)) == [[], [], []]
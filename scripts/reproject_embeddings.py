@@ -0,0 +1,49 @@
+"""Shrink stored embeddings of intent spaces to a reduced (Matryoshka) dimension.
+
+Each listed space has its vectors truncated to the first DIM components and
+renormalized, then its segments are rewritten and re-indexed. Run it with the
+backend stopped, then set EMBEDDING_SPACE_DIMS to match so new documents and
+queries are cut to the same size.
+
+Usage (from backend/, with the same .env as the service):
+    python ../scripts/reproject_embeddings.py --space 3 --dim 256
+    python ../scripts/reproject_embeddings.py          # every space in EMBEDDING_SPACE_DIMS
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from src.config import settings  # noqa: E402
+from src.ml.vector_store import VectorStore  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--space", type=int, action="append", help="intent space id (repeatable)")
+    parser.add_argument("--dim", type=int, help="target dimension (default: EMBEDDING_SPACE_DIMS)")
+    args = parser.parse_args()
+
+    space_ids = args.space or sorted(settings.embedding_space_dims)
+    if not space_ids:
+        parser.error("no --space given and EMBEDDING_SPACE_DIMS is empty")
+
+    store = VectorStore()
+    for space_id in space_ids:
+        dim = args.dim or settings.embedding_space_dims.get(space_id)
+        if not dim:
+            parser.error(f"no --dim given and EMBEDDING_SPACE_DIMS has no space {space_id}")
+        current = store._ensure_loaded(space_id).dim
+        if current == dim:
+            print(f"intent space {space_id}: already {dim} dimensions")
+            continue
+        chunks = store.reproject_space(space_id, dim)
+        print(f"intent space {space_id}: {current} -> {dim} dimensions, {chunks} chunks")
+        if settings.embedding_space_dims.get(space_id) != dim:
+            print(f"  remember to set EMBEDDING_SPACE_DIMS to include {{\"{space_id}\": {dim}}}")
+
+
+if __name__ == "__main__":
+    main()